@@ -1,11 +1,22 @@
 import time
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Iterator, List
 import src.core.structures as structures
 from src.const import ROOT_DIR, conf_log_filename
+from src.conf import async_max_in_flight, process_workers, stream_max_in_flight, \
+    discovery_rss_first, parquet_sink_enabled, parquet_with_html
 from src.resources import cointelegraph_parser, coindesk_parser
 from src.core.local_storage import set_last_pars_dt, \
                     save_to_disk
-from src.core.database import SQLiteWorker
+from src.core.database import SQLiteWorker, ArticleLinkWriter, get_crawl_marks
+from src.core.link_dedup import LinkDeduplicator
+from src.core.parquet_sink import ParquetSink
+from src.core.networking import get_http_client, get_rate_limiter, get_http_cache, get_html_bytes_from_url, \
+    get_circuit_breakers
+from src.core.networking.rate_limiter import get_domain
+from src.process_stage import ProcessStage
 from datetime import datetime
 import os
 import logging
@@ -22,7 +33,10 @@ logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
 
 
-def handle_article(article: structures.ArticleShortInfo) -> None:
+def handle_article(article: structures.ArticleShortInfo,
+                   db_writer: ArticleLinkWriter,
+                   process_stage: ProcessStage | None = None,
+                   parquet_sink: ParquetSink | None = None) -> Future | None:
     try:
         if article.link.find('coindesk.com') != -1:
             local_parser = coindesk_parser
@@ -30,51 +44,161 @@ def handle_article(article: structures.ArticleShortInfo) -> None:
             local_parser = cointelegraph_parser
         else:
             raise structures.ParsingErrorException(f'Parser for url {article.link} not found')
-        sqlite_worker = SQLiteWorker('news_journal.sqlite')
-        if not sqlite_worker.is_news_parsed(article.link):
-            logger.info(f'Process link {article.link}')
-            tmp_article = local_parser.get_article_info(article.link)
+        logger.info(f'Process link {article.link}')
+        if process_stage:
+            # Поток только качает страницу, разбор и сжатие идут в пуле процессов
+            content, encoding = get_html_bytes_from_url(article.link)
+            tmp_article, file_full_name = process_stage.parse_and_store(get_domain(article.link),
+                                                                        article.link, content, encoding)
         else:
-            logger.info(f'Link {article.link} already processed')
-            return
+            tmp_article = local_parser.get_article_info(article.link)
+            logger.info(f'Save article from {article.link} to disk')
+            file_full_name = save_to_disk(tmp_article)
     except structures.RequestErrorException as e:
         logger.error(f'\nGetting article error. href = {article.link}\n\n{e}')
-        return
-    logger.info(f'Save article from {article.link} to disk')
-    file_full_name = save_to_disk(tmp_article)
+        return None
     logger.info(f'Save info from {article.link} to DB')
-    sqlite_worker.save_article_to_db(tmp_article, file_full_name)
-    return
+    db_future = db_writer.submit(tmp_article, file_full_name)
+    if parquet_sink:
+        try:
+            parquet_sink.append(tmp_article)
+        except structures.SavingErrorException as e:
+            logger.error(f'Save article from {article.link} to parquet error\n{e}')
+    return db_future
 
 
-parser = argparse.ArgumentParser(description='News parsing args')
-parser.add_argument('--from_dt', help='Input from date (yyyy-mm-dd hh:mm:ss)')
-parser.add_argument('--to_dt', help='Input to date (yyyy-mm-dd hh:mm:ss)')
-parser.add_argument('urls', help='Input urls list', nargs='*')
-parsing_args = parser.parse_args()
-for url_el in parsing_args.urls:
-    logger.info(f'Start parsing for {url_el}')
-    if url_el.find('coindesk.com') != -1:
-        my_parser = coindesk_parser
-    elif url_el.find('cointelegraph.com') != -1:
-        my_parser = cointelegraph_parser
-    else:
-        raise structures.ParsingErrorException(f'Parser for url {url_el} not found')
-    if not parsing_args.from_dt:
-        parsing_from_dt = datetime(2023, 6, 6, 23, 59, tzinfo=pytz.UTC)
-    else:
-        parsing_from_dt = pytz.utc.localize(datetime.strptime(parsing_args.from_dt, '%Y-%m-%d %H:%M:%S'))
-    if not parsing_args.to_dt:
-        parsing_to_dt = datetime(2023, 6, 6, 0, 0, tzinfo=pytz.UTC)
+def _log_db_result(article: structures.ArticleShortInfo, db_future: Future, failed: threading.Event) -> None:
+    if db_future.exception():
+        logger.error(f'Save info to DB error. href = {article.link}\n{db_future.exception()}')
+        failed.set()
+
+
+def _log_article_result(article: structures.ArticleShortInfo, future: Future, failed: threading.Event) -> None:
+    if future.exception():
+        logger.error(f'Processing article error. href = {article.link}\n{future.exception()}')
+        failed.set()
+    elif db_future := future.result():
+        db_future.add_done_callback(lambda f: _log_db_result(article, f, failed))
     else:
-        parsing_to_dt = pytz.utc.localize(datetime.strptime(parsing_args.to_dt, '%Y-%m-%d %H:%M:%S'))
-    news_list = my_parser.get_all_links(parsing_from_dt,
-                                        parsing_to_dt)
-    start = time.time()
+        # Страницу не скачали, ошибка уже в журнале
+        failed.set()
+
+
+def process_news_stream(pages: Iterator[List[structures.ArticleShortInfo]],
+                        sqlite_worker: SQLiteWorker,
+                        db_writer: ArticleLinkWriter,
+                        executor: ThreadPoolExecutor,
+                        process_stage: ProcessStage | None = None,
+                        max_in_flight: int = stream_max_in_flight,
+                        parquet_sink: ParquetSink | None = None,
+                        failed: threading.Event | None = None) -> int:
+    """Drops already parsed links of every page as it arrives and feeds new links to executor.
+
+    At most max_in_flight articles are submitted at once, above that the loop blocks and
+    link discovery stops on its bounded queue. Returns number of submitted articles.
+    failed is set once any article does not reach the DB.
+    """
+    if failed is None:
+        failed = threading.Event()
+    slots = threading.BoundedSemaphore(max_in_flight)
+    submitted = 0
+    for page in pages:
+        for article in sqlite_worker.filter_not_parsed(page):
+            slots.acquire()
+            future = executor.submit(handle_article, article, db_writer, process_stage, parquet_sink)
+            future.add_done_callback(lambda f: slots.release())
+            future.add_done_callback(lambda f, article=article: _log_article_result(article, f, failed))
+            submitted += 1
+    return submitted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='News parsing args')
+    parser.add_argument('--from_dt', help='Input from date (yyyy-mm-dd hh:mm:ss)')
+    parser.add_argument('--to_dt', help='Input to date (yyyy-mm-dd hh:mm:ss)')
+    parser.add_argument('--async', dest='async_mode', action='store_true',
+                        help='Run link discovery and article fetching on asyncio event loop')
+    parser.add_argument('--max_in_flight', type=int, default=async_max_in_flight,
+                        help='Max articles processed at once in async mode')
+    parser.add_argument('--processes', type=int, default=process_workers,
+                        help='Parse and compress articles in N processes (0 - in fetching threads)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Walk every tag from the head down to its mark from the previous run, --from_dt is ignored')
+    parser.add_argument('--no_rss', dest='rss_first', action='store_false', default=discovery_rss_first,
+                        help='Paginate tag listings for the whole window instead of taking its recent part from RSS')
+    parser.add_argument('--parquet', action='store_true', default=parquet_sink_enabled,
+                        help='Also append parsed articles to the Parquet dataset (needs pyarrow)')
+    parser.add_argument('urls', help='Input urls list', nargs='*')
+    parsing_args = parser.parse_args()
+    if parsing_args.parquet and parquet_with_html and parsing_args.processes:
+        parser.error('parquet_with_html needs page html, --processes workers do not send it back')
+    for url_el in parsing_args.urls:
+        logger.info(f'Start parsing for {url_el}')
+        if url_el.find('coindesk.com') != -1:
+            my_parser = coindesk_parser
+        elif url_el.find('cointelegraph.com') != -1:
+            my_parser = cointelegraph_parser
+        else:
+            raise structures.ParsingErrorException(f'Parser for url {url_el} not found')
+        if not parsing_args.from_dt:
+            parsing_from_dt = datetime(2023, 6, 6, 23, 59, tzinfo=pytz.UTC)
+        else:
+            parsing_from_dt = pytz.utc.localize(datetime.strptime(parsing_args.from_dt, '%Y-%m-%d %H:%M:%S'))
+        if not parsing_args.to_dt and parsing_args.incremental:
+            # Размеченные теги идут до своих меток, остальные - на incremental_initial_window_hours назад
+            parsing_to_dt = None
+        elif not parsing_args.to_dt:
+            parsing_to_dt = datetime(2023, 6, 6, 0, 0, tzinfo=pytz.UTC)
+        else:
+            parsing_to_dt = pytz.utc.localize(datetime.strptime(parsing_args.to_dt, '%Y-%m-%d %H:%M:%S'))
+        if parsing_args.async_mode:
+            from src.async_engine import crawl
+            asyncio.run(crawl(my_parser, parsing_from_dt, parsing_to_dt,
+                              max_in_flight=parsing_args.max_in_flight, processes=parsing_args.processes,
+                              incremental=parsing_args.incremental, rss_first=parsing_args.rss_first,
+                              parquet=parsing_args.parquet))
+        else:
+            start = time.time()
+            deduplicator = LinkDeduplicator()
+            sqlite_worker = SQLiteWorker('news_journal.sqlite')
+            process_stage = ProcessStage(parsing_args.processes) if parsing_args.processes else None
+            parquet_sink = ParquetSink() if parsing_args.parquet else None
+            if parsing_args.incremental:
+                pages = my_parser.iter_all_new_links(parsing_to_dt, deduplicator, get_crawl_marks())
+            elif parsing_args.rss_first:
+                pages = my_parser.iter_rss_first_links(parsing_from_dt, parsing_to_dt, deduplicator)
+            else:
+                pages = my_parser.iter_all_links(parsing_from_dt, parsing_to_dt, deduplicator)
+            failed = threading.Event()
+            # С пулом процессов потоки только качают, их должно хватать, чтобы загрузить все процессы
+            try:
+                with ArticleLinkWriter(sqlite_worker.engine) as db_writer, \
+                        ThreadPoolExecutor(max_workers=max(5, 2 * parsing_args.processes)) as executor:
+                    submitted = process_news_stream(pages, sqlite_worker, db_writer, executor, process_stage,
+                                                    parquet_sink=parquet_sink, failed=failed)
+            finally:
+                # Иначе при ошибке обхода файлы датасета останутся .tmp, а воркеры - висеть
+                try:
+                    if process_stage:
+                        process_stage.close()
+                finally:
+                    if parquet_sink:
+                        parquet_sink.close()
+            if parsing_args.incremental and failed.is_set():
+                # Метки не двигаем: иначе следующий прогон остановится выше упавших статей и не вернётся к ним
+                get_crawl_marks().discard()
+                logger.warning(f'Some articles failed, crawl marks are not moved')
+            elif parsing_args.incremental:
+                # Все статьи прогона уже в БД, метки можно двигать
+                get_crawl_marks().commit()
+            logger.info(f'Submitted {submitted} articles, cross-tag duplicates suppressed: {deduplicator.suppressed}')
+            logger.info(f'Processed all articles. Working time is {time.time() - start}')
+        logger.info(f'HTTP pool stats: {get_http_client().stats()}')
+        logger.info(f'Rate limiter stats: {get_rate_limiter().stats()}')
+        logger.info(f'HTTP cache stats: {get_http_cache().stats()}')
+        logger.info(f'Circuit breakers: {get_circuit_breakers().stats()}')
+        set_last_pars_dt()
 
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        for result in executor.map(handle_article, news_list):
-            pass
 
-    logger.info(f'Processed all articles. Working time is {time.time() - start}')
-    set_last_pars_dt()
+if __name__ == '__main__':
+    main()
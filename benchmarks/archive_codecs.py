@@ -0,0 +1,72 @@
+"""Archive codecs benchmark on the real corpus: LZMA vs zstd vs zstd with a trained dictionary.
+
+Half of the sampled archives of a site is used to train the dictionary, the other half is measured.
+Run from the repository root:
+    python -m benchmarks.archive_codecs --site coindesk.com --count 1000
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import zipfile
+import argparse
+
+import zstandard
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import src.core.local_storage as local_storage
+from src.core import archive_codecs
+from src.core.networking.rate_limiter import get_domain
+
+
+def load_payloads(dir_name: str, site: str, count: int) -> list[bytes]:
+    names = [name for name in os.listdir(dir_name) if name.endswith(tuple(local_storage.ARCHIVE_EXTENSIONS.values()))]
+    random.Random(0).shuffle(names)
+    payloads = []
+    for name in names:
+        with open(os.path.join(dir_name, name), 'rb') as f:
+            payload = archive_codecs.decompress(f.read())
+        with zipfile.ZipFile(io.BytesIO(payload), "r") as fp:
+            if get_domain(json.loads(fp.read('article.json'))['href']) == site:
+                payloads.append(payload)
+        if len(payloads) >= count:
+            break
+    return payloads
+
+
+def measure(name: str, codec: archive_codecs.Codec, payloads: list[bytes], dictionary=None) -> None:
+    raw = sum(len(p) for p in payloads)
+    start = time.perf_counter()
+    compressed = [codec.compress(p, dictionary) for p in payloads]
+    compress_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for c in compressed:
+        codec.decompress(c, dictionary)
+    decompress_time = time.perf_counter() - start
+    size = sum(len(c) for c in compressed)
+    print(f'{name:10} ratio {raw / size:6.2f}  '
+          f'compress {raw / compress_time / 2 ** 20:8.1f} MB/s  '
+          f'decompress {raw / decompress_time / 2 ** 20:8.1f} MB/s')
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description='Archive codecs benchmark')
+    args_parser.add_argument('--site', required=True, help='coindesk.com or cointelegraph.com')
+    args_parser.add_argument('--count', type=int, default=1000)
+    args_parser.add_argument('--archives', default=local_storage.ROOT_DIR + local_storage.dir_name_archives)
+    args = args_parser.parse_args()
+
+    payloads = load_payloads(args.archives, args.site, args.count)
+    train, test = payloads[::2], payloads[1::2]
+    dictionary = zstandard.train_dictionary(112640, train)
+    print(f'{args.site}: {len(test)} archives, {sum(len(p) for p in test) / 2 ** 20:.1f} MiB uncompressed')
+    measure('lzma', archive_codecs.LZMACodec(), test)
+    measure('zstd', archive_codecs.ZstdCodec(), test)
+    measure('zstd+dict', archive_codecs.ZstdCodec(), test, dictionary)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Archive layout benchmark: layout 1 (html inside article.json) vs layout 2 (metadata-only article.json).
+
+Compares size on disk, full reads and metadata reads. Run from the repository root:
+    python -m benchmarks.archive_layout --count 200
+    python -m benchmarks.archive_layout --archives /path/to/data/archives --count 200
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import src.core.local_storage as local_storage
+from benchmarks.archive_writer import legacy_save_to_disk, synthetic_articles, archived_articles
+
+
+def measure(name: str, names: list[str], read) -> None:
+    start = time.perf_counter()
+    for file_name in names:
+        read(file_name)
+    elapsed = time.perf_counter() - start
+    print(f'{name:28} {elapsed:.3f} s, {len(names) / elapsed:8.0f} archives/s')
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description='Archive layout benchmark')
+    args_parser.add_argument('--count', type=int, default=200)
+    args_parser.add_argument('--archives', help='Directory with existing .xz archives to use as input')
+    args = args_parser.parse_args()
+
+    articles = archived_articles(args.archives, args.count) if args.archives else synthetic_articles(args.count)
+    with tempfile.TemporaryDirectory() as out_dir:
+        local_storage.ROOT_DIR, local_storage.dir_name_archives = '', out_dir
+        legacy = [f'legacy_{i}.xz' for i in range(len(articles))]
+        for file_name, article in zip(legacy, articles):
+            legacy_save_to_disk(article, os.path.join(out_dir, file_name))
+        current = [os.path.basename(local_storage.save_to_disk(article)) for article in articles]
+
+        legacy_size = sum(os.path.getsize(os.path.join(out_dir, name)) for name in legacy)
+        current_size = sum(os.path.getsize(os.path.join(out_dir, name)) for name in current)
+        print(f'articles: {len(articles)}')
+        print(f'size: layout 1 {legacy_size / 2 ** 20:.2f} MiB, layout 2 {current_size / 2 ** 20:.2f} MiB '
+              f'({current_size / legacy_size:.0%})')
+        measure('read_from_disk, layout 1', legacy, local_storage.read_from_disk)
+        measure('read_from_disk, layout 2', current, local_storage.read_from_disk)
+        measure('read_metadata, layout 1', legacy, local_storage.read_metadata)
+        measure('read_metadata, layout 2', current, local_storage.read_metadata)
+
+        start = time.perf_counter()
+        converted, saved = local_storage.convert_archives(legacy)
+        print(f'convert: {converted} archives in {time.perf_counter() - start:.3f} s, saved {saved / 2 ** 20:.2f} MiB')
+
+
+if __name__ == '__main__':
+    main()
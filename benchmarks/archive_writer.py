@@ -0,0 +1,97 @@
+"""Archive writer benchmark: legacy tempdir/zip/lzma round trip vs single-pass save_to_disk.
+
+Run from the repository root:
+    python -m benchmarks.archive_writer --count 200
+    python -m benchmarks.archive_writer --archives /path/to/data/archives --count 200
+"""
+import os
+import sys
+import json
+import lzma
+import time
+import random
+import zipfile
+import argparse
+import tempfile
+from datetime import datetime
+
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import src.core.local_storage as local_storage
+from src.core.structures import ArticleInfo
+
+
+def legacy_save_to_disk(article: ArticleInfo, file_full_name: str) -> int:
+    """Baseline implementation. Returns bytes moved through the disk."""
+    copied = 0
+    with tempfile.TemporaryDirectory() as temp_dir:
+        html_bytes = bytes(article.html, 'utf-8')
+        with open(os.path.join(temp_dir, 'article.html'), 'wb') as f:
+            f.write(html_bytes)
+        json_obj = article._asdict()
+        json_obj['publication_dt'] = json_obj['publication_dt'].isoformat()
+        json_obj['parsing_dt'] = json_obj['parsing_dt'].isoformat()
+        json_bytes = bytes(json.dumps(json_obj, indent=4), 'utf-8')
+        with open(os.path.join(temp_dir, 'article.json'), "wb") as f:
+            f.write(json_bytes)
+        zip_name = os.path.join(temp_dir, 'article.zip')
+        with zipfile.ZipFile(zip_name, "w") as zpf:
+            zpf.write(os.path.join(temp_dir, 'article.html'), 'article.html')
+            zpf.write(os.path.join(temp_dir, 'article.json'), 'article.json')
+        with open(zip_name, "rb") as arch, open(file_full_name, "wb") as lzout:
+            data = arch.read()
+            compressed = lzma.compress(data)
+            lzout.write(compressed)
+        # html/json записали и прочитали в zip, zip записали и прочитали, xz записали
+        copied += 2 * (len(html_bytes) + len(json_bytes)) + 2 * len(data) + len(compressed)
+    return copied
+
+
+def synthetic_articles(count: int) -> list[ArticleInfo]:
+    rnd = random.Random(0)
+    words = [''.join(rnd.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rnd.randint(3, 10))) for _ in range(2000)]
+    articles = []
+    for i in range(count):
+        text = ' '.join(rnd.choice(words) for _ in range(1500))
+        html = '<html><head><title>t</title></head><body>' + \
+               ''.join(f'<div class="at-content-section"><p>{text[j:j + 400]}</p></div>' for j in range(0, len(text), 400)) + \
+               '</body></html>'
+        now = datetime.now(pytz.UTC)
+        articles.append(ArticleInfo(header=f'Header {i}', content=text, publication_dt=now, parsing_dt=now,
+                                    html=html, href=f'https://example.com/news/{i}', language='English'))
+    return articles
+
+
+def archived_articles(dir_name: str, count: int) -> list[ArticleInfo]:
+    local_storage.ROOT_DIR, local_storage.dir_name_archives = '', dir_name
+    names = sorted(name for name in os.listdir(dir_name) if name.endswith('.xz'))[:count]
+    return [local_storage.read_from_disk(name) for name in names]
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description='Archive writer benchmark')
+    args_parser.add_argument('--count', type=int, default=200)
+    args_parser.add_argument('--archives', help='Directory with existing .xz archives to use as input')
+    args = args_parser.parse_args()
+
+    articles = archived_articles(args.archives, args.count) if args.archives else synthetic_articles(args.count)
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        legacy_copied = sum(legacy_save_to_disk(a, os.path.join(out_dir, f'legacy_{i}.xz'))
+                            for i, a in enumerate(articles))
+        legacy_time = time.perf_counter() - start
+
+        local_storage.ROOT_DIR, local_storage.dir_name_archives = '', out_dir
+        start = time.perf_counter()
+        new_copied = sum(os.path.getsize(local_storage.save_to_disk(a)) for a in articles)
+        new_time = time.perf_counter() - start
+
+    print(f'articles: {len(articles)}')
+    print(f'legacy:      {legacy_time:.3f} s, {legacy_copied / 2 ** 20:.1f} MiB through disk')
+    print(f'single-pass: {new_time:.3f} s, {new_copied / 2 ** 20:.1f} MiB through disk')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""cointelegraph GraphQL benchmark: legacy TagPageQuery vs trimmed TAG_PAGE_QUERY at several page lengths.
+
+Prints request size and body encoding time (json.dumps of a dict vs prepared GraphQLOperation)
+for every variant. With --live also fetches the first --posts posts of a tag and reports
+requests, bytes sent and received and wall time. Run from the repository root:
+    python -m benchmarks.cointelegraph_query --live --tag bitcoin --posts 300
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.networking import get_http_client, GraphQLOperation
+from src.core.networking.graphql import JSON_HEADERS
+from src.resources.cointelegraph_parser import cointelegraph_parser
+
+
+# Запрос, который парсер отправлял до сокращения, со всеми полями страницы тега сайта
+LEGACY_TAG_PAGE_QUERY = 'query TagPageQuery($short: String, $slug: String!, $order: String, $offset: Int!, $length: Int!) {\n  locale(short: $short) {\n    tag(slug: $slug) {\n      cacheKey\n      id\n      slug\n      avatar\n      createdAt\n      updatedAt\n      redirectRelativeUrl\n      alternates {\n        cacheKey\n        short\n        domain\n        id\n        code\n        __typename\n      }\n      tagTranslates {\n        cacheKey\n        id\n        title\n        metaTitle\n        pageTitle\n        description\n        metaDescription\n        keywords\n        __typename\n      }\n      posts(order: $order, offset: $offset, length: $length) {\n        data {\n          cacheKey\n          id\n          slug\n          views\n          postTranslate {\n            cacheKey\n            id\n            title\n            avatar\n            published\n            publishedHumanFormat\n            leadText\n            author {\n              cacheKey\n              id\n              slug\n              authorTranslates {\n                cacheKey\n                id\n                name\n                __typename\n              }\n              __typename\n            }\n            __typename\n          }\n          category {\n            cacheKey\n            id\n            __typename\n          }\n          author {\n            cacheKey\n            id\n            slug\n            authorTranslates {\n              cacheKey\n              id\n              name\n              __typename\n            }\n            __typename\n          }\n          postBadge {\n            cacheKey\n            id\n            label\n            postBadgeTranslates {\n              cacheKey\n              id\n              title\n              __typename\n            }\n            __typename\n          }\n          showShares\n          showStats\n          __typename\n        }\n        postsCount\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n}'
+
+
+def make_operation(query: str) -> GraphQLOperation:
+    operation = cointelegraph_parser.TAG_PAGE_OPERATION
+    return GraphQLOperation(operation.url, operation.operation_name, query,
+                            operation.variables, operation.variable_names)
+
+
+def make_payload(query: str, tag: str, num_page: int, length: int) -> dict:
+    # Как парсер строил тело до подготовленных запросов: словарь целиком на каждую страницу
+    operation = cointelegraph_parser.TAG_PAGE_OPERATION
+    return {'operationName': operation.operation_name,
+            'query': query,
+            'variables': {**operation.variables, 'slug': tag, 'offset': length * num_page, 'length': length}}
+
+
+def encode_time(query: str, tag: str, length: int, repeat: int = 10000) -> tuple[float, float]:
+    """Microseconds per page body: dict + json.dumps vs GraphQLOperation.body. Both give the same bytes."""
+    operation = make_operation(query)
+    if json.dumps(make_payload(query, tag, 1, length), separators=(',', ':')).encode() != \
+            operation.body(slug=tag, offset=length, length=length):
+        raise ValueError('GraphQLOperation.body differs from json.dumps of the same request')
+    start = time.perf_counter()
+    for num_page in range(repeat):
+        json.dumps(make_payload(query, tag, num_page, length), separators=(',', ':')).encode()
+    dumped = time.perf_counter() - start
+    start = time.perf_counter()
+    for num_page in range(repeat):
+        operation.body(slug=tag, offset=length * num_page, length=length)
+    prepared = time.perf_counter() - start
+    return dumped / repeat * 1e6, prepared / repeat * 1e6
+
+
+def fetch_posts(query: str, tag: str, length: int, posts: int) -> tuple[int, int, int, float]:
+    client = get_http_client()
+    sent = received = 0
+    start = time.perf_counter()
+    pages = math.ceil(posts / length)
+    operation = make_operation(query)
+    for num_page in range(pages):
+        body = operation.body(slug=tag, offset=length * num_page, length=length)
+        response = client.post(operation.url, data=body, headers=JSON_HEADERS)
+        response.raise_for_status()
+        sent += len(body)
+        received += len(response.content)
+    return pages, sent, received, time.perf_counter() - start
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description='cointelegraph GraphQL query benchmark')
+    args_parser.add_argument('--tag', default=cointelegraph_parser.PROBE_TAG)
+    args_parser.add_argument('--lengths', type=int, nargs='+', default=[15, 30, 60, 120, 240])
+    args_parser.add_argument('--live', action='store_true', help='Fetch pages from the endpoint')
+    args_parser.add_argument('--posts', type=int, default=300, help='Posts to fetch per variant with --live')
+    args = args_parser.parse_args()
+
+    variants = [('legacy', LEGACY_TAG_PAGE_QUERY, 15)]
+    variants += [('trimmed', cointelegraph_parser.TAG_PAGE_QUERY, length) for length in args.lengths]
+    for name, query, length in variants:
+        request_size = len(make_operation(query).body(slug=args.tag, offset=0, length=length))
+        dumped_us, prepared_us = encode_time(query, args.tag, length)
+        line = (f'{name:8} length={length:<4} request {request_size:6} B, '
+                f'encode {dumped_us:6.1f} us dumps / {prepared_us:5.1f} us prepared')
+        if args.live:
+            try:
+                requests_count, sent, received, elapsed = fetch_posts(query, args.tag, length, args.posts)
+                line += (f' | {requests_count:3} requests, sent {sent / 1024:8.1f} KiB, '
+                         f'received {received / 1024:8.1f} KiB, {elapsed:6.2f} s')
+            except Exception as e:
+                line += f' | failed: {e}'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
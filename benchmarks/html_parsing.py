@@ -0,0 +1,67 @@
+"""HTML parsing backends benchmark: parse_article_info time per article for each installed backend.
+
+Pages are taken from saved archives. Failures and results that differ from html.parser
+are reported, the exit code is 1 if there were any. Run from the repository root:
+    python -m benchmarks.html_parsing --count 300
+"""
+import os
+import sys
+import time
+import argparse
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import src.core.local_storage as local_storage
+from src.core import html_parsing
+from src.core.networking.rate_limiter import get_domain
+from src.resources import coindesk_parser, cointelegraph_parser
+
+
+PARSERS = {'coindesk.com': coindesk_parser, 'cointelegraph.com': cointelegraph_parser}
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description='HTML parsing backends benchmark')
+    args_parser.add_argument('--count', type=int, default=300, help='Archives to load')
+    args_parser.add_argument('--archives', default=local_storage.ROOT_DIR + local_storage.dir_name_archives)
+    args = args_parser.parse_args()
+
+    pages = defaultdict(list)
+    names = sorted(os.listdir(args.archives))[:args.count]
+    for name in names:
+        article = local_storage.read_from_disk(os.path.join(args.archives, name))
+        if (site := get_domain(article.href)) in PARSERS:
+            pages[site].append((article.href, article.html))
+
+    # Эталон - html.parser, им извлекались все архивы
+    backends = ['html.parser'] + [backend for backend in html_parsing.available_backends() if backend != 'html.parser']
+    expected, problems = {}, 0
+    for backend in backends:
+        html_parsing.set_backend(backend)
+        for site, site_pages in pages.items():
+            parser, failed, mismatched, first_error = PARSERS[site], 0, 0, None
+            results = {}
+            start = time.perf_counter()
+            for href, html in site_pages:
+                try:
+                    results[href] = parser.parse_article_info(href, html)
+                except Exception as e:
+                    failed += 1
+                    first_error = first_error or f'{href}: {type(e).__name__}: {e}'
+            elapsed = time.perf_counter() - start
+            for href, info in results.items():
+                if backend == 'html.parser':
+                    expected[href] = info
+                elif href in expected and info._replace(parsing_dt=None) != expected[href]._replace(parsing_dt=None):
+                    mismatched += 1
+            problems += failed + mismatched
+            print(f'{backend:12} {site:18} {elapsed / len(site_pages) * 1000:8.2f} ms/article '
+                  f'({len(site_pages)} pages, {failed} failed, {mismatched} differ from html.parser)')
+            if first_error:
+                print(f'    first error: {first_error}')
+    html_parsing.set_backend('html.parser')
+    sys.exit(1 if problems else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from types import ModuleType
+from typing import AsyncIterator, List
+import src.core.structures as structures
+from src.conf import async_max_in_flight, async_parse_workers, discovery_rss_first, parquet_sink_enabled, \
+    parquet_with_html
+from src.core.database import SQLiteWorker, ArticleLinkWriter, get_crawl_marks
+from src.core.link_dedup import LinkDeduplicator
+from src.core.local_storage import save_to_disk
+from src.core.parquet_sink import ParquetSink
+from src.core.networking.async_networking import AsyncHTTPClient
+from src.resources.async_adapter import AsyncParserAdapter
+from src.core.networking.rate_limiter import get_domain
+from src.process_stage import ProcessStage
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+async def handle_article(adapter: AsyncParserAdapter,
+                         article: structures.ArticleShortInfo,
+                         db_writer: ArticleLinkWriter,
+                         parquet_sink: ParquetSink | None = None,
+                         process_stage: ProcessStage | None = None) -> bool:
+    """Fetches, parses and stores one article. Returns False if it did not reach the DB."""
+    loop = asyncio.get_running_loop()
+    try:
+        logger.info(f'Process link {article.link}')
+        if process_stage:
+            # Как в синхронном режиме: страница уходит в пул процессов через разделяемую память,
+            # разбор и сжатие там же, назад приходит статья без html
+            content = (await adapter.client.get_html(article.link)).encode('utf-8')
+            tmp_article, file_full_name = await loop.run_in_executor(
+                adapter.parse_executor, process_stage.parse_and_store,
+                get_domain(article.link), article.link, content, 'utf-8')
+        else:
+            tmp_article = await adapter.get_article_info(article.link)
+    except structures.RequestErrorException as e:
+        logger.error(f'\nGetting article error. href = {article.link}\n\n{e}')
+        return False
+    except structures.ParsingErrorException as e:
+        logger.error(f'Parsing article error. href = {article.link}\n{e}')
+        return False
+    except structures.SavingErrorException as e:
+        logger.error(f'Save article from {article.link} to disk error\n{e}')
+        return False
+    if not process_stage:
+        logger.info(f'Save article from {article.link} to disk')
+        try:
+            file_full_name = await loop.run_in_executor(adapter.parse_executor, save_to_disk, tmp_article)
+        except structures.SavingErrorException as e:
+            logger.error(f'Save article from {article.link} to disk error\n{e}')
+            return False
+    logger.info(f'Save info from {article.link} to DB')
+    try:
+        await asyncio.wrap_future(db_writer.submit(tmp_article, file_full_name))
+    except structures.DataBaseErrorException as e:
+        logger.error(f'Save info from {article.link} to DB error\n{e}')
+        return False
+    if parquet_sink:
+        try:
+            # Сброс row group пишет на диск, не держим event loop
+            await loop.run_in_executor(None, parquet_sink.append, tmp_article)
+        except structures.SavingErrorException as e:
+            logger.error(f'Save article from {article.link} to parquet error\n{e}')
+    return True
+
+
+async def _article_worker(adapter: AsyncParserAdapter,
+                          queue: asyncio.Queue,
+                          db_writer: ArticleLinkWriter,
+                          parquet_sink: ParquetSink | None = None,
+                          process_stage: ProcessStage | None = None) -> int:
+    """Handles articles from queue until None. Returns number of articles that failed."""
+    failed = 0
+    while (article := await queue.get()) is not None:
+        try:
+            failed += not await handle_article(adapter, article, db_writer, parquet_sink, process_stage)
+        except Exception as e:
+            # Как _log_article_result в синхронном режиме: ошибка статьи не должна останавливать воркер,
+            # иначе обход тегов повиснет на заполненной очереди
+            logger.error(f'Processing article error. href = {article.link}\n{e}')
+            failed += 1
+    return failed
+
+
+async def _single_page(page: List[structures.ArticleShortInfo]) -> AsyncIterator[List[structures.ArticleShortInfo]]:
+    yield page
+
+
+async def _produce_tag_links(pages: AsyncIterator[List[structures.ArticleShortInfo]],
+                             queue: asyncio.Queue,
+                             deduplicator: LinkDeduplicator,
+                             sqlite_worker: SQLiteWorker,
+                             db_executor: ThreadPoolExecutor) -> None:
+    loop = asyncio.get_running_loop()
+    async for page in pages:
+        page = deduplicator.filter(page)
+        for article in await loop.run_in_executor(db_executor, sqlite_worker.filter_not_parsed, page):
+            # Очередь ограничена: пока воркеры заняты, обход страниц тега ждёт
+            await queue.put(article)
+
+
+async def crawl(parser: ModuleType,
+                from_dt: datetime,
+                to_dt: datetime | None,
+                max_in_flight: int = async_max_in_flight,
+                parse_workers: int = async_parse_workers,
+                processes: int = 0,
+                incremental: bool = False,
+                rss_first: bool = discovery_rss_first,
+                parquet: bool = parquet_sink_enabled) -> None:
+    """Async variant of the __main__ pipeline: link discovery and article fetching on one event loop.
+
+    Tag walkers push new links into a bounded queue as pages arrive, max_in_flight workers
+    take them from it. Parsing and compression run in parse_workers threads (articles go to
+    a ProcessStage of processes workers if processes > 0), dedup runs in a DB thread and
+    writes go through ArticleLinkWriter.
+    In incremental mode tags are walked from the head down to CrawlMarks.stop_dt, from_dt is ignored
+    and to_dt may be None, marks are moved only if every article was stored.
+    With rss_first the recent part of the window comes from RSS and tags are walked only below it.
+    With parquet articles are also appended to the ParquetSink dataset.
+    """
+    if parquet and parquet_with_html and processes:
+        raise structures.SavingErrorException('parquet_with_html needs page html, process workers do not send it back')
+    loop = asyncio.get_running_loop()
+    # С пулом процессов часть потоков только ждёт результатов ProcessStage
+    with (ProcessStage(processes) if processes else nullcontext()) as process_stage, \
+            ThreadPoolExecutor(max_workers=parse_workers + processes) as parse_executor, \
+            ThreadPoolExecutor(max_workers=1) as db_executor:
+        async with AsyncHTTPClient() as client:
+            adapter = AsyncParserAdapter(parser, client, parse_executor)
+            start = time.time()
+            sqlite_worker = await loop.run_in_executor(db_executor, SQLiteWorker, 'news_journal.sqlite')
+            queue = asyncio.Queue(maxsize=max_in_flight)
+            deduplicator = LinkDeduplicator()
+            marks = get_crawl_marks()
+            parquet_sink = ParquetSink() if parquet else None
+            with ArticleLinkWriter(sqlite_worker.engine) as db_writer:
+                workers = [asyncio.create_task(_article_worker(adapter, queue, db_writer, parquet_sink,
+                                                                   process_stage))
+                           for _ in range(max_in_flight)]
+                try:
+                    tag_pages = []
+                    tags_from_dt = from_dt
+                    if rss_first and not incremental:
+                        rss_links = await adapter.get_rss_links()
+                        tag_pages.append(_single_page([elem for elem in rss_links
+                                                       if from_dt >= elem.pub_datetime >= to_dt]))
+                        if rss_links:
+                            tags_from_dt = min(from_dt, rss_links[-1].pub_datetime)
+                    if incremental or tags_from_dt > to_dt:
+                        news_tags = await adapter.get_news_tags()
+                        if incremental:
+                            tag_pages += [adapter.iter_new_tag_links(tag, to_dt, marks) for tag in news_tags]
+                        else:
+                            tag_pages += [adapter.iter_one_tag_links(tag, tags_from_dt, to_dt) for tag in news_tags]
+                    await asyncio.gather(*(_produce_tag_links(pages, queue, deduplicator, sqlite_worker, db_executor)
+                                           for pages in tag_pages))
+                    for _ in workers:
+                        await queue.put(None)
+                    failed = sum(await asyncio.gather(*workers))
+                finally:
+                    for worker in workers:
+                        worker.cancel()
+                    if parquet_sink:
+                        await loop.run_in_executor(None, parquet_sink.close)
+            if incremental and failed:
+                # Метки не двигаем: иначе следующий прогон остановится выше упавших статей и не вернётся к ним
+                marks.discard()
+                logger.warning(f'{failed} articles failed, crawl marks are not moved')
+            elif incremental:
+                await loop.run_in_executor(db_executor, marks.commit)
+            logger.info(f'Processed {len(deduplicator)} links, duplicates suppressed: {deduplicator.suppressed}. '
+                        f'Working time is {time.time() - start}')
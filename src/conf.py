@@ -2,3 +2,68 @@ dir_name_archives = '/data/archives'
 dir_name_json = '/data/json'
 dir_name_html = '/data/html'
 dir_name_database = '/data/db'
+http_pool_maxsize = 32
+http_connect_timeout = 5
+http_read_timeout = 30
+async_max_in_flight = 200
+async_limit_per_host = 50
+async_parse_workers = 4
+rate_limit_rps = 5
+rate_limit_max_rps = 50
+rate_limit_burst = 10
+rate_limit_initial_concurrency = 4
+rate_limit_max_concurrency = 32
+rate_limit_latency_target = 2.0
+dir_name_http_cache = '/data/http_cache'
+http_cache_max_bytes = 512 * 1024 * 1024
+http_cache_ttl = 600
+db_batch_size = 200
+db_flush_interval = 0.2
+sqlite_cache_size_kib = 65536
+# files - один .xz на статью, segments - сегментное хранилище
+archive_store = 'files'
+dir_name_segments = '/data/segments'
+segment_max_bytes = 256 * 1024 * 1024
+segment_compact_ratio = 0.5
+# lzma | zstd
+archive_codec = 'lzma'
+zstd_level = 9
+dir_name_dictionaries = '/data/zstd_dicts'
+# auto | selectolax | lxml | html.parser. Архивы извлекались html.parser, другие бэкенды собирают text
+# по его правилам, но битую разметку разбирают по-своему - переключать только после tests/test_html_parsing.py
+html_parser_backend = 'html.parser'
+# 0 - парсинг в потоках загрузки, без пула процессов
+process_workers = 0
+stream_queue_size = 20
+stream_max_in_flight = 100
+# Инкрементальный режим: насколько назад идти по тегу, у которого ещё нет метки
+incremental_initial_window_hours = 24
+# Свежую часть окна берём из RSS, по лентам тегов идём только за её пределами
+discovery_rss_first = True
+# Сколько страниц ленты тега качать параллельно, когда известен конец обхода
+tag_prefetch_pages = 8
+# Верхняя граница длины страницы GraphQL cointelegraph при автоподборе
+cointelegraph_max_page_length = 240
+# Повторы запросов: попыток всего, экспоненциальная пауза с jitter, предел Retry-After
+http_max_attempts = 4
+http_backoff_base = 0.5
+http_backoff_max = 30
+http_retry_after_max = 120
+# Circuit breaker на домен: ошибок подряд до размыкания, сколько секунд не ходить на хост
+circuit_failure_threshold = 5
+circuit_reset_timeout = 30
+# Выгрузка архивов: процессов (0 - по числу ядер), строк в одном файле parquet
+export_workers = 0
+export_parquet_part_rows = 20000
+# Parquet датасет статей по site=/date=: включён ли, писать ли html, сжатие, размер row group,
+# предел памяти под буферы всех партиций, сколько файлов держать открытыми
+parquet_sink_enabled = False
+dir_name_parquet = '/data/parquet'
+parquet_with_html = False
+parquet_compression = 'zstd'
+parquet_row_group_bytes = 32 * 1024 * 1024
+parquet_buffer_bytes = 256 * 1024 * 1024
+parquet_max_open_files = 64
+# Файл партиции закрывается (и становится виден читателям) после стольких строк или секунд
+parquet_file_max_rows = 50000
+parquet_file_max_seconds = 600
@@ -0,0 +1,170 @@
+import io
+import os
+import lzma
+import struct
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+from src.const import ROOT_DIR
+from src.conf import zstd_level, dir_name_dictionaries
+from src.core.structures.custom_exceptions import ReadingErrorException
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+# Заголовок записи: magic, версия формата, id кодека, id словаря (0 - без словаря).
+# Архивы без заголовка - старые, это голый lzma поток.
+ARCHIVE_MAGIC = b'NACR'
+ARCHIVE_HEADER = struct.Struct('>4sBBI')
+ARCHIVE_FORMAT_VERSION = 1
+
+
+def _require_zstandard() -> None:
+    # zstandard нужен только для zstd архивов и словарей, lzma работает без него
+    if zstandard is None:
+        raise ImportError('zstd archives require the zstandard package')
+
+
+class Codec(ABC):
+    """Base class of archive codecs. Subclasses register themselves in CODECS by codec_id."""
+
+    name: str
+    codec_id: int
+
+    @abstractmethod
+    def compress(self, data: bytes, dictionary: 'zstandard.ZstdCompressionDict | None' = None) -> bytes:
+        ...
+
+    @abstractmethod
+    def decompress(self, data: bytes, dictionary: 'zstandard.ZstdCompressionDict | None' = None) -> bytes:
+        ...
+
+    @abstractmethod
+    def open_stream(self, data: bytes, dictionary: 'zstandard.ZstdCompressionDict | None' = None) -> io.RawIOBase:
+        """Readable file object that inflates data on demand."""
+
+
+class LZMACodec(Codec):
+    name = 'lzma'
+    codec_id = 0
+
+    def compress(self, data: bytes, dictionary: 'zstandard.ZstdCompressionDict | None' = None) -> bytes:
+        return lzma.compress(data)
+
+    def decompress(self, data: bytes, dictionary: 'zstandard.ZstdCompressionDict | None' = None) -> bytes:
+        return lzma.decompress(data)
+
+    def open_stream(self, data: bytes, dictionary: 'zstandard.ZstdCompressionDict | None' = None) -> io.RawIOBase:
+        return lzma.LZMAFile(io.BytesIO(data))
+
+
+class ZstdCodec(Codec):
+    name = 'zstd'
+    codec_id = 1
+
+    def __init__(self, level: int = zstd_level):
+        self.level = level
+
+    def compress(self, data: bytes, dictionary: 'zstandard.ZstdCompressionDict | None' = None) -> bytes:
+        _require_zstandard()
+        return zstandard.ZstdCompressor(level=self.level, dict_data=dictionary).compress(data)
+
+    def decompress(self, data: bytes, dictionary: 'zstandard.ZstdCompressionDict | None' = None) -> bytes:
+        _require_zstandard()
+        return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(data)
+
+    def open_stream(self, data: bytes, dictionary: 'zstandard.ZstdCompressionDict | None' = None) -> io.RawIOBase:
+        _require_zstandard()
+        return zstandard.ZstdDecompressor(dict_data=dictionary).stream_reader(io.BytesIO(data))
+
+
+CODECS: Dict[int, Codec] = {}
+CODECS_BY_NAME: Dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec) -> None:
+    CODECS[codec.codec_id] = codec
+    CODECS_BY_NAME[codec.name] = codec
+
+
+register_codec(LZMACodec())
+register_codec(ZstdCodec())
+
+
+_dictionaries: Dict[int, 'zstandard.ZstdCompressionDict'] = {}
+_dictionaries_lock = threading.Lock()
+
+
+def _dictionary_path(name: str) -> str:
+    return os.path.join(ROOT_DIR + dir_name_dictionaries, name)
+
+
+def load_dictionary(dict_id: int) -> 'zstandard.ZstdCompressionDict':
+    _require_zstandard()
+    with _dictionaries_lock:
+        if (dictionary := _dictionaries.get(dict_id)) is None:
+            with open(_dictionary_path(f'{dict_id}.dict'), 'rb') as f:
+                dictionary = _dictionaries[dict_id] = zstandard.ZstdCompressionDict(f.read())
+        return dictionary
+
+
+def get_site_dictionary(site: str) -> 'zstandard.ZstdCompressionDict | None':
+    """Current dictionary of site (coindesk.com, cointelegraph.com), None if not trained."""
+    try:
+        with open(_dictionary_path(f'{site}.current'), 'r') as f:
+            return load_dictionary(int(f.read().strip()))
+    except FileNotFoundError:
+        return None
+
+
+def train_site_dictionary(site: str, samples: list[bytes], dict_size: int = 112640) -> 'zstandard.ZstdCompressionDict':
+    """Trains dictionary on samples and makes it current for site. Old dictionaries are kept for old records."""
+    _require_zstandard()
+    dictionary = zstandard.train_dictionary(dict_size, samples)
+    os.makedirs(ROOT_DIR + dir_name_dictionaries, exist_ok=True)
+    with open(_dictionary_path(f'{dictionary.dict_id()}.dict'), 'wb') as f:
+        f.write(dictionary.as_bytes())
+    with open(_dictionary_path(f'{site}.current'), 'w') as f:
+        f.write(str(dictionary.dict_id()))
+    logger.info(f'Trained dictionary {dictionary.dict_id()} for {site} on {len(samples)} samples')
+    return dictionary
+
+
+def compress(data: bytes, codec_name: str, dictionary: 'zstandard.ZstdCompressionDict | None' = None) -> bytes:
+    codec = CODECS_BY_NAME[codec_name]
+    dict_id = dictionary.dict_id() if dictionary is not None else 0
+    return ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_FORMAT_VERSION, codec.codec_id, dict_id) + \
+        codec.compress(data, dictionary)
+
+
+def _unpack(data: bytes) -> tuple[Codec, 'zstandard.ZstdCompressionDict | None', memoryview]:
+    if not data.startswith(ARCHIVE_MAGIC):
+        return CODECS_BY_NAME['lzma'], None, memoryview(data)
+    magic, version, codec_id, dict_id = ARCHIVE_HEADER.unpack_from(data)
+    if codec_id not in CODECS:
+        raise ReadingErrorException(f'Unknown archive codec {codec_id}')
+    dictionary = load_dictionary(dict_id) if dict_id else None
+    return CODECS[codec_id], dictionary, memoryview(data)[ARCHIVE_HEADER.size:]
+
+
+def codec_name(data: bytes) -> str:
+    """Name of the codec the archive was compressed with."""
+    return _unpack(data)[0].name
+
+
+def decompress(data: bytes) -> bytes:
+    codec, dictionary, payload = _unpack(data)
+    return codec.decompress(payload, dictionary)
+
+
+def open_stream(data: bytes) -> io.RawIOBase:
+    """Streaming counterpart of decompress: reading a prefix inflates only that prefix."""
+    codec, dictionary, payload = _unpack(data)
+    return codec.open_stream(payload, dictionary)
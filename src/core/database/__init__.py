@@ -3,3 +3,9 @@ from .sqlite import get_article_from_db
 from .sqlite import save_article_to_db
 from .sqlite import is_parsed
 from .sqlite import SQLiteWorker
+from .sqlite import href_hash
+from .migrations import migrate
+from .batch_writer import ArticleLinkWriter
+from .page_index import PageIndex, get_page_index, start_page_search, find_start_page
+from .crawl_marks import CrawlMarks, get_crawl_marks
+from .article_query import ArticleQuery, get_article_query
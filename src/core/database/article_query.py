@@ -0,0 +1,168 @@
+import logging
+import argparse
+import threading
+from datetime import datetime
+from typing import Iterable, Iterator, List
+from sqlalchemy import Engine, Select, bindparam, func, or_, select, update
+from src.core.structures import DataBaseErrorException, ReadingErrorException
+from src.core.local_storage import LazyArticleInfo, read_metadata
+from .sqlite import ArticleLink, get_engine, href_hash
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+class ArticleQuery:
+    """Metadata queries over the article_links journal.
+
+    Filters and answers come from the journal alone. Results are LazyArticleInfo with
+    href, publication_dt, parsing_dt and (once backfilled) header and language already
+    set, content and html are read from the archive only if accessed. Journal datetimes
+    are naive, as the journal stores them.
+
+        query = get_article_query()
+        for article in query.find(from_dt, to_dt, site='coindesk.com'):
+            print(article.publication_dt, article.header)
+    """
+
+    CHUNK_SIZE = 500
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    @staticmethod
+    def _where(query: Select,
+               from_dt: datetime | None,
+               to_dt: datetime | None,
+               site: str | None,
+               language: str | None) -> Select:
+        table = ArticleLink.__table__
+        query = query.where(table.c.article_archive_file_path.isnot(None),
+                            table.c.article_archive_file_path != '')
+        if from_dt is not None:
+            query = query.where(table.c.published_dt <= from_dt)
+        if to_dt is not None:
+            query = query.where(table.c.published_dt >= to_dt)
+        if site is not None:
+            query = query.where(or_(table.c.href.like(f'%://{site}/%'), table.c.href.like(f'%.{site}/%')))
+        if language is not None:
+            query = query.where(table.c.language == language)
+        return query
+
+    @staticmethod
+    def _record(row) -> LazyArticleInfo:
+        fields = {'href': row.href, 'publication_dt': row.published_dt, 'parsing_dt': row.parsed_dt}
+        if row.header is not None:
+            fields['header'] = row.header
+            fields['language'] = row.language
+        return LazyArticleInfo(row.article_archive_file_path, **fields)
+
+    def find(self,
+             from_dt: datetime | None = None,
+             to_dt: datetime | None = None,
+             site: str | None = None,
+             language: str | None = None,
+             limit: int | None = None) -> Iterator[LazyArticleInfo]:
+        """Archived articles published in [to_dt, from_dt], newest first.
+
+        from_dt/to_dt follow the crawler convention: from_dt is the newer bound.
+        """
+        table = ArticleLink.__table__
+        query = self._where(select(table), from_dt, to_dt, site, language) \
+            .order_by(table.c.published_dt.desc()).limit(limit)
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(query).all()
+        except Exception as e:
+            raise DataBaseErrorException(f'Query articles error', parent=e)
+        return map(self._record, rows)
+
+    def count(self,
+              from_dt: datetime | None = None,
+              to_dt: datetime | None = None,
+              site: str | None = None,
+              language: str | None = None) -> int:
+        query = self._where(select(func.count()).select_from(ArticleLink.__table__), from_dt, to_dt, site, language)
+        try:
+            with self.engine.connect() as conn:
+                return conn.execute(query).scalar()
+        except Exception as e:
+            raise DataBaseErrorException(f'Count articles error', parent=e)
+
+    def get_many(self, hrefs: Iterable[str]) -> List[LazyArticleInfo]:
+        """Archived articles by href in the given order, unknown hrefs are skipped."""
+        hrefs = list(hrefs)
+        table = ArticleLink.__table__
+        by_slug = {}
+        try:
+            with self.engine.connect() as conn:
+                for i in range(0, len(hrefs), self.CHUNK_SIZE):
+                    hashes = [href_hash(href) for href in hrefs[i:i + self.CHUNK_SIZE]]
+                    query = self._where(select(table), None, None, None, None).where(table.c.slug.in_(hashes))
+                    by_slug.update((row.slug, row) for row in conn.execute(query))
+        except Exception as e:
+            raise DataBaseErrorException(f'Query articles by href error', parent=e)
+        return [self._record(by_slug[slug]) for slug in map(href_hash, hrefs) if slug in by_slug]
+
+    def get(self, href: str) -> LazyArticleInfo | None:
+        articles = self.get_many([href])
+        return articles[0] if articles else None
+
+    def backfill(self) -> int:
+        """Fills header and language of rows written before migration 4 from the archives.
+
+        Reads only article.json of layout 2 archives. Unreadable archives are logged and
+        skipped. Returns number of updated rows.
+        """
+        table = ArticleLink.__table__
+        query = self._where(select(table.c.id, table.c.article_archive_file_path), None, None, None, None) \
+            .where(table.c.header.is_(None))
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(query).all()
+        except Exception as e:
+            raise DataBaseErrorException(f'Query articles to backfill error', parent=e)
+        updated = 0
+        for i in range(0, len(rows), self.CHUNK_SIZE):
+            values = []
+            for row in rows[i:i + self.CHUNK_SIZE]:
+                try:
+                    article = read_metadata(row.article_archive_file_path)
+                except ReadingErrorException as e:
+                    logger.error(f'Skip {row.article_archive_file_path}: {e}')
+                    continue
+                values.append({'row_id': row.id, 'new_header': article.header, 'new_language': article.language})
+            if not values:
+                continue
+            # Имена параметров не должны совпадать с именами колонок
+            stmt = update(table).where(table.c.id == bindparam('row_id')) \
+                .values(header=bindparam('new_header'), language=bindparam('new_language'))
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(stmt, values)
+            except Exception as e:
+                raise DataBaseErrorException(f'Backfill article metadata error', parent=e)
+            updated += len(values)
+            logger.info(f'Backfilled {updated} of {len(rows)} articles')
+        return updated
+
+
+_article_query: ArticleQuery | None = None
+_article_query_lock = threading.Lock()
+
+
+def get_article_query() -> ArticleQuery:
+    global _article_query
+    with _article_query_lock:
+        if _article_query is None:
+            _article_query = ArticleQuery(get_engine('news_journal.sqlite'))
+        return _article_query
+
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description='Article journal maintenance')
+    args_parser.add_argument('command', choices=['backfill'])
+    args = args_parser.parse_args()
+    logger.setLevel(logging.INFO)
+    get_article_query().backfill()
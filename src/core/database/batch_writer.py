@@ -0,0 +1,122 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from typing import List, NamedTuple
+from sqlalchemy import Engine
+from sqlalchemy.dialects.sqlite import insert
+from src.conf import db_batch_size, db_flush_interval
+from src.core.structures import ArticleInfo, DataBaseErrorException
+from .sqlite import ArticleLink, href_hash
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+class _WriteRequest(NamedTuple):
+    row: dict
+    future: Future
+
+
+class ArticleLinkWriter:
+    """Single writer thread for article_links with group commit.
+
+    Records from submit() are upserted (INSERT ... ON CONFLICT(slug) DO UPDATE) in one
+    transaction per batch_size rows or per flush_interval seconds, whichever comes first.
+    Callers get a Future resolved after commit, so they never wait for the disk.
+
+    Use as context manager, exit waits for all submitted records:
+        with ArticleLinkWriter(engine) as writer:
+            writer.submit(article_info, file_full_name).result()
+    """
+
+    def __init__(self, engine: Engine, batch_size: int = db_batch_size, flush_interval: float = db_flush_interval):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self._queue: queue.Queue[_WriteRequest | None] = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='ArticleLinkWriter', daemon=True)
+
+    def __enter__(self) -> 'ArticleLinkWriter':
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        logger.info(f'DB writer stopped. Written {self.written}, failed {self.failed}')
+
+    def submit(self, article_info: ArticleInfo, file_full_name: str) -> Future:
+        now = datetime.utcnow()
+        future = Future()
+        self._queue.put(_WriteRequest({'href': article_info.href,
+                                       'slug': href_hash(article_info.href),
+                                       'published_dt': article_info.publication_dt,
+                                       'parsed_dt': article_info.parsing_dt,
+                                       'article_parser_version': 0,
+                                       'article_archive_file_path': file_full_name,
+                                       'header': article_info.header,
+                                       'language': article_info.language,
+                                       'created_at': now,
+                                       'updated_at': now}, future))
+        return future
+
+    def _run(self) -> None:
+        stopped = False
+        while not stopped:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopped = True
+                    break
+                batch.append(item)
+            self._write(batch)
+
+    @staticmethod
+    def _upsert_statement():
+        stmt = insert(ArticleLink.__table__)
+        return stmt.on_conflict_do_update(
+            index_elements=['slug'],
+            set_={'article_archive_file_path': stmt.excluded.article_archive_file_path,
+                  'published_dt': stmt.excluded.published_dt,
+                  'parsed_dt': stmt.excluded.parsed_dt,
+                  'header': stmt.excluded.header,
+                  'language': stmt.excluded.language,
+                  'updated_at': stmt.excluded.updated_at})
+
+    def _write(self, batch: List[_WriteRequest]) -> None:
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(self._upsert_statement(), [req.row for req in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                self.failed += 1
+                batch[0].future.set_exception(DataBaseErrorException(f'Save article to DB error', parent=e))
+                return
+            # Пачка не записалась - пишем по одной, чтобы ошибка досталась только виновной записи
+            logger.warning(f'Batch of {len(batch)} rows failed, retry one by one\n{e}')
+            for req in batch:
+                self._write([req])
+            return
+        self.written += len(batch)
+        for req in batch:
+            req.future.set_result(req.row['article_archive_file_path'])
@@ -0,0 +1,97 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+from sqlalchemy import Engine, func, select
+from sqlalchemy.dialects.sqlite import insert
+from src.conf import incremental_initial_window_hours
+from src.core.structures import ArticleShortInfo, DataBaseErrorException
+from .sqlite import CrawlMark, get_engine
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+class CrawlMarks:
+    """Per (site, tag) high-water marks for incremental crawl.
+
+    Tag walkers take the stop time from stop_dt() and stop on the first page that reaches it,
+    every walked page goes to observe(). New marks are written by commit() at the end
+    of the run, so a failed run is walked again next time. A run with failed articles
+    calls discard() instead of commit().
+    """
+
+    def __init__(self, engine: Engine, initial_window_hours: float = incremental_initial_window_hours):
+        self.engine = engine
+        self.initial_window = timedelta(hours=initial_window_hours)
+        self._pending: Dict[Tuple[str, str], datetime] = {}
+        self._lock = threading.Lock()
+
+    def get(self, site: str, tag: str) -> datetime | None:
+        table = CrawlMark.__table__
+        query = select(table.c.newest_dt).where(table.c.site == site, table.c.tag == tag)
+        try:
+            with self.engine.connect() as conn:
+                newest_dt = conn.execute(query).scalar()
+        except Exception as e:
+            raise DataBaseErrorException(f'Get crawl mark of tag {tag} error', parent=e)
+        return newest_dt.replace(tzinfo=timezone.utc) if newest_dt else None
+
+    def stop_dt(self, site: str, tag: str, to_dt: datetime | None = None) -> datetime:
+        """Where an incremental walk of tag stops: at its mark, or initial_window back from now
+        if the tag has no mark yet. to_dt, if given, bounds both."""
+        if (mark := self.get(site, tag)) is None:
+            return to_dt or datetime.now(timezone.utc) - self.initial_window
+        # Окно из настроек к размеченному тегу не применяем: иначе статьи между старой меткой
+        # и началом окна пропадут, а commit() передвинет метку за них
+        return max(mark, to_dt) if to_dt else mark
+
+    def observe(self, site: str, tag: str, articles: List[ArticleShortInfo]) -> None:
+        if not articles:
+            return
+        newest_dt = max(article.pub_datetime for article in articles)
+        with self._lock:
+            if (pending := self._pending.get((site, tag))) is None or pending < newest_dt:
+                self._pending[(site, tag)] = newest_dt
+
+    def discard(self) -> int:
+        """Drops observed marks without writing them. Returns number of dropped marks."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return len(pending)
+
+    def commit(self) -> int:
+        """Writes observed marks, a mark never moves back. Returns number of written marks."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        now = datetime.utcnow()
+        rows = [{'site': site, 'tag': tag,
+                 'newest_dt': newest_dt.astimezone(timezone.utc).replace(tzinfo=None),
+                 'created_at': now, 'updated_at': now}
+                for (site, tag), newest_dt in pending.items()]
+        stmt = insert(CrawlMark)
+        stmt = stmt.on_conflict_do_update(index_elements=['site', 'tag'],
+                                          set_={'newest_dt': func.max(CrawlMark.newest_dt, stmt.excluded.newest_dt),
+                                                'updated_at': stmt.excluded.updated_at})
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(stmt, rows)
+        except Exception as e:
+            raise DataBaseErrorException(f'Save crawl marks error', parent=e)
+        logger.info(f'Saved {len(rows)} crawl marks')
+        return len(rows)
+
+
+_crawl_marks: CrawlMarks | None = None
+_crawl_marks_lock = threading.Lock()
+
+
+def get_crawl_marks() -> CrawlMarks:
+    global _crawl_marks
+    with _crawl_marks_lock:
+        if _crawl_marks is None:
+            _crawl_marks = CrawlMarks(get_engine('news_journal.sqlite'))
+        return _crawl_marks
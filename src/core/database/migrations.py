@@ -0,0 +1,93 @@
+import logging
+from typing import Callable, List, NamedTuple
+from sqlalchemy import Connection, Engine, text
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def _index_href_hash(conn: Connection) -> None:
+    # Гонки потоков могли оставить несколько строк на одну ссылку. Оставляем последнюю
+    # из тех, у которых есть архив, строку без архива - только если архива нет ни у одной
+    conn.execute(text('DELETE FROM article_links WHERE id IN ('
+                      'SELECT id FROM ('
+                      'SELECT id, ROW_NUMBER() OVER ('
+                      'PARTITION BY slug '
+                      "ORDER BY (article_archive_file_path IS NULL OR article_archive_file_path = ''), id DESC"
+                      ') AS rn FROM article_links) '
+                      'WHERE rn > 1)'))
+    conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS ix_article_links_slug ON article_links (slug)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_article_links_published_dt ON article_links (published_dt)'))
+
+
+def _create_page_index(conn: Connection) -> None:
+    conn.execute(text('CREATE TABLE IF NOT EXISTS page_index ('
+                      'id INTEGER NOT NULL, '
+                      'created_at DATETIME, '
+                      'updated_at DATETIME, '
+                      'site VARCHAR(255) NOT NULL, '
+                      'tag VARCHAR(255) NOT NULL, '
+                      'page_size INTEGER NOT NULL, '
+                      'page_num INTEGER NOT NULL, '
+                      'newest_dt DATETIME NOT NULL, '
+                      'oldest_dt DATETIME NOT NULL, '
+                      'PRIMARY KEY (id), '
+                      'UNIQUE (id))'))
+    conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS ix_page_index_page '
+                      'ON page_index (site, tag, page_size, page_num)'))
+
+
+def _create_crawl_marks(conn: Connection) -> None:
+    conn.execute(text('CREATE TABLE IF NOT EXISTS crawl_marks ('
+                      'id INTEGER NOT NULL, '
+                      'created_at DATETIME, '
+                      'updated_at DATETIME, '
+                      'site VARCHAR(255) NOT NULL, '
+                      'tag VARCHAR(255) NOT NULL, '
+                      'newest_dt DATETIME NOT NULL, '
+                      'PRIMARY KEY (id), '
+                      'UNIQUE (id))'))
+    conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS ix_crawl_marks_tag ON crawl_marks (site, tag)'))
+
+
+def _add_article_metadata(conn: Connection) -> None:
+    # create_all новой БД уже создал колонки, ALTER TABLE повторно упадёт
+    columns = {row[1] for row in conn.execute(text('PRAGMA table_info(article_links)'))}
+    if 'header' not in columns:
+        conn.execute(text('ALTER TABLE article_links ADD COLUMN header VARCHAR(1000)'))
+    if 'language' not in columns:
+        conn.execute(text('ALTER TABLE article_links ADD COLUMN language VARCHAR(50)'))
+
+
+# Версия схемы хранится в PRAGMA user_version, миграции применяются по возрастанию версии
+MIGRATIONS: List[Migration] = [
+    Migration(1, 'unique index on href hash (slug), index on published_dt', _index_href_hash),
+    Migration(2, 'page_index table: publication time bounds of listing pages', _create_page_index),
+    Migration(3, 'crawl_marks table: per tag high-water marks of incremental crawl', _create_crawl_marks),
+    Migration(4, 'header and language columns of article_links for metadata queries', _add_article_metadata),
+]
+
+
+def get_schema_version(conn: Connection) -> int:
+    return conn.execute(text('PRAGMA user_version')).scalar()
+
+
+def migrate(engine: Engine) -> int:
+    """Upgrades DB in place to the latest schema version. Returns resulting version."""
+    with engine.begin() as conn:
+        version = get_schema_version(conn)
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            logger.info(f'Apply DB migration {migration.version}: {migration.description}')
+            migration.upgrade(conn)
+            conn.execute(text(f'PRAGMA user_version = {migration.version}'))
+            version = migration.version
+    return version
@@ -0,0 +1,170 @@
+import math
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Generator, List, NamedTuple
+from sqlalchemy import Engine, select
+from sqlalchemy.dialects.sqlite import insert
+from src.core.structures import ArticleShortInfo, DataBaseErrorException
+from .sqlite import PageIndexEntry, get_engine
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+# Поиск стартовой страницы: yield номер страницы, которую нужно скачать, send её ссылки, return номер страницы
+StartPageSearch = Generator[int, List[ArticleShortInfo], int]
+
+
+class _Point(NamedTuple):
+    # Позиция статьи в ленте тега (page_num * page_size) и время её публикации
+    position: float
+    dt: datetime
+
+
+def _utc_naive(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class PageIndex:
+    """Persistent map (site, tag, page) -> (newest, oldest) publication time of the page.
+
+    Filled from every listing page the parsers fetch. Used by start_page_search to
+    guess the page where a datetime falls instead of a binary search over HTTP.
+    Positions are page_num * page_size, so pages of different length share one index.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def record(self, site: str, tag: str, page_num: int, page_size: int, articles: List[ArticleShortInfo]) -> None:
+        if not articles:
+            return
+        dts = [_utc_naive(article.pub_datetime) for article in articles]
+        now = datetime.utcnow()
+        row = {'site': site, 'tag': tag, 'page_size': page_size, 'page_num': page_num,
+               'newest_dt': max(dts), 'oldest_dt': min(dts), 'created_at': now, 'updated_at': now}
+        stmt = insert(PageIndexEntry).values(row)
+        stmt = stmt.on_conflict_do_update(index_elements=['site', 'tag', 'page_size', 'page_num'],
+                                          set_={key: stmt.excluded[key]
+                                                for key in ('newest_dt', 'oldest_dt', 'updated_at')})
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(stmt)
+        except Exception as e:
+            raise DataBaseErrorException(f'Save page index of tag {tag} error', parent=e)
+
+    def _points(self, site: str, tag: str) -> List[_Point]:
+        table = PageIndexEntry.__table__
+        query = select(table).where(table.c.site == site, table.c.tag == tag)
+        with self.engine.connect() as conn:
+            entries = conn.execute(query).all()
+        points = []
+        for entry in entries:
+            start = entry.page_num * entry.page_size
+            points.append((start, entry.newest_dt, entry.updated_at))
+            points.append((start + entry.page_size - 1, entry.oldest_dt, entry.updated_at))
+        if len(points) < 4:
+            return [_Point(position, dt) for position, dt, _ in points]
+        # Пока запись лежала в индексе, новые статьи сдвинули старые дальше по ленте.
+        # Темп публикации (позиций в секунду) оцениваем по самому индексу
+        points.sort()
+        first, last = points[0], points[-1]
+        span = (first[1] - last[1]).total_seconds()
+        rate = (last[0] - first[0]) / span if span > 0 else 0
+        now = datetime.utcnow()
+        return sorted(_Point(position + rate * (now - updated_at).total_seconds(), dt)
+                      for position, dt, updated_at in points)
+
+    def guess_start_page(self, site: str, tag: str, page_size: int, from_dt: datetime) -> int | None:
+        """Page of page_size links where from_dt most likely falls, None if tag is not indexed yet."""
+        points = self._points(site, tag)
+        if not points:
+            return None
+        from_dt = _utc_naive(from_dt)
+        for prev, point in zip([None] + points, points):
+            if point.dt > from_dt:
+                continue
+            if prev is None:
+                return 0
+            # Линейная интерполяция позиции между соседними точками. Первая статья не новее
+            # from_dt стоит на следующей целой позиции, поэтому ceil
+            share = (prev.dt - from_dt) / (prev.dt - point.dt) if prev.dt > point.dt else 0
+            return math.ceil(prev.position + share * (point.position - prev.position)) // page_size
+        # from_dt старше всего индекса: экстраполируем по среднему темпу
+        first, last = points[0], points[-1]
+        span = (first.dt - last.dt).total_seconds()
+        if span <= 0 or last.position <= first.position:
+            return math.ceil(last.position) // page_size + 1
+        rate = (last.position - first.position) / span
+        return math.ceil(last.position + rate * (last.dt - from_dt).total_seconds()) // page_size
+
+    def guess_last_page(self, site: str, tag: str, page_size: int, start_page: int, to_dt: datetime) -> int | None:
+        """Page where a walk from start_page down to to_dt will stop, None if tag is not indexed yet."""
+        page_num = self.guess_start_page(site, tag, page_size, to_dt)
+        if page_num is None:
+            return None
+        # Страница, где лежит to_dt, и следующая, на которой обход остановится
+        return max(page_num, start_page) + 1
+
+
+def start_page_search(index: PageIndex,
+                      site: str,
+                      tag: str,
+                      page_size: int,
+                      from_dt: datetime,
+                      first_page: int = 1) -> StartPageSearch:
+    """First page (>= first_page) whose oldest link is not newer than from_dt.
+
+    Starts from the page guessed by the index, gallops towards the boundary with
+    doubling steps and bisects the bracket. A page that holds from_dt between its
+    newest and oldest link ends the search at once, so with a fresh index it is one
+    or two requests. An empty page is taken as the end of the listing.
+    """
+    guess = index.guess_start_page(site, tag, page_size, from_dt)
+    page_num = max(first_page, guess if guess is not None else first_page)
+    # left: последняя страница целиком новее from_dt, right: первая известная страница не новее
+    left, right = first_page - 1, None
+    step = 1
+    while right is None or right - left > 1:
+        articles = yield page_num
+        if articles and articles[-1].pub_datetime <= from_dt < articles[0].pub_datetime:
+            return page_num
+        if not articles or articles[-1].pub_datetime <= from_dt:
+            right = page_num
+        else:
+            left = page_num
+        if right is None:
+            page_num = left + step
+            step *= 2
+        elif page_num == right and right - step > left:
+            page_num = right - step
+            step *= 2
+        else:
+            page_num = (left + right) // 2
+    return right
+
+
+def find_start_page(search: StartPageSearch, fetch_page: Callable[[int], List[ArticleShortInfo]]) -> int:
+    """Runs start_page_search with a blocking fetch_page(page_num)."""
+    try:
+        page_num = next(search)
+        while True:
+            page_num = search.send(fetch_page(page_num))
+    except StopIteration as result:
+        return result.value
+
+
+_page_index: PageIndex | None = None
+_page_index_lock = threading.Lock()
+
+
+def get_page_index() -> PageIndex:
+    global _page_index
+    with _page_index_lock:
+        if _page_index is None:
+            _page_index = PageIndex(get_engine('news_journal.sqlite'))
+        return _page_index
@@ -1,15 +1,18 @@
 import hashlib
 import logging
-from sqlalchemy import create_engine, Connection
-from sqlalchemy import Column, Integer, DateTime, String
-from sqlalchemy.orm import declarative_base, sessionmaker, Session
+import threading
+from typing import Iterable, List
+from sqlalchemy import create_engine, event, Connection, Engine
+from sqlalchemy import Column, Integer, DateTime, String, Index
+from sqlalchemy.orm import declarative_base, sessionmaker, scoped_session, Session
 from sqlalchemy.exc import OperationalError
 from sqlalchemy_utils import database_exists, create_database
 from datetime import datetime
 from src.const import ROOT_DIR
-from src.conf import dir_name_database
-from src.core.structures import ArticleInfo
+from src.conf import dir_name_database, sqlite_cache_size_kib
+from src.core.structures import ArticleInfo, ArticleShortInfo
 from src.core.structures import DataBaseErrorException
+from .migrations import migrate
 
 
 logger = logging.getLogger(__name__)
@@ -31,62 +34,139 @@ class BaseModel(Base):
     #     return "<{0.__class__.__name__}(id={0.id!r})>".format(self)
 
 
+def href_hash(href: str) -> str:
+    return hashlib.sha256(href.encode()).hexdigest()
+
+
 class ArticleLink(BaseModel):
     __tablename__ = 'article_links'
+    # Имена индексов совпадают с миграцией 1, чтобы новые и обновлённые БД не отличались
+    __table_args__ = (
+        Index('ix_article_links_slug', 'slug', unique=True),
+        Index('ix_article_links_published_dt', 'published_dt'),
+    )
 
-    def __init__(self, href, slug, published_dt, parsed_dt, article_parser_version, article_archive_file_path):
+    def __init__(self, href, slug, published_dt, parsed_dt, article_parser_version, article_archive_file_path,
+                 header=None, language=None):
         self.href = href
         self.slug = slug
         self.published_dt = published_dt
         self.parsed_dt = parsed_dt
         self.article_parser_version = article_parser_version
         self.article_archive_file_path = article_archive_file_path
+        self.header = header
+        self.language = language
 
     href = Column(String(3000), nullable=False)
+    # sha256 от href, ключ для всех поисков по ссылке
     slug = Column(String(255), nullable=False)
     published_dt = Column(DateTime, nullable=True)
     # article_resource_id
     parsed_dt = Column(DateTime, nullable=True)
     article_parser_version = Column(Integer)
     article_archive_file_path = Column(String(1000))
+    # Метаданные статьи (миграция 4), чтобы отвечать на запросы без чтения архива
+    header = Column(String(1000), nullable=True)
+    language = Column(String(50), nullable=True)
+
+
+class PageIndexEntry(BaseModel):
+    """Publication time bounds of one listing page of a tag, see page_index.PageIndex."""
+    __tablename__ = 'page_index'
+    # Имя индекса совпадает с миграцией 2
+    __table_args__ = (
+        Index('ix_page_index_page', 'site', 'tag', 'page_size', 'page_num', unique=True),
+    )
+
+    site = Column(String(255), nullable=False)
+    tag = Column(String(255), nullable=False)
+    page_size = Column(Integer, nullable=False)
+    page_num = Column(Integer, nullable=False)
+    # Время самой новой и самой старой статьи страницы, UTC без tzinfo
+    newest_dt = Column(DateTime, nullable=False)
+    oldest_dt = Column(DateTime, nullable=False)
+
+
+class CrawlMark(BaseModel):
+    """High-water mark of incremental crawl: newest publication time seen in a tag, see crawl_marks.CrawlMarks."""
+    __tablename__ = 'crawl_marks'
+    # Имя индекса совпадает с миграцией 3
+    __table_args__ = (
+        Index('ix_crawl_marks_tag', 'site', 'tag', unique=True),
+    )
+
+    site = Column(String(255), nullable=False)
+    tag = Column(String(255), nullable=False)
+    # UTC без tzinfo
+    newest_dt = Column(DateTime, nullable=False)
+
+_engines: dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    # WAL: читатели не ждут писателя, NORMAL: fsync только на чекпоинтах
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA cache_size=-{sqlite_cache_size_kib}')
+    cursor.execute('PRAGMA busy_timeout=5000')
+    cursor.close()
+
+
+def get_engine(db_name: str) -> Engine:
+    """One engine per DB file for the whole process. DB and tables are created on first call."""
+    with _engines_lock:
+        if engine := _engines.get(db_name):
+            return engine
+        engine = create_engine(f"sqlite:///{ROOT_DIR}{dir_name_database}/{db_name}",
+                               connect_args={'check_same_thread': False})
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
+        if not database_exists(engine.url):
+            try:
+                create_database(engine.url)
+                metadata.create_all(bind=engine)
+            except OperationalError as e:
+                logger.warning(e)
+        migrate(engine)
+        _engines[db_name] = engine
+        return engine
 
 
 def get_sqlite_session(db_name: str) -> Session:
-    engine = create_engine(f"sqlite:///{ROOT_DIR}{dir_name_database}/{db_name}")
-    if not database_exists(engine.url):
-        create_database(engine.url)
-        # В метадате будут схемы всех наследников Base
-        # создаём все схемы(таблицы) в базу ассоциированную с engine
-        metadata.create_all(bind=engine)
     # Создаём КЛАСС для создания сессий к КОНКРЕТНОЙ БД(фабрику)
-    return sessionmaker(bind=engine)()
+    return sessionmaker(bind=get_engine(db_name))()
 
 
 def save_article_to_db(session: Session, article_info: ArticleInfo, file_full_name: str):
     try:
-        if article_link := session.query(ArticleLink).filter_by(href=article_info.href).first():
+        if article_link := session.query(ArticleLink).filter_by(slug=href_hash(article_info.href)).first():
             article_link.article_archive_file_path = file_full_name
             article_link.published_dt = article_info.publication_dt
             article_link.parsed_dt = article_info.parsing_dt
+            article_link.header = article_info.header
+            article_link.language = article_info.language
         else:
             session.add(ArticleLink(article_info.href,
-                                    hashlib.sha256(article_info.href.encode()).hexdigest(),
+                                    href_hash(article_info.href),
                                     article_info.publication_dt,
                                     article_info.parsing_dt,
                                     0,
-                                    file_full_name))
+                                    file_full_name,
+                                    article_info.header,
+                                    article_info.language))
         session.commit()
     except Exception as e:
         raise DataBaseErrorException(f'Save article to DB error', parent=e)
 
 
 def get_article_from_db(session: Session, href: str) -> ArticleLink | None:
-    return session.query(ArticleLink).filter_by(href=href).first()
+    return session.query(ArticleLink).filter_by(slug=href_hash(href)).first()
 
 
 def is_parsed(session: Session, href: str) -> bool:
     try:
-        if session.query(ArticleLink).filter_by(href=href).first().article_archive_file_path:
+        if session.query(ArticleLink).filter_by(slug=href_hash(href)).first().article_archive_file_path:
             return True
         return False
     except AttributeError:
@@ -97,7 +177,7 @@ def is_parsed(session: Session, href: str) -> bool:
 
 def set_archive_path(session: Session, href: str, path: str) -> None:
     try:
-        session.query(ArticleLink).filter_by(href=href).first().article_archive_file_path = path
+        session.query(ArticleLink).filter_by(slug=href_hash(href)).first().article_archive_file_path = path
         return
     except AttributeError:
         raise DataBaseErrorException(f'Set archive path error. Record not found')
@@ -106,35 +186,55 @@ def set_archive_path(session: Session, href: str, path: str) -> None:
 
 
 def get_db_connection(db_name: str = 'news_journal.sqlite') -> Connection:
-    engine = create_engine(f"sqlite:///{ROOT_DIR}{dir_name_database}/{db_name}")
-    if not database_exists(engine.url):
-        create_database(engine.url)
-    return engine.connect()
+    return get_engine(db_name).connect()
 
 
 class SQLiteWorker:
+    """DB access for the parsing pipeline. Safe to share between threads: every thread gets its own session."""
 
-    session: Session
+    DEDUP_CHUNK_SIZE = 500
 
     def __init__(self, db_name: str):
         if not db_name:
             raise DataBaseErrorException('Empty DB name')
         try:
-            engine = create_engine(f"sqlite:///{ROOT_DIR}{dir_name_database}/{db_name}")
-            if not database_exists(engine.url):
-                try:
-                    create_database(engine.url)
-                    metadata.create_all(bind=engine)
-                except OperationalError as e:
-                    logger.warning(e)
-            # Создаём КЛАСС для создания сессий к КОНКРЕТНОЙ БД(фабрику) и вызываем его
-            self.session = sessionmaker(bind=engine)()
+            self.engine = get_engine(db_name)
+            # Фабрика сессий, которая выдаёт каждому потоку свою сессию
+            self._sessions = scoped_session(sessionmaker(bind=self.engine))
         except Exception as e:
             raise DataBaseErrorException('Creating SQLite worker error', parent=e)
 
+    @property
+    def session(self) -> Session:
+        return self._sessions()
+
+    def get_parsed_hrefs(self, hrefs: Iterable[str]) -> set[str]:
+        """Hrefs from the given ones which already have an archive. One IN query per DEDUP_CHUNK_SIZE hrefs."""
+        hrefs = list(hrefs)
+        parsed = set()
+        try:
+            for i in range(0, len(hrefs), self.DEDUP_CHUNK_SIZE):
+                hashes = [href_hash(href) for href in hrefs[i:i + self.DEDUP_CHUNK_SIZE]]
+                parsed.update(href for href, in self.session.query(ArticleLink.href)
+                              .filter(ArticleLink.slug.in_(hashes))
+                              .filter(ArticleLink.article_archive_file_path.isnot(None))
+                              .filter(ArticleLink.article_archive_file_path != ''))
+        except Exception as e:
+            raise DataBaseErrorException(f'Searching parsed ArticleLink objects error', parent=e)
+        return parsed
+
+    def filter_not_parsed(self, news_list: Iterable[ArticleShortInfo]) -> List[ArticleShortInfo]:
+        """Drops already parsed links and repeated links, keeps order."""
+        unique = {}
+        for article in news_list:
+            unique.setdefault(article.link, article)
+        parsed = self.get_parsed_hrefs(unique)
+        logger.info(f'{len(parsed)} of {len(unique)} links already processed')
+        return [article for link, article in unique.items() if link not in parsed]
+
     def is_news_parsed(self, href: str) -> bool:
         try:
-            if self.session.query(ArticleLink).filter_by(href=href).first().article_archive_file_path:
+            if self.session.query(ArticleLink).filter_by(slug=href_hash(href)).first().article_archive_file_path:
                 return True
             return False
         except AttributeError:
@@ -144,19 +244,25 @@ class SQLiteWorker:
 
     def save_article_to_db(self, article_info: ArticleInfo, file_full_name: str):
         try:
-            if article_link := self.session.query(ArticleLink).filter_by(href=article_info.href).first():
+            if article_link := self.session.query(ArticleLink).filter_by(slug=href_hash(article_info.href)).first():
                 article_link.article_archive_file_path = file_full_name
                 article_link.published_dt = article_info.publication_dt
                 article_link.parsed_dt = article_info.parsing_dt
+                article_link.header = article_info.header
+                article_link.language = article_info.language
             else:
                 self.session.add(ArticleLink(
                     article_info.href,
-                    hashlib.sha256(article_info.href.encode()).hexdigest(),
+                    href_hash(article_info.href),
                     article_info.publication_dt,
                     article_info.parsing_dt,
                     0,
-                    file_full_name))
+                    file_full_name,
+                    article_info.header,
+                    article_info.language))
             self.session.commit()
             self.session.flush()
         except Exception as e:
+            # Сессия живёт весь прогон, поэтому после ошибки её нужно вернуть в рабочее состояние
+            self.session.rollback()
             raise DataBaseErrorException(f'Save article to DB error', parent=e)
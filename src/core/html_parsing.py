@@ -0,0 +1,191 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import List
+from bs4 import BeautifulSoup
+from src.conf import html_parser_backend
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+try:
+    import lxml.html
+    import cssselect
+except ImportError:
+    lxml = None
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+# Архивы извлекались html.parser: BeautifulSoup не отдаёт в text содержимое script, style и template,
+# а строку из одних ASCII пробелов заменяет на '\n' (если в ней есть перевод строки) или ' ',
+# кроме строк внутри pre и textarea. Остальные бэкенды собирают text по тем же правилам
+_SKIPPED_TEXT_TAGS = frozenset(('script', 'style', 'template'))
+_PRESERVE_WHITESPACE_TAGS = frozenset(('pre', 'textarea'))
+_ASCII_SPACES = ' \n\t\x0c\r'
+
+
+def _text_segment(text: str | None, preserve_whitespace: bool) -> str:
+    if not text:
+        return ''
+    if preserve_whitespace or text.strip(_ASCII_SPACES):
+        return text
+    return '\n' if '\n' in text else ' '
+
+
+class Node(ABC):
+    """Backend independent HTML node. Parsers only use CSS selectors, text and attributes."""
+
+    __slots__ = ('_node',)
+
+    def __init__(self, node):
+        self._node = node
+
+    @abstractmethod
+    def select(self, css: str) -> List['Node']:
+        ...
+
+    @abstractmethod
+    def select_one(self, css: str) -> 'Node | None':
+        ...
+
+    @property
+    @abstractmethod
+    def text(self) -> str:
+        """Text of the node and its descendants as BeautifulSoup with html.parser gives it."""
+
+    @property
+    @abstractmethod
+    def attrs(self) -> dict:
+        ...
+
+    def __getitem__(self, key: str) -> str:
+        return self.attrs[key]
+
+
+class _BS4Node(Node):
+    __slots__ = ()
+
+    def select(self, css: str) -> List[Node]:
+        return [_BS4Node(el) for el in self._node.select(css)]
+
+    def select_one(self, css: str) -> Node | None:
+        el = self._node.select_one(css)
+        return _BS4Node(el) if el is not None else None
+
+    @property
+    def text(self) -> str:
+        return self._node.text
+
+    @property
+    def attrs(self) -> dict:
+        return self._node.attrs
+
+
+class _LxmlNode(Node):
+    __slots__ = ()
+
+    def select(self, css: str) -> List[Node]:
+        return [_LxmlNode(el) for el in self._node.cssselect(css)]
+
+    def select_one(self, css: str) -> Node | None:
+        found = self._node.cssselect(css)
+        return _LxmlNode(found[0]) if found else None
+
+    @property
+    def text(self) -> str:
+        parts = []
+
+        def walk(el, preserve_whitespace: bool) -> None:
+            parts.append(_text_segment(el.text, preserve_whitespace))
+            for child in el:
+                # Комментарии и инструкции: tag не строка, их текст пропускаем, хвост - нет
+                if isinstance(child.tag, str) and child.tag not in _SKIPPED_TEXT_TAGS:
+                    walk(child, preserve_whitespace or child.tag in _PRESERVE_WHITESPACE_TAGS)
+                parts.append(_text_segment(child.tail, preserve_whitespace))
+
+        walk(self._node, any(el.tag in _PRESERVE_WHITESPACE_TAGS
+                             for el in (self._node, *self._node.iterancestors())))
+        return ''.join(parts)
+
+    @property
+    def attrs(self) -> dict:
+        return self._node.attrib
+
+
+class _LexborNode(Node):
+    __slots__ = ()
+
+    def select(self, css: str) -> List[Node]:
+        return [_LexborNode(el) for el in self._node.css(css)]
+
+    def select_one(self, css: str) -> Node | None:
+        el = self._node.css_first(css)
+        return _LexborNode(el) if el is not None else None
+
+    @property
+    def text(self) -> str:
+        parts = []
+
+        def walk(node, preserve_whitespace: bool) -> None:
+            for child in node.iter(include_text=True):
+                tag = child.tag or '-'
+                if tag == '-text':
+                    parts.append(_text_segment(child.text_content, preserve_whitespace))
+                # -comment, инструкции (tag None) и прочие служебные узлы пропускаем
+                elif not tag.startswith('-') and tag not in _SKIPPED_TEXT_TAGS:
+                    walk(child, preserve_whitespace or tag in _PRESERVE_WHITESPACE_TAGS)
+
+        node = self._node.root if isinstance(self._node, LexborHTMLParser) else self._node
+        preserve_whitespace, parent = False, node
+        while parent is not None and not preserve_whitespace:
+            preserve_whitespace, parent = parent.tag in _PRESERVE_WHITESPACE_TAGS, parent.parent
+        walk(node, preserve_whitespace)
+        return ''.join(parts)
+
+    @property
+    def attrs(self) -> dict:
+        return self._node.attributes
+
+
+def available_backends() -> List[str]:
+    backends = []
+    if LexborHTMLParser is not None:
+        backends.append('selectolax')
+    if lxml is not None:
+        backends.append('lxml')
+    backends.append('html.parser')
+    return backends
+
+
+def _resolve_backend(name: str) -> str:
+    if name == 'auto':
+        return available_backends()[0]
+    if name not in available_backends():
+        logger.warning(f'HTML parser backend {name} is not installed, fall back to html.parser')
+        return 'html.parser'
+    return name
+
+
+_backend = _resolve_backend(html_parser_backend)
+
+
+def set_backend(name: str) -> str:
+    global _backend
+    _backend = _resolve_backend(name)
+    return _backend
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def parse_html(html: str) -> Node:
+    """Parses document with the current backend. Selectors must not use soupsieve-only syntax
+    (:is(), :-soup-contains() etc.), use comma separated lists instead."""
+    if _backend == 'selectolax':
+        return _LexborNode(LexborHTMLParser(html))
+    if _backend == 'lxml':
+        return _LxmlNode(lxml.html.document_fromstring(html))
+    return _BS4Node(BeautifulSoup(html, "html.parser"))
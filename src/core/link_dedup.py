@@ -0,0 +1,73 @@
+import logging
+import threading
+from typing import Iterable, Iterator, List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from src.core.structures import ArticleShortInfo
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+TRACKING_PARAMS = frozenset({'fbclid', 'gclid', 'yclid', 'mc_cid', 'mc_eid', 'ref', 'utm'})
+TRACKING_PREFIXES = ('utm_',)
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def normalize_url(href: str) -> str:
+    """Canonical form of article url used as dedup key.
+
+    Scheme and host are lowercased, www. prefix, fragment, tracking params and
+    trailing slash are dropped, remaining query params are sorted.
+    """
+    parts = urlsplit(href.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parts.path.rstrip('/') or '/'
+    query = urlencode(sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                             if not _is_tracking_param(name)))
+    return urlunsplit(((parts.scheme or 'https').lower(), host, path, query, ''))
+
+
+class LinkDeduplicator:
+    """Thread-safe set of seen links, keyed on normalize_url.
+
+    One instance is shared by all tag walkers of a run, so an article listed under
+    several tags is emitted once. suppressed counts dropped duplicates.
+    """
+
+    def __init__(self):
+        self._seen = set()
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def __contains__(self, href: str) -> bool:
+        return normalize_url(href) in self._seen
+
+    def filter(self, articles: Iterable[ArticleShortInfo]) -> List[ArticleShortInfo]:
+        """Returns articles not seen before (in original order) and marks them as seen."""
+        keyed = [(normalize_url(article.link), article) for article in articles]
+        new_articles = []
+        with self._lock:
+            for key, article in keyed:
+                if key in self._seen:
+                    self.suppressed += 1
+                    continue
+                self._seen.add(key)
+                new_articles.append(article)
+        return new_articles
+
+    def filter_pages(self, pages: Iterable[List[ArticleShortInfo]]) -> Iterator[List[ArticleShortInfo]]:
+        """Streaming variant of filter: skips pages left empty after dedup."""
+        for page in pages:
+            if page := self.filter(page):
+                yield page
+        logger.info(f'Links emitted: {len(self)}, duplicates suppressed: {self.suppressed}')
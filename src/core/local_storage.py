@@ -1,85 +1,380 @@
+import io
 import os
 import json
 import lzma
+import random
+import struct
 import zipfile
+import argparse
 import tempfile
 import hashlib # md5, sha1, sha224, sha256, sha384, sha512
 from datetime import datetime
 from src.core.structures.custom_exceptions import SavingErrorException, ReadingErrorException
 from src.const import ROOT_DIR, conf_last_parsing_dt_filename
 from src.core.structures import ArticleInfo
-from src.conf import dir_name_archives, dir_name_html, dir_name_json
+from src.conf import dir_name_archives, dir_name_html, dir_name_json, archive_store, archive_codec
+from src.core.segment_store import get_segment_store
+from src.core.networking.rate_limiter import get_domain
+from src.core import archive_codecs
 import logging
 
 
 logger = logging.getLogger(__name__)
 
 
+# Путь архива в сегментном хранилище: segment:<sha256 от href>
+SEGMENT_PREFIX = 'segment:'
+
+
+ARCHIVE_EXTENSIONS = {'lzma': '.xz', 'zstd': '.zst'}
+
+
+# Версия раскладки архива. 1 (без поля layout) - html лежит и в article.html, и внутри article.json.
+# 2 - article.json идёт первым и хранит только метаданные и текст, html - в члене html_member
+ARCHIVE_LAYOUT = 2
+JSON_MEMBER = 'article.json'
+HTML_MEMBER = 'article.html'
+ZIP_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+ZIP_LOCAL_MAGIC = b'PK\x03\x04'
+
+
+def _article_json(article: ArticleInfo) -> bytes:
+    json_obj = {'layout': ARCHIVE_LAYOUT, 'html_member': HTML_MEMBER, **article._asdict()}
+    del json_obj['html']
+    json_obj['publication_dt'] = json_obj['publication_dt'].isoformat()
+    json_obj['parsing_dt'] = json_obj['parsing_dt'].isoformat()
+    return json.dumps(json_obj, indent=4).encode('utf-8')
+
+
+def _write_archive(fp, article: ArticleInfo, codec: str = archive_codec) -> None:
+    """Writes zip(article.json, article.html) compressed by codec to file object.
+
+    lzma archives keep the headerless .xz format, other codecs get an
+    archive_codecs.ARCHIVE_HEADER with codec and dictionary id. The zip is built in
+    memory so local headers carry sizes and read_metadata can stop after article.json.
+    """
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as zpf:
+        zpf.writestr(JSON_MEMBER, _article_json(article))
+        zpf.writestr(HTML_MEMBER, article.html.encode('utf-8'))
+    if codec == 'lzma':
+        fp.write(lzma.compress(buf.getbuffer()))
+        return
+    dictionary = archive_codecs.get_site_dictionary(get_domain(article.href))
+    fp.write(archive_codecs.compress(buf.getvalue(), codec, dictionary))
+
+
+def pack_archive(article: ArticleInfo) -> bytes:
+    """Compressed archive of article, as save_to_disk stores it in the segment store."""
+    buf = io.BytesIO()
+    _write_archive(buf, article)
+    return buf.getvalue()
+
+
+def _href_key(href: str) -> str:
+    return hashlib.sha256(f"{href}".encode()).hexdigest()
+
+
+def put_packed_archive(href: str, payload: bytes) -> str:
+    """Stores an archive built by pack_archive in the segment store, returns its path.
+
+    The segment store has a single writer: worker processes only pack, the parent puts."""
+    key = _href_key(href)
+    try:
+        store = get_segment_store()
+        if key in store:
+            logger.warning(f'Record {key} already exists')
+        else:
+            store.put(key, payload)
+    except Exception as e:
+        raise SavingErrorException(f'Segment store key: {key}\nHref: {href}', parent=e)
+    return SEGMENT_PREFIX + key
+
+
+def _save_to_segment_store(article: ArticleInfo, key: str) -> str:
+    store = get_segment_store()
+    if key in store:
+        logger.warning(f'Record {key} already exists')
+    else:
+        store.put(key, pack_archive(article))
+    return SEGMENT_PREFIX + key
+
+
 def save_to_disk(article: ArticleInfo = None, file_name: str = '') -> str:
     try:
         if not article:
             raise SavingErrorException(f'File_name: {file_name}\nReason: Empty article')
+        if archive_store == 'segments' and not file_name:
+            return _save_to_segment_store(article, _href_key(article.href))
         if not file_name:
-            file_name = f'{hashlib.sha256(f"{article.href}".encode()).hexdigest()}.xz'
+            file_name = f'{_href_key(article.href)}{ARCHIVE_EXTENSIONS[archive_codec]}'
         file_full_name = os.path.join(ROOT_DIR + dir_name_archives, file_name)
         if os.path.isfile(file_full_name):
             logger.warning(f'File {file_name} already exists')
             return file_full_name
-        with tempfile.TemporaryDirectory() as temp_dir:
-            with open(os.path.join(temp_dir, 'article.html'), 'wb') as f:
-                f.write(bytes(article.html, 'utf-8'))
-            json_obj = article._asdict()
-            json_obj['publication_dt'] = json_obj['publication_dt'].isoformat()
-            json_obj['parsing_dt'] = json_obj['parsing_dt'].isoformat()
-            with open(os.path.join(temp_dir, 'article.json'), "wb") as f:
-                f.write(bytes(json.dumps(json_obj, indent=4), 'utf-8'))
-            with zipfile.ZipFile(os.path.join(temp_dir, file_name), "w") as zpf:
-                zpf.write(os.path.join(temp_dir, 'article.html'), 'article.html')
-                zpf.write(os.path.join(temp_dir, 'article.json'), 'article.json')
-            with open(os.path.join(temp_dir, file_name), "rb") as arch, \
-                 open(file_full_name, "wb") as lzout:
-                lzout.write(lzma.compress(arch.read()))
+        # Пишем во временный файл рядом и переименовываем, чтобы не оставить недописанный архив
+        fd, tmp_name = tempfile.mkstemp(dir=os.path.dirname(file_full_name), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                _write_archive(f, article)
+            os.replace(tmp_name, file_full_name)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
         return file_full_name
     except Exception as e:
         raise SavingErrorException(f'File_name: {file_name}\nArticle: {article._asdict()}', parent=e)
 
 
+def _archive_key(file_name: str) -> str:
+    if file_name.startswith(SEGMENT_PREFIX):
+        return file_name[len(SEGMENT_PREFIX):]
+    return os.path.splitext(os.path.basename(file_name))[0]
+
+
+def read_archive_bytes(file_name: str) -> bytes:
+    """Compressed archive by file name, full path or segment store path. Archives written
+    as separate files stay readable after switching archive_store to segments."""
+    if not file_name.startswith(SEGMENT_PREFIX):
+        file_full_name = os.path.join(ROOT_DIR + dir_name_archives, file_name)
+        if archive_store != 'segments' or os.path.isfile(file_full_name):
+            with open(file_full_name, 'rb') as compressed:
+                return compressed.read()
+    return get_segment_store().get(_archive_key(file_name))
+
+
+def _open_zip(data: bytes) -> zipfile.ZipFile:
+    # BytesIO над bytes не копирует буфер, zip читается прямо из распакованных данных
+    return zipfile.ZipFile(io.BytesIO(archive_codecs.decompress(data)), "r")
+
+
+def _open_archive(file_name: str) -> zipfile.ZipFile:
+    return _open_zip(read_archive_bytes(file_name))
+
+
 def decompress_archive(file_name):
     try:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            with open(os.path.join(ROOT_DIR + dir_name_archives, file_name), 'rb') as compressed, \
-                    open(os.path.join(temp_dir, file_name), 'wb') as decompressed:
-                decompressed.write(lzma.decompress(compressed.read()))
-            with zipfile.ZipFile(os.path.join(temp_dir, file_name), "r") as fp:
-                with open(os.path.join(ROOT_DIR + dir_name_html, f'{file_name[:-3]}_article.html'), 'wb') as html_file, \
-                        open(os.path.join(ROOT_DIR + dir_name_json, f'{file_name[:-3]}_article.json'), 'wb') as json_file:
-                    html_file.write(fp.read('article.html'))
-                    json_file.write(fp.read('article.json'))
+        key = _archive_key(file_name)
+        with _open_archive(file_name) as fp:
+            with open(os.path.join(ROOT_DIR + dir_name_html, f'{key}_article.html'), 'wb') as html_file, \
+                    open(os.path.join(ROOT_DIR + dir_name_json, f'{key}_article.json'), 'wb') as json_file:
+                html_file.write(fp.read(HTML_MEMBER))
+                json_file.write(fp.read(JSON_MEMBER))
     except Exception as e:
         raise ReadingErrorException(f'Decompress error\nFile_name: {file_name}', parent=e)
 
 
+def _article_info(jsn: dict, html: str) -> ArticleInfo:
+    return ArticleInfo(
+        header=jsn['header'],
+        content=jsn['content'],
+        publication_dt=datetime.fromisoformat(jsn['publication_dt']),
+        parsing_dt=datetime.fromisoformat(jsn['parsing_dt']),
+        html=html,
+        href=jsn['href'],
+        language=jsn['language']
+    )
+
+
+def _read_article(fp: zipfile.ZipFile) -> ArticleInfo:
+    jsn = json.loads(fp.read(JSON_MEMBER).decode('utf8'))
+    if jsn.get('layout', 1) >= 2:
+        return _article_info(jsn, fp.read(jsn['html_member']).decode('utf8'))
+    return _article_info(jsn, jsn['html'])
+
+
+def read_from_bytes(data: bytes) -> ArticleInfo:
+    """read_from_disk for an archive already in memory (compressed bytes as stored)."""
+    try:
+        with _open_zip(data) as fp:
+            return _read_article(fp)
+    except Exception as e:
+        raise ReadingErrorException(f'Read from bytes error', parent=e)
+
+
 def read_from_disk(file_name: str = '') -> ArticleInfo:
     try:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            with open(os.path.join(ROOT_DIR + dir_name_archives, file_name), 'rb') as compressed, \
-                    open(os.path.join(temp_dir, file_name), 'wb') as decompressed:
-                decompressed.write(lzma.decompress(compressed.read()))
-            with zipfile.ZipFile(os.path.join(temp_dir, file_name), "r") as fp:
-                jsn = json.loads(fp.read('article.json').decode('utf8'))
-                return ArticleInfo(
-                    header=jsn['header'],
-                    content=jsn['content'],
-                    publication_dt=datetime.fromisoformat(jsn['publication_dt']),
-                    parsing_dt=datetime.fromisoformat(jsn['parsing_dt']),
-                    html=jsn['html'],
-                    href=jsn['href'],
-                    language=jsn['language']
-                )
+        with _open_archive(file_name) as fp:
+            return _read_article(fp)
     except Exception as e:
         raise ReadingErrorException(f'Read from file error\nFile_name: {file_name}', parent=e)
 
 
+def _read_leading_json(data: bytes) -> dict | None:
+    """article.json of layout 2 archive from the head of the stream, None for older layouts."""
+    with archive_codecs.open_stream(data) as stream:
+        header = stream.read(ZIP_LOCAL_HEADER.size)
+        if len(header) < ZIP_LOCAL_HEADER.size:
+            return None
+        magic, _, flags, method, _, _, _, compress_size, _, name_len, extra_len = ZIP_LOCAL_HEADER.unpack(header)
+        # Потоковая запись layout 1 ставит data descriptor (0x08), размера в заголовке нет
+        if magic != ZIP_LOCAL_MAGIC or flags & 0x08 or method != zipfile.ZIP_STORED:
+            return None
+        name = stream.read(name_len)
+        if name != JSON_MEMBER.encode():
+            return None
+        stream.read(extra_len)
+        jsn = json.loads(stream.read(compress_size).decode('utf8'))
+    return jsn if jsn.get('layout', 1) >= 2 else None
+
+
+def read_metadata_from_bytes(data: bytes) -> ArticleInfo:
+    """ArticleInfo without html. For layout 2 archives only the leading article.json is inflated."""
+    try:
+        if (jsn := _read_leading_json(data)) is not None:
+            return _article_info(jsn, '')
+        with _open_zip(data) as fp:
+            return _article_info(json.loads(fp.read(JSON_MEMBER).decode('utf8')), '')
+    except Exception as e:
+        raise ReadingErrorException(f'Read metadata error', parent=e)
+
+
+def read_metadata(file_name: str = '') -> ArticleInfo:
+    try:
+        return read_metadata_from_bytes(read_archive_bytes(file_name))
+    except Exception as e:
+        raise ReadingErrorException(f'Read metadata error\nFile_name: {file_name}', parent=e)
+
+
+def read_html_from_bytes(data: bytes) -> str:
+    try:
+        with _open_zip(data) as fp:
+            jsn = json.loads(fp.read(JSON_MEMBER).decode('utf8'))
+            if jsn.get('layout', 1) >= 2:
+                return fp.read(jsn['html_member']).decode('utf8')
+            return jsn['html']
+    except Exception as e:
+        raise ReadingErrorException(f'Read html error', parent=e)
+
+
+class LazyArticleInfo:
+    """ArticleInfo look-alike that reads the archive on first access to a field.
+
+    Fields passed to the constructor (e.g. taken from the journal) never touch the
+    archive. The other metadata fields are loaded together by read_metadata, html is
+    loaded on its own. source is what read_from_disk accepts or compressed archive bytes.
+
+        article = LazyArticleInfo(path, href=href, publication_dt=published_dt)
+        article.header      # inflates only article.json
+        article.html        # inflates the whole archive
+    """
+
+    __slots__ = ('source', '_fields')
+
+    def __init__(self, source: str | bytes, **fields):
+        if unknown := set(fields) - set(ArticleInfo._fields):
+            raise TypeError(f'Unknown ArticleInfo fields: {", ".join(sorted(unknown))}')
+        self.source = source
+        self._fields = fields
+
+    def _data(self) -> bytes:
+        if isinstance(self.source, str):
+            return read_archive_bytes(self.source)
+        return self.source
+
+    def __getattr__(self, name: str):
+        if name not in ArticleInfo._fields:
+            raise AttributeError(name)
+        if name not in self._fields:
+            try:
+                if name == 'html':
+                    self._fields['html'] = read_html_from_bytes(self._data())
+                else:
+                    for key, value in read_metadata_from_bytes(self._data())._asdict().items():
+                        if key != 'html':
+                            self._fields.setdefault(key, value)
+            except ReadingErrorException:
+                raise
+            except Exception as e:
+                raise ReadingErrorException(f'Lazy read error\nSource: {self}', parent=e)
+        return self._fields[name]
+
+    def loaded(self) -> tuple[str, ...]:
+        """Names of fields available without reading the archive."""
+        return tuple(name for name in ArticleInfo._fields if name in self._fields)
+
+    def to_article_info(self) -> ArticleInfo:
+        return ArticleInfo(**{name: getattr(self, name) for name in ArticleInfo._fields})
+
+    def __repr__(self) -> str:
+        source = repr(self.source) if isinstance(self.source, str) else f'<{len(self.source)} bytes>'
+        return f'LazyArticleInfo({source}, loaded={self.loaded()})'
+
+
+def convert_archive(file_name: str) -> bool:
+    """Rewrites archive in ARCHIVE_LAYOUT keeping its codec. Returns False if it is already converted.
+
+    Files are replaced atomically, segment records are appended anew and the old copy
+    is reclaimed by SegmentStore.compact.
+    """
+    try:
+        data = read_archive_bytes(file_name)
+        if _read_leading_json(data) is not None:
+            return False
+        with _open_zip(data) as fp:
+            article = _read_article(fp)
+        buf = io.BytesIO()
+        _write_archive(buf, article, archive_codecs.codec_name(data))
+        file_full_name = os.path.join(ROOT_DIR + dir_name_archives, file_name)
+        if file_name.startswith(SEGMENT_PREFIX) or not os.path.isfile(file_full_name):
+            get_segment_store().put(_archive_key(file_name), buf.getvalue())
+            return True
+        fd, tmp_name = tempfile.mkstemp(dir=os.path.dirname(file_full_name), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(buf.getbuffer())
+            os.replace(tmp_name, file_full_name)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+        return True
+    except Exception as e:
+        raise SavingErrorException(f'Convert archive error\nFile_name: {file_name}', parent=e)
+
+
+def convert_archives(file_names: list[str] | None = None) -> tuple[int, int]:
+    """Converts file archives (all of the archive directory by default) to ARCHIVE_LAYOUT.
+
+    Failed archives are logged and skipped. Returns (converted, bytes saved).
+    """
+    if file_names is None:
+        dir_name = ROOT_DIR + dir_name_archives
+        file_names = sorted(name for name in os.listdir(dir_name) if name.endswith(tuple(ARCHIVE_EXTENSIONS.values())))
+    converted = saved = 0
+    for i, file_name in enumerate(file_names, 1):
+        try:
+            size = len(read_archive_bytes(file_name))
+            if convert_archive(file_name):
+                converted += 1
+                saved += size - len(read_archive_bytes(file_name))
+        except (ReadingErrorException, SavingErrorException) as e:
+            logger.error(f'Skip {file_name}: {e}')
+        if i % 1000 == 0:
+            logger.info(f'Checked {i}/{len(file_names)} archives, converted {converted}, saved {saved / 2 ** 20:.1f} MiB')
+    logger.info(f'Converted {converted} of {len(file_names)} archives, saved {saved / 2 ** 20:.1f} MiB')
+    return converted, saved
+
+
+def train_site_dictionary(site: str, sample_count: int = 2000):
+    """Trains zstd dictionary for site on a random sample of existing file archives."""
+    try:
+        dir_name = ROOT_DIR + dir_name_archives
+        names = [name for name in os.listdir(dir_name) if name.endswith(tuple(ARCHIVE_EXTENSIONS.values()))]
+        random.shuffle(names)
+        samples = []
+        for name in names:
+            payload = archive_codecs.decompress(read_archive_bytes(name))
+            with zipfile.ZipFile(io.BytesIO(payload), "r") as fp:
+                if get_domain(json.loads(fp.read(JSON_MEMBER))['href']) != site:
+                    continue
+            samples.append(payload)
+            if len(samples) >= sample_count:
+                break
+        return archive_codecs.train_site_dictionary(site, samples)
+    except Exception as e:
+        raise ReadingErrorException(f'Dictionary training error\nSite: {site}', parent=e)
+
+
 def get_last_pars_dt() -> datetime:
     try:
         with open(conf_last_parsing_dt_filename, 'r') as dtf:
@@ -92,3 +387,21 @@ def get_last_pars_dt() -> datetime:
 def set_last_pars_dt():
     with open(conf_last_parsing_dt_filename, 'w') as f:
         f.write(datetime.now().isoformat())
+
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description='Local storage maintenance')
+    args_parser.add_argument('command', choices=['train-dictionary', 'convert-layout'])
+    args_parser.add_argument('site', nargs='?', help='Site domain for train-dictionary, e.g. coindesk.com')
+    args_parser.add_argument('--samples', type=int, default=2000, help='Archives to train on')
+    args_parser.add_argument('--segments', action='store_true', help='convert-layout: also convert segment store records')
+    args = args_parser.parse_args()
+    if args.command == 'train-dictionary':
+        if not args.site:
+            args_parser.error('train-dictionary requires site')
+        train_site_dictionary(args.site, args.samples)
+    else:
+        logging.basicConfig(level=logging.INFO)
+        convert_archives()
+        if args.segments:
+            convert_archives([SEGMENT_PREFIX + key for key in get_segment_store().keys()])
@@ -1,2 +1,13 @@
 from .networking import get_html_from_url
 from .networking import get_json_from_url
+from .networking import get_html_bytes_from_url
+from .http_client import HTTPClient
+from .http_client import get_http_client
+from .rate_limiter import RateLimiter
+from .rate_limiter import get_rate_limiter
+from .http_cache import HTTPCache
+from .http_cache import get_http_cache
+from .graphql import GraphQLOperation
+from .retry import RetryPolicy
+from .retry import CircuitBreakers
+from .retry import get_circuit_breakers
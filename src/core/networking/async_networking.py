@@ -0,0 +1,122 @@
+import time
+import asyncio
+import logging
+import aiohttp
+from src.conf import async_max_in_flight, async_limit_per_host, http_connect_timeout, http_read_timeout
+from src.core.structures.custom_exceptions import RequestErrorException, CircuitOpenException
+from .http_client import DEFAULT_USER_AGENT
+from .graphql import JSON_HEADERS
+from .rate_limiter import RateLimiter, get_rate_limiter, parse_retry_after, get_domain
+from .retry import RetryPolicy, CircuitBreakers, get_circuit_breakers
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+class AsyncHTTPClient:
+    """aiohttp based client for the async crawl mode. One keep-alive connector for all hosts.
+    Requests share per domain budget of rate_limiter, retry policy and circuit breakers with the sync HTTPClient.
+
+    Use as async context manager:
+        async with AsyncHTTPClient() as client:
+            html = await client.get_html(href)
+    """
+
+    def __init__(self,
+                 limit: int = async_max_in_flight,
+                 limit_per_host: int = async_limit_per_host,
+                 connect_timeout: float = http_connect_timeout,
+                 read_timeout: float = http_read_timeout,
+                 rate_limiter: RateLimiter | None = None,
+                 retry_policy: RetryPolicy | None = None,
+                 breakers: CircuitBreakers | None = None):
+        self.limit = limit
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter()
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.breakers = breakers if breakers is not None else get_circuit_breakers()
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self._session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self) -> 'AsyncHTTPClient':
+        connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host)
+        self._session = aiohttp.ClientSession(connector=connector,
+                                              timeout=self.timeout,
+                                              headers={'User-Agent': DEFAULT_USER_AGENT})
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self._session.close()
+        self._session = None
+
+    async def _send(self, method: str, href: str, read_json: bool = False,
+                    **kwargs) -> tuple[int, str, str | dict, float | None]:
+        limiter = self.rate_limiter.for_url(href)
+        await limiter.acquire_async()
+        status = retry_after = None
+        start = time.monotonic()
+        try:
+            async with self._session.request(method, href, **kwargs) as r:
+                status = r.status
+                retry_after = parse_retry_after(r.headers.get('Retry-After'))
+                if status >= 400:
+                    return r.status, r.reason, await r.text(), retry_after
+                body = await r.json(content_type=None) if read_json else await r.text()
+                return r.status, r.reason, body, retry_after
+        finally:
+            limiter.release(time.monotonic() - start, status, retry_after)
+
+    async def _request(self, method: str, href: str, read_json: bool = False, idempotent: bool | None = None,
+                       **kwargs) -> tuple[int, str, str | dict]:
+        """Same retry and circuit breaker rules as HTTPClient.request."""
+        breaker = self.breakers.for_url(href)
+        attempts = self.retry_policy.attempts(method, idempotent)
+        attempt = 0
+        while True:
+            attempt += 1
+            if not breaker.allow():
+                raise CircuitOpenException(f'Circuit of {get_domain(href)} is open, request is not sent\nURL:{href}')
+            try:
+                status, reason, body, retry_after = await self._send(method, href, read_json, **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                breaker.record_failure()
+                if attempt >= attempts:
+                    raise
+                delay = self.retry_policy.delay(attempt)
+            else:
+                breaker.record_status(status)
+                if attempt >= attempts or status not in self.retry_policy.retry_statuses:
+                    return status, reason, body
+                delay = self.retry_policy.delay(attempt, retry_after)
+                if delay is None:
+                    return status, reason, body
+            logger.info(f'Retry {method} {href} in {delay:.2f} s, attempt {attempt} of {attempts} failed')
+            await asyncio.sleep(delay)
+
+    async def get_html(self, href: str, headers: dict = None, cookies: dict = None) -> str:
+        try:
+            status, reason, text = await self._request('GET', href, headers=headers, cookies=cookies)
+        except Exception as e:
+            raise RequestErrorException('Invalid request', parent=e)
+        if status >= 400:
+            raise RequestErrorException(f'Response error\nURL:{href}\nStatus:{status}\nReason:{reason}')
+        if not text.strip():
+            raise RequestErrorException(f'Empty response body error')
+        return text
+
+    async def get_json(self, href: str, headers: dict = None, cookies: dict = None, json: dict = None,
+                       data: bytes = None, idempotent: bool = False) -> dict:
+        if data is not None:
+            headers = {**JSON_HEADERS, **(headers or {})}
+        try:
+            status, reason, json_data = await self._request('POST', href, read_json=True, idempotent=idempotent,
+                                                            headers=headers, cookies=cookies, json=json, data=data)
+        except Exception as e:
+            raise RequestErrorException('Error in getting JSON\n'
+                                        f'Headers = {headers}\n'
+                                        f'Cookies = {cookies}\n'
+                                        f'JSON = {json if data is None else data[:1000]}\n', parent=e)
+        if status >= 400:
+            raise RequestErrorException(f'Response error\nURL:{href}\nStatus:{status}\nReason:{reason}')
+        return json_data
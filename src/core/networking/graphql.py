@@ -0,0 +1,50 @@
+import json
+from typing import Iterable
+
+
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+class GraphQLOperation:
+    """Prepared GraphQL POST body.
+
+    Query and static variables are serialized once, body() only encodes the per-call
+    variables and splices them into the byte template. Equal variables give equal bytes,
+    so the body is also a stable HTTP cache key.
+
+        operation = GraphQLOperation(url, 'TagPageQuery', query, {'short': 'en'}, ('slug', 'offset'))
+        get_json_from_url(operation.url, data=operation.body(slug='bitcoin', offset=0),
+                          idempotent=operation.idempotent)
+    """
+
+    def __init__(self,
+                 url: str,
+                 operation_name: str,
+                 query: str,
+                 variables: dict | None = None,
+                 variable_names: Iterable[str] = ()):
+        self.url = url
+        self.operation_name = operation_name
+        self.query = query
+        self.variables = dict(variables or {})
+        self.variable_names = tuple(variable_names)
+        # query только читает, его можно безопасно повторить; mutation - нет
+        self.idempotent = not query.lstrip().startswith('mutation')
+        # Заглушки на месте переменных вызова, по ним сериализованное тело режется на куски
+        markers = {name: f'\0{name}\0' for name in self.variable_names}
+        template = json.dumps({'operationName': operation_name,
+                               'query': query,
+                               'variables': {**self.variables, **markers}},
+                              separators=(',', ':')).encode()
+        self._parts = []
+        for name in self.variable_names:
+            head, template = template.split(json.dumps(markers[name]).encode())
+            self._parts.append(head)
+        self._parts.append(template)
+
+    def body(self, **variables) -> bytes:
+        chunks = [self._parts[0]]
+        for name, part in zip(self.variable_names, self._parts[1:]):
+            chunks.append(json.dumps(variables[name], separators=(',', ':')).encode())
+            chunks.append(part)
+        return b''.join(chunks)
@@ -0,0 +1,137 @@
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import NamedTuple
+from src.const import ROOT_DIR
+from src.conf import dir_name_http_cache, http_cache_max_bytes, http_cache_ttl
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+class CacheEntry(NamedTuple):
+    body: str
+    etag: str | None
+    last_modified: str | None
+    stored_at: float
+
+
+class HTTPCache:
+    """On-disk response cache with conditional revalidation and size bounded LRU eviction.
+
+    Entries younger than ttl are returned without a request, older ones are revalidated
+    with If-None-Match/If-Modified-Since. Bodies are kept in one SQLite file.
+
+    Attributes:
+        ttl -- seconds an entry is served without revalidation
+        max_bytes -- total bodies size, least recently used entries are evicted above it
+    """
+
+    def __init__(self,
+                 file_name: str = os.path.join(ROOT_DIR + dir_name_http_cache, 'http_cache.sqlite'),
+                 max_bytes: int = http_cache_max_bytes,
+                 ttl: float = http_cache_ttl):
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = self.revalidated = self.misses = self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(file_name, check_same_thread=False, isolation_level=None)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS entries ('
+                           'key TEXT PRIMARY KEY, url TEXT, etag TEXT, last_modified TEXT, '
+                           'stored_at REAL, accessed_at REAL, size INTEGER, body TEXT)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries(accessed_at)')
+        self._total_size = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    @staticmethod
+    def make_key(method: str, href: str, body: dict | bytes | None = None) -> str:
+        key = f'{method} {href}'
+        if body is not None:
+            if not isinstance(body, bytes):
+                body = json.dumps(body, sort_keys=True).encode()
+            key += ' ' + hashlib.sha256(body).hexdigest()
+        return key
+
+    def get(self, key: str) -> CacheEntry | None:
+        with self._lock:
+            row = self._conn.execute('SELECT body, etag, last_modified, stored_at FROM entries WHERE key = ?',
+                                     (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        return CacheEntry(*row)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.stored_at < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: CacheEntry) -> dict:
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def record_hit(self, entry: CacheEntry, revalidated: bool = False) -> None:
+        with self._lock:
+            if revalidated:
+                self.revalidated += 1
+            else:
+                self.hits += 1
+            self.bytes_saved += len(entry.body.encode())
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def refresh(self, key: str) -> None:
+        """Entry was confirmed by 304 response, serve it for another ttl."""
+        with self._lock:
+            self._conn.execute('UPDATE entries SET stored_at = ? WHERE key = ?', (time.time(), key))
+
+    def put(self, key: str, href: str, body: str, etag: str | None = None, last_modified: str | None = None) -> None:
+        size = len(body.encode())
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            self._conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                               (key, href, etag, last_modified, now, now, size, body))
+            self._total_size += size - (old[0] if old else 0)
+            if self._total_size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        for key, size in self._conn.execute('SELECT key, size FROM entries ORDER BY accessed_at').fetchall():
+            if self._total_size <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self._total_size -= size
+            logger.debug(f'Evict {key} from HTTP cache')
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits,
+                    'revalidated': self.revalidated,
+                    'misses': self.misses,
+                    'bytes_saved': self.bytes_saved,
+                    'size': self._total_size}
+
+
+_default_cache: HTTPCache | None = None
+_default_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> HTTPCache:
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = HTTPCache()
+        return _default_cache
@@ -0,0 +1,162 @@
+import time
+import threading
+import logging
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from src.conf import http_pool_maxsize, http_connect_timeout, http_read_timeout
+from src.core.structures.custom_exceptions import CircuitOpenException
+from .rate_limiter import RateLimiter, get_rate_limiter, parse_retry_after, get_domain
+from .retry import RetryPolicy, CircuitBreakers, get_circuit_breakers
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36'
+
+
+class HTTPClient:
+    """Thread-safe HTTP client with one pooled keep-alive session per host.
+
+    Attributes:
+        pool_maxsize -- max kept-alive connections per host
+        timeout -- (connect, read) timeout in seconds passed to every request
+        rate_limiter -- per domain rate and concurrency governor, None - no limits
+        retry_policy -- retries of transport errors and 5xx/429, None - single attempt
+        breakers -- per domain circuit breakers, None - always send
+    """
+
+    def __init__(self,
+                 pool_maxsize: int = http_pool_maxsize,
+                 connect_timeout: float = http_connect_timeout,
+                 read_timeout: float = http_read_timeout,
+                 rate_limiter: RateLimiter | None = None,
+                 retry_policy: RetryPolicy | None = None,
+                 breakers: CircuitBreakers | None = None):
+        self.pool_maxsize = pool_maxsize
+        self.timeout = (connect_timeout, read_timeout)
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.breakers = breakers
+        self._sessions: dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        # Один пул на хост, размер пула покрывает все потоки, которые ходят на этот хост
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        # ACCEPT_ENCODING содержит br только если установлен brotli
+        session.headers.update({'User-Agent': DEFAULT_USER_AGENT,
+                                'Accept-Encoding': ACCEPT_ENCODING})
+        return session
+
+    def get_session(self, href: str) -> requests.Session:
+        host = urlsplit(href).netloc.lower()
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                logger.debug(f'Create HTTP session for host {host}')
+                session = self._sessions[host] = self._create_session()
+        return session
+
+    def _send(self, method: str, href: str, **kwargs) -> requests.Response:
+        session = self.get_session(href)
+        if self.rate_limiter is None:
+            return session.request(method, href, **kwargs)
+        limiter = self.rate_limiter.for_url(href)
+        limiter.acquire()
+        status = retry_after = None
+        start = time.monotonic()
+        try:
+            r = session.request(method, href, **kwargs)
+            status = r.status_code
+            retry_after = parse_retry_after(r.headers.get('Retry-After'))
+            return r
+        finally:
+            limiter.release(time.monotonic() - start, status, retry_after)
+
+    def request(self, method: str, href: str, idempotent: bool | None = None, **kwargs) -> requests.Response:
+        """Sends request with retries of retry_policy. idempotent=True allows retries of POST.
+
+        Returns the last response (its status is checked by the caller), raises the last
+        transport error or CircuitOpenException if the host's circuit is open.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        breaker = self.breakers.for_url(href) if self.breakers else None
+        attempts = self.retry_policy.attempts(method, idempotent) if self.retry_policy else 1
+        attempt = 0
+        while True:
+            attempt += 1
+            if breaker and not breaker.allow():
+                raise CircuitOpenException(f'Circuit of {get_domain(href)} is open, request is not sent\nURL:{href}')
+            try:
+                r = self._send(method, href, **kwargs)
+            except requests.RequestException:
+                if breaker:
+                    breaker.record_failure()
+                if attempt >= attempts:
+                    raise
+                delay = self.retry_policy.delay(attempt)
+            else:
+                if breaker:
+                    breaker.record_status(r.status_code)
+                if attempt >= attempts or r.status_code not in self.retry_policy.retry_statuses:
+                    return r
+                delay = self.retry_policy.delay(attempt, parse_retry_after(r.headers.get('Retry-After')))
+                if delay is None:
+                    return r
+                r.close()
+            logger.info(f'Retry {method} {href} in {delay:.2f} s, attempt {attempt} of {attempts} failed')
+            time.sleep(delay)
+
+    def get(self, href: str, **kwargs) -> requests.Response:
+        return self.request('GET', href, **kwargs)
+
+    def post(self, href: str, **kwargs) -> requests.Response:
+        return self.request('POST', href, **kwargs)
+
+    def stats(self) -> dict:
+        """Pool counters per host. A hit is a request sent over an already opened connection."""
+        with self._lock:
+            sessions = list(self._sessions.items())
+        res = {}
+        for host, session in sessions:
+            requests_count = connections_count = 0
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    try:
+                        pool = pools[key]
+                    except KeyError:
+                        continue
+                    requests_count += pool.num_requests
+                    connections_count += pool.num_connections
+            res[host] = {'requests': requests_count,
+                         'pool_hits': requests_count - connections_count,
+                         'pool_misses': connections_count}
+        return res
+
+    def close(self) -> None:
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+
+
+_default_client: HTTPClient | None = None
+_default_client_lock = threading.Lock()
+
+
+def get_http_client() -> HTTPClient:
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HTTPClient(rate_limiter=get_rate_limiter(),
+                                         retry_policy=RetryPolicy(),
+                                         breakers=get_circuit_breakers())
+        return _default_client
@@ -1,39 +1,94 @@
-import requests
+import json as json_lib
 from src.core.structures.custom_exceptions import RequestErrorException
+from .http_client import get_http_client
+from .http_cache import get_http_cache
+from .graphql import JSON_HEADERS
 
 
-def get_html_from_url(href: str, headers: dict = None, cookies: dict = None) -> str:
-    if not headers:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36'
-        }
+def _get_cached_text(method: str, href: str, headers: dict, cookies: dict, json: dict = None,
+                     data: bytes = None, idempotent: bool | None = None) -> tuple[int, str, str]:
+    """Response text through HTTP cache. Returns (status, reason, text); errors are not cached.
+
+    A prepared body (data) is the cache key as is, json is serialized with sorted keys first.
+    """
+    cache = get_http_cache()
+    key = cache.make_key(method, href, data if data is not None else json)
+    entry = cache.get(key)
+    if entry and cache.is_fresh(entry):
+        cache.record_hit(entry)
+        return 200, 'OK', entry.body
+    if entry:
+        headers = {**(headers or {}), **cache.conditional_headers(entry)}
+    r = get_http_client().request(method, href, headers=headers, cookies=cookies, json=json, data=data,
+                                  idempotent=idempotent)
+    if r.status_code == 304 and entry:
+        cache.refresh(key)
+        cache.record_hit(entry, revalidated=True)
+        return 200, 'OK', entry.body
+    cache.record_miss()
+    if r.ok and r.text.strip():
+        cache.put(key, href, r.text, r.headers.get('ETag'), r.headers.get('Last-Modified'))
+    return r.status_code, r.reason, r.text
+
+
+def get_html_from_url(href: str, headers: dict = None, cookies: dict = None, use_cache: bool = False) -> str:
     if not cookies:
         cookies = {}
     try:
-        r = requests.get(href, headers=headers, cookies=cookies)
+        if use_cache:
+            status, reason, text = _get_cached_text('GET', href, headers, cookies)
+        else:
+            r = get_http_client().get(href, headers=headers, cookies=cookies)
+            status, reason, text = r.status_code, r.reason, r.text
     except Exception as e:
         raise RequestErrorException('Invalid request', parent=e)
+    if status >= 400:
+        raise RequestErrorException(f'Response error\nURL:{href}\nStatus:{status}\nReason:{reason}')
+    if not text.strip():
+        raise RequestErrorException(f'Empty response body error')
+    return text
+
+
+def get_html_bytes_from_url(href: str, headers: dict = None, cookies: dict = None) -> tuple[bytes, str]:
+    """Raw response body and its encoding. Decoding is left to the caller (e.g. a parsing process)."""
+    if not cookies:
+        cookies = {}
     try:
-        r.raise_for_status()
+        r = get_http_client().get(href, headers=headers, cookies=cookies)
     except Exception as e:
-        raise RequestErrorException(f'Response error\nURL:{href}\nStatus:{r.status_code}\nReason:{r.reason}', parent=e)
-    if not r.text.strip():
+        raise RequestErrorException('Invalid request', parent=e)
+    if r.status_code >= 400:
+        raise RequestErrorException(f'Response error\nURL:{href}\nStatus:{r.status_code}\nReason:{r.reason}')
+    if not r.content.strip():
         raise RequestErrorException(f'Empty response body error')
-    return r.text
+    return r.content, r.encoding or 'utf-8'
 
 
-def get_json_from_url(href: str, headers: dict = None, cookies: dict = None, json: dict = None) -> dict:
-    if not headers:
-        headers = {
-            'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36',
-        }
+def get_json_from_url(href: str, headers: dict = None, cookies: dict = None, json: dict = None,
+                      use_cache: bool = False, data: bytes = None, idempotent: bool = False) -> dict:
+    """POST json (or prepared JSON body data, e.g. GraphQLOperation.body()) and decode response JSON.
+
+    POST is retried on transport errors and 5xx only if idempotent (e.g. a GraphQL query).
+    """
     if not cookies:
         cookies = {}
+    if data is not None:
+        headers = {**JSON_HEADERS, **(headers or {})}
     try:
-        response = requests.post(href, headers=headers, cookies=cookies, json=json)
-        return response.json()
+        if use_cache:
+            status, reason, text = _get_cached_text('POST', href, headers, cookies, json, data, idempotent)
+        else:
+            r = get_http_client().post(href, headers=headers, cookies=cookies, json=json, data=data,
+                                       idempotent=idempotent)
+            status, reason, text = r.status_code, r.reason, r.text
     except Exception as e:
         raise RequestErrorException('Error in getting JSON\n'
                                     f'Headers = {headers}\n'
                                     f'Cookies = {cookies}\n'
-                                    f'JSON = {json}\n', parent=e)
+                                    f'JSON = {json if data is None else data[:1000]}\n', parent=e)
+    if status >= 400:
+        raise RequestErrorException(f'Response error\nURL:{href}\nStatus:{status}\nReason:{reason}')
+    try:
+        return json_lib.loads(text)
+    except ValueError as e:
+        raise RequestErrorException(f'Invalid JSON in response\nURL:{href}', parent=e)
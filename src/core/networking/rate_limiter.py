@@ -0,0 +1,162 @@
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from src.conf import rate_limit_rps, rate_limit_max_rps, rate_limit_burst, \
+                     rate_limit_initial_concurrency, rate_limit_max_concurrency, rate_limit_latency_target
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+THROTTLE_STATUSES = (429, 503)
+# Сколько ждать перед повторной попыткой, если упёрлись в лимит одновременных запросов
+_SLOT_WAIT = 0.05
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After header in seconds. Header may hold seconds or HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_domain(href: str) -> str:
+    """Registered domain of url: https://conpletus.cointelegraph.com/v1/ -> cointelegraph.com"""
+    host = urlsplit(href).hostname or href
+    return '.'.join(host.lower().split('.')[-2:])
+
+
+class HostLimiter:
+    """Token bucket (requests per second) plus AIMD limit of concurrent requests for one domain.
+
+    Healthy responses (fast and not throttled) raise rate and concurrency additively,
+    throttling, 5xx and transport errors cut both by half and honor Retry-After. Like
+    TCP, the cut happens once per round trip: a throttled response to a request sent
+    before the last cut is counted but does not cut again.
+    """
+
+    def __init__(self,
+                 rps: float = rate_limit_rps,
+                 max_rps: float = rate_limit_max_rps,
+                 burst: float = rate_limit_burst,
+                 concurrency: int = rate_limit_initial_concurrency,
+                 max_concurrency: int = rate_limit_max_concurrency,
+                 latency_target: float = rate_limit_latency_target):
+        self.rps = rps
+        self.max_rps = max_rps
+        self.min_rps = min(1.0, rps)
+        self.burst = burst
+        self.concurrency = float(concurrency)
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.latency = None
+        self.requests = 0
+        self.throttled = 0
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = float('-inf')
+        self._lock = threading.Lock()
+
+    def _try_acquire(self) -> float:
+        """Take a token and a slot. Returns 0 on success, else seconds to wait before next try."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rps)
+            self._updated = now
+            if self.in_flight >= int(self.concurrency):
+                return _SLOT_WAIT
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rps
+            self._tokens -= 1
+            self.in_flight += 1
+            self.requests += 1
+            return 0.0
+
+    def acquire(self) -> None:
+        while (delay := self._try_acquire()) > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        while (delay := self._try_acquire()) > 0:
+            await asyncio.sleep(delay)
+
+    def release(self, latency: float, status: int | None, retry_after: float | None = None) -> None:
+        """status is None when request failed without response."""
+        with self._lock:
+            self.in_flight -= 1
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            if status is None or status in THROTTLE_STATUSES or status >= 500:
+                self.throttled += 1
+                now = time.monotonic()
+                if retry_after is not None:
+                    self._blocked_until = max(self._blocked_until, now + retry_after)
+                # Запрос ушёл до прошлого снижения - на его ответ уже отреагировали
+                if now - latency < self._last_decrease:
+                    return
+                self._last_decrease = now
+                self.concurrency = max(1.0, self.concurrency / 2)
+                self.rps = max(self.min_rps, self.rps / 2)
+                logger.warning(f'Throttled (status {status}), concurrency {int(self.concurrency)}, rps {self.rps:.1f}')
+            elif self.latency <= self.latency_target:
+                # +1 к окну за "круг" из concurrency запросов
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+                self.rps = min(self.max_rps, self.rps + 1 / self.rps)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'rps': round(self.rps, 2),
+                    'concurrency': int(self.concurrency),
+                    'in_flight': self.in_flight,
+                    'latency': round(self.latency, 3) if self.latency is not None else None,
+                    'requests': self.requests,
+                    'throttled': self.throttled}
+
+
+class RateLimiter:
+    """HostLimiter registry. One budget per domain, shared by every client and parser in the process."""
+
+    def __init__(self, **limiter_kwargs):
+        self._limiter_kwargs = limiter_kwargs
+        self._limiters: dict[str, HostLimiter] = {}
+        self._lock = threading.Lock()
+
+    def for_url(self, href: str) -> HostLimiter:
+        domain = get_domain(href)
+        with self._lock:
+            limiter = self._limiters.get(domain)
+            if limiter is None:
+                limiter = self._limiters[domain] = HostLimiter(**self._limiter_kwargs)
+        return limiter
+
+    def stats(self) -> dict:
+        with self._lock:
+            limiters = list(self._limiters.items())
+        return {domain: limiter.stats() for domain, limiter in limiters}
+
+
+_default_limiter: RateLimiter | None = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter()
+        return _default_limiter
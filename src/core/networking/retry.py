@@ -0,0 +1,145 @@
+import time
+import random
+import logging
+import threading
+from src.conf import http_max_attempts, http_backoff_base, http_backoff_max, http_retry_after_max, \
+                     circuit_failure_threshold, circuit_reset_timeout
+from .rate_limiter import get_domain
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+
+class RetryPolicy:
+    """When and how long to wait before repeating a failed request.
+
+    Transport errors and RETRY_STATUSES are retried up to max_attempts in total with
+    exponential backoff and full jitter. Retry-After of the response is honored up to
+    retry_after_max, a longer wait gives up. POST is retried only if marked idempotent.
+    """
+
+    def __init__(self,
+                 max_attempts: int = http_max_attempts,
+                 backoff_base: float = http_backoff_base,
+                 backoff_max: float = http_backoff_max,
+                 retry_after_max: float = http_retry_after_max,
+                 retry_statuses: tuple = RETRY_STATUSES):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.retry_statuses = retry_statuses
+
+    def attempts(self, method: str, idempotent: bool | None = None) -> int:
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        return self.max_attempts if idempotent else 1
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float | None:
+        """Seconds to wait after attempt (1-based) failed, None - do not retry."""
+        if retry_after is not None and retry_after > self.retry_after_max:
+            return None
+        # Full jitter: потоки, упавшие одновременно, не приходят повторно одной волной
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        return max(delay, retry_after or 0.0)
+
+
+class CircuitBreaker:
+    """Stops requests to a host after failure_threshold transport errors or 5xx in a row.
+
+    Open circuit rejects requests for reset_timeout seconds, then lets one probe through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self,
+                 name: str = '',
+                 failure_threshold: int = circuit_failure_threshold,
+                 reset_timeout: float = circuit_reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.CLOSED or (self.state == self.HALF_OPEN and not self._probe_in_flight):
+                self._probe_in_flight = self.state == self.HALF_OPEN
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                logger.warning(f'Circuit {self.name} opened after {self.failures} failures')
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def record_status(self, status: int) -> None:
+        if status >= 500:
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures, 'rejected': self.rejected}
+
+
+class CircuitBreakers:
+    """Circuit breakers by registered domain, shared by all clients of the process."""
+
+    def __init__(self, **breaker_kwargs):
+        self.breaker_kwargs = breaker_kwargs
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def for_url(self, href: str) -> CircuitBreaker:
+        domain = get_domain(href)
+        with self._lock:
+            breaker = self._breakers.get(domain)
+            if breaker is None:
+                breaker = self._breakers[domain] = CircuitBreaker(domain, **self.breaker_kwargs)
+        return breaker
+
+    def stats(self) -> dict:
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return {domain: breaker.stats() for domain, breaker in breakers}
+
+
+_default_breakers: CircuitBreakers | None = None
+_default_breakers_lock = threading.Lock()
+
+
+def get_circuit_breakers() -> CircuitBreakers:
+    global _default_breakers
+    with _default_breakers_lock:
+        if _default_breakers is None:
+            _default_breakers = CircuitBreakers()
+        return _default_breakers
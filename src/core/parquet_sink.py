@@ -0,0 +1,248 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+from src.const import ROOT_DIR
+from src.conf import dir_name_parquet, parquet_with_html, parquet_compression, parquet_row_group_bytes, \
+    parquet_buffer_bytes, parquet_max_open_files, parquet_file_max_rows, parquet_file_max_seconds
+from src.core.structures import ArticleInfo, SavingErrorException
+from src.core.networking.rate_limiter import get_domain
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+def _utc(dt: datetime) -> datetime:
+    # В журнале и старых архивах время без tzinfo, это UTC
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+class _Partition:
+    __slots__ = ('rows', 'bytes', 'writer', 'file_name', 'file_rows', 'opened_at', 'retired', 'lock')
+
+    def __init__(self):
+        self.rows = []
+        self.bytes = 0
+        self.writer = None
+        self.file_name = ''
+        self.file_rows = 0
+        self.opened_at = 0.0
+        # Партиция вытеснена из таблицы: её файл закрывается после последней записи
+        self.retired = False
+        # Порядок записи в файл партиции, общая блокировка держится только над буферами
+        self.lock = threading.Lock()
+
+
+class ParquetSink:
+    """Appends ArticleInfo rows to a Parquet dataset partitioned as site=<domain>/date=<YYYY-MM-DD>.
+
+    Rows are buffered per partition. A buffer becomes one row group when it reaches
+    row_group_bytes, or earlier when all buffers together exceed buffer_bytes. Every
+    partition keeps one file open for its row groups, at most max_open_files at once
+    (least recently used is closed first). Files are written as .tmp and renamed on
+    close, so readers never see a file without footer. A file is closed and a new one
+    started after file_max_rows rows or file_max_seconds, so a crash loses at most that
+    much. html is an optional last column, readers that select columns do not read it.
+    Thread-safe, row groups are encoded and written outside of the buffers lock.
+
+        with ParquetSink() as sink:
+            sink.append(article_info)
+
+        pyarrow.dataset.dataset(root, partitioning='hive').to_table(columns=['header', 'content'])
+    """
+
+    def __init__(self,
+                 root: str = ROOT_DIR + dir_name_parquet,
+                 with_html: bool = parquet_with_html,
+                 compression: str = parquet_compression,
+                 row_group_bytes: int = parquet_row_group_bytes,
+                 buffer_bytes: int = parquet_buffer_bytes,
+                 max_open_files: int = parquet_max_open_files,
+                 file_max_rows: int = parquet_file_max_rows,
+                 file_max_seconds: float = parquet_file_max_seconds):
+        if pyarrow is None:
+            raise SavingErrorException('Parquet sink requires pyarrow')
+        self.root = root
+        self.with_html = with_html
+        self.compression = compression
+        self.row_group_bytes = row_group_bytes
+        self.buffer_bytes = buffer_bytes
+        self.max_open_files = max_open_files
+        self.file_max_rows = file_max_rows
+        self.file_max_seconds = file_max_seconds
+        fields = [('href', pyarrow.string()),
+                  ('header', pyarrow.string()),
+                  ('content', pyarrow.string()),
+                  ('publication_dt', pyarrow.timestamp('us', tz='UTC')),
+                  ('parsing_dt', pyarrow.timestamp('us', tz='UTC')),
+                  ('language', pyarrow.string())]
+        if with_html:
+            fields.append(('html', pyarrow.string()))
+        self.schema = pyarrow.schema(fields)
+        self.rows_written = 0
+        self.row_groups_written = 0
+        self.files_written = 0
+        # Порядок - от давно не писавшейся партиции к последней
+        self._partitions: OrderedDict[tuple[str, str], _Partition] = OrderedDict()
+        self._buffered = 0
+        # Имена файлов уникальны между прогонами и процессами
+        self._run_id = f'{datetime.utcnow():%Y%m%dT%H%M%S}-{os.getpid()}'
+        self._seq = 0
+        self._next_age_check = time.monotonic() + file_max_seconds
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'ParquetSink':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def append(self, article: ArticleInfo) -> None:
+        publication_dt = _utc(article.publication_dt)
+        key = (get_domain(article.href), publication_dt.date().isoformat())
+        row = {'href': article.href,
+               'header': article.header,
+               'content': article.content,
+               'publication_dt': publication_dt,
+               'parsing_dt': _utc(article.parsing_dt),
+               'language': article.language}
+        if self.with_html:
+            row['html'] = article.html or None
+        size = 32 + sum(len(value) for value in (article.href, article.header, article.content, article.language))
+        if self.with_html:
+            size += len(article.html)
+        try:
+            # Под блокировкой только раскладываем строки по буферам и забираем готовые пачки
+            with self._lock:
+                if (partition := self._partitions.get(key)) is None:
+                    partition = self._partitions[key] = _Partition()
+                    retired = self._retire_least_recent()
+                else:
+                    retired = []
+                self._partitions.move_to_end(key)
+                partition.rows.append(row)
+                partition.bytes += size
+                self._buffered += size
+                batches = []
+                if partition.bytes >= self.row_group_bytes:
+                    batches.append((key, partition, self._take_rows(partition)))
+                if self._buffered >= self.buffer_bytes:
+                    # Сбрасываем самые большие буферы, пока не освободим половину
+                    for other_key, other in sorted(self._partitions.items(), key=lambda item: -item[1].bytes):
+                        if self._buffered < self.buffer_bytes // 2:
+                            break
+                        batches.append((other_key, other, self._take_rows(other)))
+                retired += self._retire_old_files()
+            for batch_key, batch_partition, rows in batches:
+                self._write_rows(batch_key, batch_partition, rows)
+            self._close_retired(retired)
+        except Exception as e:
+            raise SavingErrorException(f'Parquet sink write error\nHref: {article.href}', parent=e)
+
+    def _take_rows(self, partition: _Partition) -> list:
+        rows = partition.rows
+        self._buffered -= partition.bytes
+        partition.rows = []
+        partition.bytes = 0
+        return rows
+
+    def _retire(self, key: tuple[str, str]) -> tuple[tuple[str, str], _Partition, list]:
+        partition = self._partitions.pop(key)
+        partition.retired = True
+        return key, partition, self._take_rows(partition)
+
+    def _retire_least_recent(self) -> list:
+        # Каждая партиция в таблице может держать открытый файл
+        return [self._retire(key) for key in list(self._partitions)[:max(0, len(self._partitions) - self.max_open_files)]]
+
+    def _retire_old_files(self) -> list:
+        now = time.monotonic()
+        if now < self._next_age_check:
+            return []
+        self._next_age_check = now + min(self.file_max_seconds, 1)
+        # Дописываем буфер и закрываем файл, следующая строка партиции откроет новый
+        return [self._retire(key) for key, partition in list(self._partitions.items())
+                if partition.writer is not None and now - partition.opened_at >= self.file_max_seconds]
+
+    def _close_retired(self, retired: list) -> None:
+        error = None
+        for key, partition, rows in retired:
+            try:
+                self._write_rows(key, partition, rows)
+            except Exception as e:
+                error = error or e
+            finally:
+                with partition.lock:
+                    self._close_writer(partition)
+        if error:
+            raise error
+
+    def _open_writer(self, key: tuple[str, str], partition: _Partition) -> None:
+        site, date = key
+        dir_name = os.path.join(self.root, f'site={site}', f'date={date}')
+        os.makedirs(dir_name, exist_ok=True)
+        with self._lock:
+            seq, self._seq = self._seq, self._seq + 1
+        partition.file_name = os.path.join(dir_name, f'part-{self._run_id}-{seq:05d}.parquet')
+        partition.writer = pyarrow.parquet.ParquetWriter(partition.file_name + '.tmp', self.schema,
+                                                         compression=self.compression)
+        partition.file_rows = 0
+        partition.opened_at = time.monotonic()
+
+    def _write_rows(self, key: tuple[str, str], partition: _Partition, rows: list) -> None:
+        """Writes rows as one row group of the partition's file, called without the buffers lock."""
+        if not rows:
+            return
+        table = pyarrow.Table.from_pylist(rows, schema=self.schema)
+        with partition.lock:
+            if partition.writer is None:
+                self._open_writer(key, partition)
+            partition.writer.write_table(table, row_group_size=len(rows))
+            partition.file_rows += len(rows)
+            if partition.retired or partition.file_rows >= self.file_max_rows:
+                self._close_writer(partition)
+        with self._lock:
+            self.rows_written += len(rows)
+            self.row_groups_written += 1
+
+    def _close_writer(self, partition: _Partition) -> None:
+        """Closes the partition's file and renames it into place, called under partition.lock."""
+        if partition.writer is None:
+            return
+        writer, partition.writer = partition.writer, None
+        writer.close()
+        os.replace(partition.file_name + '.tmp', partition.file_name)
+        with self._lock:
+            self.files_written += 1
+
+    def flush(self) -> None:
+        """Writes all buffered rows as row groups, files stay open."""
+        try:
+            with self._lock:
+                batches = [(key, partition, self._take_rows(partition)) for key, partition in self._partitions.items()]
+            for key, partition, rows in batches:
+                self._write_rows(key, partition, rows)
+        except Exception as e:
+            raise SavingErrorException(f'Parquet sink flush error', parent=e)
+
+    def close(self) -> None:
+        """Writes all buffered rows and closes every file. Files are closed even if a write fails."""
+        try:
+            with self._lock:
+                retired = [self._retire(key) for key in list(self._partitions)]
+            self._close_retired(retired)
+        except Exception as e:
+            raise SavingErrorException(f'Parquet sink close error', parent=e)
+        logger.info(f'Parquet sink closed. {self.stats()}')
+
+    def stats(self) -> dict:
+        return {'rows': self.rows_written, 'row_groups': self.row_groups_written, 'files': self.files_written,
+                'buffered_bytes': self._buffered}
@@ -0,0 +1,172 @@
+import os
+import struct
+import sqlite3
+import logging
+import argparse
+import threading
+from typing import NamedTuple
+from src.const import ROOT_DIR
+from src.conf import dir_name_segments, segment_max_bytes, segment_compact_ratio
+from src.core.structures.custom_exceptions import SavingErrorException, ReadingErrorException
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+# Заголовок записи: magic, sha256 ключа (32 байта), длина тела
+RECORD_HEADER = struct.Struct('>4s32sQ')
+RECORD_MAGIC = b'NSR1'
+
+
+class RecordLocation(NamedTuple):
+    segment: int
+    offset: int
+    length: int
+
+
+class SegmentStore:
+    """Append-only store of many compressed records in large segment files.
+
+    Records are appended to the active segment, a new segment is started when the active one
+    would grow over max_bytes. The index (SQLite) maps key (href sha256 hex) to
+    (segment, offset, length), so reading a record is one index lookup and one pread.
+    Writing a key again supersedes the old record, compact() reclaims the space.
+
+    Single writer: appends are serialized by a lock of this object only, so puts from
+    several processes interleave and corrupt records. Worker processes must hand packed
+    archives to the one process that owns the store (see local_storage.put_packed_archive).
+    Reads are safe from any process.
+    """
+
+    def __init__(self,
+                 dir_name: str = ROOT_DIR + dir_name_segments,
+                 max_bytes: int = segment_max_bytes):
+        os.makedirs(dir_name, exist_ok=True)
+        self.dir_name = dir_name
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._read_fds: dict[int, int] = {}
+        self._index = sqlite3.connect(os.path.join(dir_name, 'index.sqlite'), check_same_thread=False)
+        self._index.execute('PRAGMA journal_mode=WAL')
+        self._index.execute('PRAGMA synchronous=NORMAL')
+        self._index.execute('CREATE TABLE IF NOT EXISTS records ('
+                            'key TEXT PRIMARY KEY, segment INTEGER, offset INTEGER, length INTEGER)')
+        self._index.execute('CREATE INDEX IF NOT EXISTS records_segment ON records(segment)')
+        self._index.commit()
+        segments = self.segments()
+        self._active = segments[-1] if segments else 0
+        self._active_file = open(self.segment_path(self._active), 'ab')
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.dir_name, f'segment_{segment:06d}.dat')
+
+    def segments(self) -> list[int]:
+        return sorted(int(name[8:14]) for name in os.listdir(self.dir_name)
+                      if name.startswith('segment_') and name.endswith('.dat'))
+
+    def _append(self, key: str, payload: bytes) -> RecordLocation:
+        record_size = RECORD_HEADER.size + len(payload)
+        if self._active_file.tell() and self._active_file.tell() + record_size > self.max_bytes:
+            self._active_file.close()
+            self._active += 1
+            self._active_file = open(self.segment_path(self._active), 'ab')
+            logger.info(f'Roll over to segment {self._active}')
+        offset = self._active_file.tell() + RECORD_HEADER.size
+        self._active_file.write(RECORD_HEADER.pack(RECORD_MAGIC, bytes.fromhex(key), len(payload)))
+        self._active_file.write(payload)
+        self._active_file.flush()
+        return RecordLocation(self._active, offset, len(payload))
+
+    def put(self, key: str, payload: bytes) -> RecordLocation:
+        try:
+            with self._lock:
+                location = self._append(key, payload)
+                self._index.execute('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)', (key, *location))
+                self._index.commit()
+                return location
+        except Exception as e:
+            raise SavingErrorException(f'Segment store write error\nKey: {key}', parent=e)
+
+    def locate(self, key: str) -> RecordLocation | None:
+        with self._lock:
+            row = self._index.execute('SELECT segment, offset, length FROM records WHERE key = ?', (key,)).fetchone()
+        return RecordLocation(*row) if row else None
+
+    def __contains__(self, key: str) -> bool:
+        return self.locate(key) is not None
+
+    def keys(self) -> list[str]:
+        with self._lock:
+            return [key for key, in self._index.execute('SELECT key FROM records ORDER BY key')]
+
+    def _read_fd(self, segment: int) -> int:
+        with self._lock:
+            if (fd := self._read_fds.get(segment)) is None:
+                fd = self._read_fds[segment] = os.open(self.segment_path(segment), os.O_RDONLY)
+            return fd
+
+    def get(self, key: str) -> bytes:
+        location = self.locate(key)
+        if location is None:
+            raise ReadingErrorException(f'Record not found in segment store\nKey: {key}')
+        try:
+            return os.pread(self._read_fd(location.segment), location.length, location.offset)
+        except Exception as e:
+            raise ReadingErrorException(f'Segment store read error\nKey: {key}', parent=e)
+
+    def compact(self, ratio: float = segment_compact_ratio) -> int:
+        """Rewrites live records of sealed segments with less than ratio live bytes. Returns freed bytes."""
+        freed = 0
+        with self._lock:
+            for segment in self.segments():
+                if segment == self._active:
+                    continue
+                size = os.path.getsize(self.segment_path(segment))
+                rows = self._index.execute('SELECT key, offset, length FROM records WHERE segment = ?',
+                                           (segment,)).fetchall()
+                live = sum(RECORD_HEADER.size + length for _, _, length in rows)
+                if size and live / size >= ratio:
+                    continue
+                logger.info(f'Compact segment {segment}: {live} live of {size} bytes')
+                fd = self._read_fd(segment)
+                for key, offset, length in rows:
+                    location = self._append(key, os.pread(fd, length, offset))
+                    self._index.execute('UPDATE records SET segment = ?, offset = ?, length = ? WHERE key = ?',
+                                        (*location, key))
+                self._index.commit()
+                os.close(self._read_fds.pop(segment))
+                os.remove(self.segment_path(segment))
+                freed += size - live
+        return freed
+
+    def close(self) -> None:
+        with self._lock:
+            self._active_file.close()
+            for fd in self._read_fds.values():
+                os.close(fd)
+            self._read_fds.clear()
+            self._index.close()
+
+
+_default_store: SegmentStore | None = None
+_default_store_lock = threading.Lock()
+
+
+def get_segment_store() -> SegmentStore:
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = SegmentStore()
+        return _default_store
+
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description='Segment archive store maintenance')
+    args_parser.add_argument('command', choices=['compact'])
+    args_parser.add_argument('--ratio', type=float, default=segment_compact_ratio,
+                             help='Compact segments with live bytes share below ratio')
+    args = args_parser.parse_args()
+    store = get_segment_store()
+    logger.info(f'Freed {store.compact(args.ratio)} bytes')
+    store.close()
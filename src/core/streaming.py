@@ -0,0 +1,92 @@
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+T = TypeVar('T')
+
+_DONE = object()
+# Как часто производитель проверяет, не остановлен ли поток, пока очередь полна
+_PUT_TIMEOUT = 0.1
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def merge_streams(streams: Iterable[Callable[[], Iterator[T]]], max_workers: int, maxsize: int) -> Iterator[T]:
+    """Runs every stream factory in a thread pool and yields items in arrival order.
+
+    Items go through a queue of maxsize: when the consumer is slow producers block (backpressure).
+    The first producer error is raised to the consumer. Closing the generator stops all producers.
+    """
+    factories = list(streams)
+    items = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def pump(factory: Callable[[], Iterator[T]]) -> None:
+        try:
+            for item in factory():
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failure(e))
+        finally:
+            put(_DONE)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for factory in factories:
+            executor.submit(pump, factory)
+        done = 0
+        while done < len(factories):
+            item = items.get()
+            if item is _DONE:
+                done += 1
+            elif isinstance(item, _Failure):
+                raise item.error
+            else:
+                yield item
+    finally:
+        stopped.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def prefetch_pages(fetch_page: Callable[[int], T],
+                   first_page: int,
+                   window: int,
+                   last_page: int | None = None) -> Iterator[T]:
+    """Yields fetch_page(first_page), fetch_page(first_page + 1), ... in page order.
+
+    Up to window pages up to last_page (estimated end of the walk) are requested at once,
+    pages after last_page one by one. The walk ends when the consumer stops iterating:
+    close the generator (contextlib.closing) to cancel requests not started yet.
+    """
+    executor = ThreadPoolExecutor(max_workers=max(window, 1))
+    in_flight = deque()
+    next_page = first_page
+    try:
+        while True:
+            while not in_flight or (len(in_flight) < window and (last_page is None or next_page <= last_page)):
+                in_flight.append(executor.submit(fetch_page, next_page))
+                next_page += 1
+            yield in_flight.popleft().result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
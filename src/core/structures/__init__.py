@@ -1,7 +1,9 @@
 from .article_info import ArticleInfo
 from .article_short_info import ArticleShortInfo
+from .page_request import PageRequest
 from .custom_exceptions import ParsingErrorException
 from .custom_exceptions import SavingErrorException
 from .custom_exceptions import RequestErrorException
+from .custom_exceptions import CircuitOpenException
 from .custom_exceptions import ReadingErrorException
 from .custom_exceptions import DataBaseErrorException
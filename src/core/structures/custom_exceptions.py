@@ -20,6 +20,10 @@ class RequestErrorException(Exception):
         super().__init__(self.message)
 
 
+class CircuitOpenException(RequestErrorException):
+    """Request was not sent: circuit breaker of the host is open."""
+
+
 class ParsingErrorException(Exception):
     """Exception raised for errors in parsing.
 
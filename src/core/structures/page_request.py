@@ -0,0 +1,9 @@
+from typing import NamedTuple
+
+
+class PageRequest(NamedTuple):
+    href: str
+    # Тело JSON для POST запроса, None - обычный GET за html
+    json: dict | None = None
+    # Уже сериализованное тело JSON для POST (GraphQLOperation.body), вместо json
+    body: bytes | None = None
@@ -0,0 +1,286 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+from functools import partial
+from typing import Iterable, Iterator, List, NamedTuple
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+from src.conf import export_workers, export_parquet_part_rows
+from src.core.structures import ArticleInfo, ReadingErrorException, SavingErrorException
+from src.core.local_storage import read_archive_bytes, read_from_bytes, read_metadata_from_bytes
+from src.core.database import get_article_query
+from src.process_stage import make_process_pool
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+EXPORT_FORMATS = ('jsonl', 'parquet', 'files')
+PROGRESS_INTERVAL = 5
+
+
+class ExportTask(NamedTuple):
+    href: str
+    archive_path: str
+
+
+class ExportResult(NamedTuple):
+    href: str
+    # jsonl: готовая строка, parquet: строка таблицы, files: None (воркер уже записал файлы)
+    payload: bytes | dict | None
+    read_bytes: int
+    written_bytes: int
+    error: str | None = None
+
+
+def _record(article: ArticleInfo, with_html: bool) -> dict:
+    record = article._asdict()
+    record['publication_dt'] = article.publication_dt.isoformat()
+    record['parsing_dt'] = article.parsing_dt.isoformat()
+    if not with_html:
+        del record['html']
+    return record
+
+
+def _file_names(out_dir: str, href: str) -> tuple[str, str]:
+    # Имена как у decompress_archive: <sha256 от href>_article.html/json
+    key = hashlib.sha256(href.encode()).hexdigest()
+    return os.path.join(out_dir, 'html', f'{key}_article.html'), os.path.join(out_dir, 'json', f'{key}_article.json')
+
+
+def _write_atomic(file_name: str, payload: bytes) -> None:
+    with open(file_name + '.tmp', 'wb') as f:
+        f.write(payload)
+    os.replace(file_name + '.tmp', file_name)
+
+
+def _export_one(task: ExportTask, fmt: str, out_dir: str, with_html: bool) -> ExportResult:
+    """Runs in a worker process: reads and inflates one archive and serializes it for fmt."""
+    try:
+        data = read_archive_bytes(task.archive_path)
+        if with_html or fmt == 'files':
+            article = read_from_bytes(data)
+        else:
+            article = read_metadata_from_bytes(data)
+        if fmt == 'files':
+            html_name, json_name = _file_names(out_dir, task.href)
+            html = article.html.encode('utf-8')
+            meta = json.dumps(_record(article, False), ensure_ascii=False, indent=4).encode('utf-8')
+            # json пишется последним: по нему продолжение выгрузки считает статью готовой
+            _write_atomic(html_name, html)
+            _write_atomic(json_name, meta)
+            return ExportResult(task.href, None, len(data), len(html) + len(meta))
+        record = _record(article, with_html)
+        if fmt == 'jsonl':
+            line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+            return ExportResult(task.href, line, len(data), len(line))
+        return ExportResult(task.href, record, len(data), sum(len(str(value)) for value in record.values()))
+    except Exception as e:
+        return ExportResult(task.href, None, 0, 0, f'{type(e).__name__}: {e}')
+
+
+def resolve_tasks(from_dt: datetime | None = None,
+                  to_dt: datetime | None = None,
+                  hrefs: Iterable[str] | None = None,
+                  site: str | None = None) -> List[ExportTask]:
+    """Archives to export from the article_links journal: by hrefs or by published_dt window [to_dt, from_dt]."""
+    query = get_article_query()
+    if hrefs is not None:
+        articles = query.get_many(hrefs)
+    else:
+        articles = query.find(from_dt, to_dt, site)
+    return [ExportTask(article.href, article.source) for article in articles]
+
+
+class _Progress:
+    def __init__(self, total: int):
+        self.total = total
+        self.done = self.failed = self.read_bytes = self.written_bytes = 0
+        self.started = self._reported = time.monotonic()
+
+    def update(self, result: ExportResult) -> None:
+        self.done += 1
+        self.failed += result.error is not None
+        self.read_bytes += result.read_bytes
+        self.written_bytes += result.written_bytes
+        if (now := time.monotonic()) - self._reported >= PROGRESS_INTERVAL:
+            self._reported = now
+            logger.info(self.line())
+
+    def line(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return f'{self.done}/{self.total} archives, {self.failed} failed, {self.done / elapsed:.0f} archives/s, ' \
+               f'read {self.read_bytes / elapsed / 2 ** 20:.1f} MB/s, written {self.written_bytes / elapsed / 2 ** 20:.1f} MB/s'
+
+
+class _JsonlOutput:
+    """One JSON object per line. The file itself is the resume checkpoint: a torn last line is cut off."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.exported = set()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if os.path.isfile(path):
+            with open(path, 'rb+') as f:
+                complete = 0
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    self.exported.add(json.loads(line)['href'])
+                    complete += len(line)
+                f.truncate(complete)
+        self._file = open(path, 'ab')
+
+    def write(self, result: ExportResult) -> None:
+        self._file.write(result.payload)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ParquetOutput:
+    """Numbered part files of part_rows rows. A part is renamed into place only when complete,
+    so finished parts are the resume checkpoint."""
+
+    def __init__(self, out_dir: str, part_rows: int = export_parquet_part_rows):
+        if pyarrow is None:
+            raise SavingErrorException('Parquet export requires pyarrow')
+        self.out_dir = out_dir
+        self.part_rows = part_rows
+        self.exported = set()
+        self._rows = []
+        os.makedirs(out_dir, exist_ok=True)
+        parts = sorted(name for name in os.listdir(out_dir) if name.startswith('part-') and name.endswith('.parquet'))
+        for name in parts:
+            self.exported.update(pyarrow.parquet.read_table(os.path.join(out_dir, name), columns=['href'])
+                                 .column('href').to_pylist())
+        self._part = int(parts[-1][5:10]) + 1 if parts else 0
+
+    def write(self, result: ExportResult) -> None:
+        self._rows.append(result.payload)
+        if len(self._rows) >= self.part_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._rows:
+            return
+        file_name = os.path.join(self.out_dir, f'part-{self._part:05d}.parquet')
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(self._rows), file_name + '.tmp')
+        os.replace(file_name + '.tmp', file_name)
+        self._part += 1
+        self._rows = []
+
+    def close(self) -> None:
+        self.flush()
+
+
+class _FilesOutput:
+    """<out_dir>/html and <out_dir>/json like decompress_archive. Workers write the files,
+    an existing json file marks the article as exported."""
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        os.makedirs(os.path.join(out_dir, 'html'), exist_ok=True)
+        os.makedirs(os.path.join(out_dir, 'json'), exist_ok=True)
+
+    def is_exported(self, href: str) -> bool:
+        return os.path.isfile(_file_names(self.out_dir, href)[1])
+
+    def write(self, result: ExportResult) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def _results(tasks: List[ExportTask], fmt: str, out_dir: str, with_html: bool, workers: int) -> Iterator[ExportResult]:
+    export_one = partial(_export_one, fmt=fmt, out_dir=out_dir, with_html=with_html)
+    if workers == 1:
+        yield from map(export_one, tasks)
+        return
+    with make_process_pool(workers) as executor:
+        # Пачки по несколько архивов: меньше пересылок между процессами на мелких статьях
+        yield from executor.map(export_one, tasks, chunksize=max(1, min(64, len(tasks) // (workers * 4))))
+
+
+def export(tasks: List[ExportTask],
+           fmt: str,
+           output: str,
+           with_html: bool = False,
+           workers: int = export_workers) -> _Progress:
+    """Exports archives of tasks to output in fmt (see EXPORT_FORMATS), skipping ones already exported.
+
+    jsonl: output is a file, parquet and files: output is a directory. Archives are read and
+    inflated in a process pool of workers (0 - one per CPU). Failed archives are logged and
+    skipped, a rerun retries them.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise SavingErrorException(f'Unknown export format {fmt}')
+    workers = workers or os.cpu_count() or 1
+    if fmt == 'jsonl':
+        sink = _JsonlOutput(output)
+        out_dir = os.path.dirname(output)
+    elif fmt == 'parquet':
+        sink = _ParquetOutput(output)
+        out_dir = output
+    else:
+        sink = _FilesOutput(output)
+        out_dir = output
+    if fmt == 'files':
+        pending = [task for task in tasks if not sink.is_exported(task.href)]
+    else:
+        pending = [task for task in tasks if task.href not in sink.exported]
+    logger.info(f'Export {len(pending)} of {len(tasks)} archives to {output} ({fmt}, {workers} workers)')
+    progress = _Progress(len(pending))
+    try:
+        for result in _results(pending, fmt, out_dir, with_html, workers):
+            if result.error is None:
+                sink.write(result)
+            else:
+                logger.error(f'Export of {result.href} failed: {result.error}')
+            progress.update(result)
+    finally:
+        sink.close()
+    logger.info(f'Export finished: {progress.line()}')
+    return progress
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description='Bulk export of article archives')
+    args_parser.add_argument('--format', choices=EXPORT_FORMATS, default='jsonl')
+    args_parser.add_argument('--output', required=True, help='jsonl: file, parquet and files: directory')
+    args_parser.add_argument('--from_dt', help='Newer bound of publication time (yyyy-mm-dd hh:mm:ss)')
+    args_parser.add_argument('--to_dt', help='Older bound of publication time (yyyy-mm-dd hh:mm:ss)')
+    args_parser.add_argument('--site', help='Only articles of site, e.g. coindesk.com')
+    args_parser.add_argument('--hrefs', help='File with one href per line instead of a date range')
+    args_parser.add_argument('--html', action='store_true', help='Include raw html (always written for files)')
+    args_parser.add_argument('--workers', type=int, default=export_workers, help='Processes, 0 - one per CPU')
+    args = args_parser.parse_args()
+    logger.setLevel(logging.INFO)
+
+    hrefs = None
+    if args.hrefs:
+        with open(args.hrefs, 'r') as f:
+            hrefs = [line.strip() for line in f if line.strip()]
+    from_dt = datetime.strptime(args.from_dt, '%Y-%m-%d %H:%M:%S') if args.from_dt else None
+    to_dt = datetime.strptime(args.to_dt, '%Y-%m-%d %H:%M:%S') if args.to_dt else None
+    try:
+        progress = export(resolve_tasks(from_dt, to_dt, hrefs, args.site), args.format, args.output,
+                          args.html, args.workers)
+    except (ReadingErrorException, SavingErrorException) as e:
+        logger.error(e)
+        sys.exit(1)
+    sys.exit(1 if progress.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
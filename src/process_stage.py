@@ -0,0 +1,80 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from src.conf import archive_store
+from src.core.structures import ArticleInfo, ParsingErrorException
+from src.core.local_storage import save_to_disk, pack_archive, put_packed_archive
+from src.resources import coindesk_parser, cointelegraph_parser
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+PARSERS = {
+    'coindesk.com': coindesk_parser,
+    'cointelegraph.com': cointelegraph_parser,
+}
+
+
+def make_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    # forkserver: воркеры не наследуют потоки и блокировки уже работающего парсера
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('forkserver'))
+
+
+def _parse_and_store(site: str, href: str, shm_name: str, size: int, encoding: str) -> tuple[ArticleInfo, str | bytes]:
+    """CPU stage, runs in a worker process: extraction and archive compression.
+
+    Returns ArticleInfo without html (it is already in the archive) and archive path,
+    so the page is not pickled back to the parent. With archive_store = 'segments'
+    returns the packed archive instead of the path: the segment store has one writer,
+    the parent puts it.
+    """
+    # resource_tracker воркеров forkserver общий с родителем: блок регистрирует и удаляет только родитель
+    shm = SharedMemory(name=shm_name)
+    try:
+        html = str(shm.buf[:size], encoding, errors='replace')
+    finally:
+        shm.close()
+    article = PARSERS[site].parse_article_info(href, html)
+    if archive_store == 'segments':
+        return article._replace(html=''), pack_archive(article)
+    return article._replace(html=''), save_to_disk(article)
+
+
+class ProcessStage:
+    """Process pool for the CPU part of handle_article. Raw page bytes are handed over
+    through shared memory instead of being pickled into the task.
+
+    Use as context manager:
+        with ProcessStage(4) as stage:
+            article, file_full_name = stage.parse_and_store('coindesk.com', href, content, 'utf-8')
+    """
+
+    def __init__(self, max_workers: int):
+        self._executor = make_process_pool(max_workers)
+
+    def __enter__(self) -> 'ProcessStage':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    def parse_and_store(self, site: str, href: str, content: bytes, encoding: str) -> tuple[ArticleInfo, str]:
+        if site not in PARSERS:
+            raise ParsingErrorException(f'Parser for url {href} not found')
+        shm = SharedMemory(create=True, size=max(1, len(content)))
+        try:
+            shm.buf[:len(content)] = content
+            article, stored = self._executor.submit(_parse_and_store, site, href, shm.name, len(content),
+                                                    encoding).result()
+        finally:
+            shm.close()
+            shm.unlink()
+        if isinstance(stored, bytes):
+            return article, put_packed_archive(href, stored)
+        return article, stored
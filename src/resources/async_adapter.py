@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import aclosing
+from concurrent.futures import Executor
+from datetime import datetime
+from types import ModuleType
+from typing import AsyncIterator, List
+from src.core.structures import ArticleShortInfo, ArticleInfo, ParsingErrorException
+from src.core.networking.async_networking import AsyncHTTPClient
+from src.core.link_dedup import LinkDeduplicator
+from src.core.database.crawl_marks import CrawlMarks
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+
+
+class AsyncParserAdapter:
+    """Runs a parser module (coindesk_parser, cointelegraph_parser) on an event loop.
+
+    Requests go through AsyncHTTPClient, parsing is done by the module's parse_* functions
+    in parse_executor so BeautifulSoup does not block the loop.
+
+    Attributes:
+        parser -- parser module
+        client -- opened AsyncHTTPClient
+        parse_executor -- bounded pool for parse_* calls
+    """
+
+    def __init__(self, parser: ModuleType, client: AsyncHTTPClient, parse_executor: Executor):
+        self.parser = parser
+        self.client = client
+        self.parse_executor = parse_executor
+
+    async def _parse(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.parse_executor, func, *args)
+
+    async def _fetch_page(self, news_tag: str, num_page: int) -> str | dict:
+        page_request = self.parser.get_one_page_request(news_tag, num_page)
+        if page_request.json is None and page_request.body is None:
+            return await self.client.get_html(page_request.href)
+        # Запрос страницы ленты только читает, его можно повторять
+        return await self.client.get_json(page_request.href, json=page_request.json, data=page_request.body,
+                                          idempotent=True)
+
+    async def get_news_tags(self) -> List[str]:
+        if hasattr(self.parser, 'get_page_length'):
+            # Длина страницы подбирается синхронными запросами один раз, до обхода тегов
+            await asyncio.get_running_loop().run_in_executor(None, self.parser.get_page_length)
+        return await self._parse(self.parser.parse_news_tags, await self.client.get_html(self.parser.NEWS_TAGS_URL))
+
+    async def get_rss_links(self) -> List[ArticleShortInfo]:
+        """All links of the site's RSS feed, newest first."""
+        return await self._parse(self.parser.parse_rss_links, await self.client.get_html(self.parser.RSS_URL))
+
+    async def get_one_page_links(self, news_tag: str, num_page: int) -> List[ArticleShortInfo]:
+        page = await self._fetch_page(news_tag, num_page)
+        news_list = await self._parse(self.parser.parse_one_page_links, page, news_tag, num_page)
+        # Запись в индекс страниц блокирующая, выносим её из цикла событий
+        await asyncio.get_running_loop().run_in_executor(None, self.parser.index_page_links,
+                                                         news_tag, num_page, news_list)
+        return news_list
+
+    async def get_one_page_last_link(self, news_tag: str, num_page: int) -> ArticleShortInfo | None:
+        page = await self._fetch_page(news_tag, num_page)
+        return await self._parse(self.parser.parse_one_page_last_link, page, news_tag, num_page)
+
+    async def get_start_page(self, tag_name: str, from_dt: datetime) -> int:
+        try:
+            logger.info(f'Search start page for tag {tag_name}')
+            search = self.parser.get_start_page_search(tag_name, from_dt)
+            # Первый шаг поиска читает индекс страниц из БД, остальные только считают
+            page_num = await asyncio.get_running_loop().run_in_executor(None, next, search)
+            while True:
+                page_num = search.send(await self.get_one_page_links(tag_name, page_num))
+        except StopIteration as result:
+            return result.value
+        except Exception as e:
+            raise ParsingErrorException(f'Error by searching start page for tag "{tag_name}" and date {from_dt}', parent=e)
+
+    async def _prefetch_pages(self, news_tag: str, first_page: int, window: int,
+                              last_page: int | None) -> AsyncIterator[List[ArticleShortInfo]]:
+        """Async counterpart of streaming.prefetch_pages: pages in order, up to window requests at once."""
+        in_flight = deque()
+        next_page = first_page
+        try:
+            while True:
+                while not in_flight or (len(in_flight) < window and (last_page is None or next_page <= last_page)):
+                    in_flight.append(asyncio.create_task(self.get_one_page_links(news_tag, next_page)))
+                    next_page += 1
+                yield await in_flight.popleft()
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def iter_one_tag_links(self, tag_name: str, from_dt: datetime, to_dt: datetime) -> AsyncIterator[List[ArticleShortInfo]]:
+        """Yields links of the window page by page as soon as every page is fetched.
+
+        Pages up to the end of the walk estimated by the page index are requested in parallel.
+        """
+        try:
+            logger.info(f'Get news on tag "{tag_name}"')
+            page_num = await self.get_start_page(tag_name, from_dt)
+            window, last_page = await asyncio.get_running_loop().run_in_executor(
+                None, self.parser.get_prefetch_window, tag_name, page_num, to_dt)
+            async with aclosing(self._prefetch_pages(tag_name, page_num, window, last_page)) as pages:
+                async for news_page_articles in pages:
+                    # Пока не выйдем за границу (меньшую) окна, остальные запросы отменит aclosing
+                    if not news_page_articles or news_page_articles[0].pub_datetime <= to_dt:
+                        break
+                    yield [elem for elem in news_page_articles if from_dt >= elem.pub_datetime >= to_dt]
+        except Exception as e:
+            raise ParsingErrorException(f'Get all news of one tag by datetime error', parent=e)
+
+    async def iter_new_tag_links(self, tag_name: str, to_dt: datetime | None,
+                                 marks: CrawlMarks) -> AsyncIterator[List[ArticleShortInfo]]:
+        """Incremental walk: pages from the head of the tag down to CrawlMarks.stop_dt."""
+        try:
+            stop_dt = await asyncio.get_running_loop().run_in_executor(None, marks.stop_dt, self.parser.SITE,
+                                                                       tag_name, to_dt)
+            logger.info(f'Get new news on tag "{tag_name}" down to {stop_dt}')
+            page_num = self.parser.FIRST_PAGE
+            news_page_articles = await self.get_one_page_links(tag_name, page_num)
+            while news_page_articles:
+                marks.observe(self.parser.SITE, tag_name, news_page_articles)
+                if new_articles := [elem for elem in news_page_articles if elem.pub_datetime >= stop_dt]:
+                    yield new_articles
+                if news_page_articles[-1].pub_datetime < stop_dt:
+                    break
+                page_num += 1
+                news_page_articles = await self.get_one_page_links(tag_name, page_num)
+        except Exception as e:
+            raise ParsingErrorException(f'Get new news of one tag error', parent=e)
+
+    async def get_all_one_tag_links(self, tag_name: str, from_dt: datetime, to_dt: datetime) -> List[ArticleShortInfo]:
+        articles_list = []
+        async for page in self.iter_one_tag_links(tag_name, from_dt, to_dt):
+            articles_list.extend(page)
+        return articles_list
+
+    async def get_all_links(self, from_dt: datetime, to_dt: datetime) -> List[ArticleShortInfo]:
+        articles_list = []
+        deduplicator = LinkDeduplicator()
+        try:
+            logger.info(f'Get all "{self.parser.__name__}" links from {from_dt} to {to_dt}')
+            news_tags = await self.get_news_tags()
+            for result in await asyncio.gather(*(self.get_all_one_tag_links(tag, from_dt, to_dt) for tag in news_tags)):
+                articles_list.extend(deduplicator.filter(result))
+        except Exception as e:
+            raise ParsingErrorException(f'Get all news by datetime error', parent=e)
+        logger.info(f'Articles list length is {len(articles_list)}, duplicates suppressed: {deduplicator.suppressed}')
+        return articles_list
+
+    async def get_article_info(self, href: str) -> ArticleInfo:
+        return await self._parse(self.parser.parse_article_info, href, await self.client.get_html(href))
@@ -1,23 +1,51 @@
-import math
 from concurrent.futures import ThreadPoolExecutor
 import time
 
 import pytz
 import logging
 from src.core import ArticleShortInfo, ArticleInfo
+from src.core.structures import PageRequest
 from src.core.structures.custom_exceptions import ParsingErrorException
+from src.conf import stream_queue_size, tag_prefetch_pages
+from src.core.streaming import merge_streams, prefetch_pages
+from src.core.link_dedup import LinkDeduplicator
 from src.core.networking import get_html_from_url
+from src.core.html_parsing import parse_html
+from src.core.database.page_index import StartPageSearch, get_page_index, start_page_search, find_start_page
+from src.core.database.crawl_marks import CrawlMarks, get_crawl_marks
 from datetime import datetime
-from typing import List
-from bs4 import BeautifulSoup
+from urllib.parse import urlsplit
+from typing import Iterator, List, Tuple
+from contextlib import closing
+from itertools import chain
+from functools import partial
 import feedparser
 
 
 __all__ = [
+    'SITE',
+    'FIRST_PAGE',
+    'NEWS_TAGS_URL',
+    'RSS_URL',
+    'SELECTORS',
+    'get_one_page_request',
     'get_one_page_links',
+    'parse_one_page_links',
+    'index_page_links',
+    'get_one_page_last_link',
+    'parse_one_page_last_link',
+    'get_start_page_search',
+    'get_prefetch_window',
     'get_rss_links',
+    'parse_rss_links',
+    'iter_rss_first_links',
+    'parse_news_tags',
     'get_all_links',
-    'get_article_info'
+    'iter_all_links',
+    'iter_new_tag_links',
+    'iter_all_new_links',
+    'get_article_info',
+    'parse_article_info'
     ]
 
 
@@ -25,25 +53,57 @@ logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
 
 
-def get_one_page_links(news_tag: str, num_page: int) -> List[ArticleShortInfo]:
-    page_html = get_html_from_url(f'https://www.coindesk.com{news_tag}{num_page}')
+SITE = 'coindesk.com'
+# Длина страницы ленты coindesk не задаётся запросом, индекс страниц считает позиции в страницах
+INDEX_PAGE_SIZE = 1
+# Номер самой свежей страницы ленты тега
+FIRST_PAGE = 1
+RSS_URL = 'https://www.coindesk.com/arc/outboundfeeds/rss/'
+NEWS_TAGS_URL = 'https://coindesk.com'
+# Все CSS селекторы сайта. Только синтаксис, который понимают все бэкенды html_parsing
+SELECTORS = {
+    'card': 'div.articleTextSection',
+    'card_title': 'a.card-title',
+    'card_pub_date': 'div.timing-data > div.ac-publishing-date > div > span',
+    'card_category': 'a.category',
+    'card_description': 'span.content-text',
+    'card_author': 'a.ac-author',
+    'news_tags': 'header.sticky-header > '
+                 'div > '
+                 'div[data-module-name="main-navigation"] > '
+                 'div[data-submodule-name="subrow"] > '
+                 'nav > ul > '
+                 'li > a[href="/web3/"] + div > div > div > div > div > ul > li > a',
+    'article_header': '.at-headline',
+    'article_subheadline': '.at-subheadline',
+    'article_content': '.at-content-section',
+    'article_pub_date': 'div.at-created > div > span, div.block-item > span > span.fUOSEs',
+    'article_language': 'div[data-module-name="footer/footer-select"] > button',
+}
+
+
+def get_one_page_request(news_tag: str, num_page: int) -> PageRequest:
+    return PageRequest(f'https://www.coindesk.com{news_tag}{num_page}')
+
+
+def parse_one_page_links(page_html: str, news_tag: str, num_page: int) -> List[ArticleShortInfo]:
     try:
         logger.info(f'Getting news from page {num_page} by tag {news_tag}')
-        soup = BeautifulSoup(page_html, "html.parser")
-        short_news = soup.select('div.articleTextSection')
+        soup = parse_html(page_html)
+        short_news = soup.select(SELECTORS['card'])
         news_list = []
         for ind, item in enumerate(short_news):
             logger.info(f'Parsing item {ind}')
-            title = item.select_one('a.card-title')
+            title = item.select_one(SELECTORS['card_title'])
             if title.attrs['href'].find('/video/') != -1:
                 continue
-            pub_date = item.select_one('div.timing-data > div.ac-publishing-date > div > span').text
+            pub_date = item.select_one(SELECTORS['card_pub_date']).text
             news_list.append(ArticleShortInfo(
-                category=item.find('a', class_='category').text,
+                category=item.select_one(SELECTORS['card_category']).text,
                 title=title.text,
                 link='https://coindesk.com' + title.attrs['href'],
-                description=item.find('span', class_='content-text').text,
-                author=item.find('a', class_='ac-author').text,
+                description=item.select_one(SELECTORS['card_description']).text,
+                author=item.select_one(SELECTORS['card_author']).text,
                 pub_datetime=pytz.utc.localize(datetime.strptime(pub_date.replace('.', ''), '%b %d, %Y at %I:%M %p %Z'))
             ))
     except Exception as e:
@@ -53,30 +113,38 @@ def get_one_page_links(news_tag: str, num_page: int) -> List[ArticleShortInfo]:
     return news_list
 
 
-def get_one_page_last_link(news_tag: str, num_page: int) -> ArticleShortInfo | None:
-    page_html = get_html_from_url(f'https://www.coindesk.com{news_tag}{num_page}')
+def index_page_links(news_tag: str, num_page: int, news_list: List[ArticleShortInfo]) -> None:
+    get_page_index().record(SITE, news_tag, num_page, INDEX_PAGE_SIZE, news_list)
+
+
+def get_one_page_links(news_tag: str, num_page: int, use_cache: bool = True) -> List[ArticleShortInfo]:
+    page_html = get_html_from_url(get_one_page_request(news_tag, num_page).href, use_cache=use_cache)
+    news_list = parse_one_page_links(page_html, news_tag, num_page)
+    index_page_links(news_tag, num_page, news_list)
+    return news_list
+
+
+def parse_one_page_last_link(page_html: str, news_tag: str, num_page: int) -> ArticleShortInfo | None:
     try:
         logger.info(f'Getting last news from page {num_page}')
-        soup = BeautifulSoup(page_html, "html.parser")
-        # short_news = soup.find_all('div', class_='articleTextSection')
-        short_news = soup.select('div.articleTextSection')
+        soup = parse_html(page_html)
+        short_news = soup.select(SELECTORS['card'])
         last_index = len(short_news)-1
         last_news = short_news[last_index]
-        # title = last_news.find('a', class_='card-title')
-        title = last_news.select_one('a.card-title')
+        title = last_news.select_one(SELECTORS['card_title'])
         while title.attrs['href'].find('/video/') != -1 and last_index > 0:
             last_index -= 1
             last_news = short_news[last_index]
-            title = last_news.select_one('a.card-title')
+            title = last_news.select_one(SELECTORS['card_title'])
         if title.attrs['href'].find('/video/') != -1:
             return None
-        pub_date = last_news.select_one('div.timing-data > div.ac-publishing-date > div > span').text
+        pub_date = last_news.select_one(SELECTORS['card_pub_date']).text
         return ArticleShortInfo(
-            category=last_news.find('a', class_='category').text,
+            category=last_news.select_one(SELECTORS['card_category']).text,
             title=title.text,
             link='https://coindesk.com' + title.attrs['href'],
-            description=last_news.find('span', class_='content-text').text,
-            author=last_news.find('a', class_='ac-author').text,
+            description=last_news.select_one(SELECTORS['card_description']).text,
+            author=last_news.select_one(SELECTORS['card_author']).text,
             pub_datetime=pytz.utc.localize(datetime.strptime(pub_date.replace('.', ''), '%b %d, %Y at %I:%M %p %Z'))
         )
     except Exception as e:
@@ -84,94 +152,122 @@ def get_one_page_last_link(news_tag: str, num_page: int) -> ArticleShortInfo | N
                                     f'Page URL:https://www.coindesk.com{news_tag}/{num_page}', parent=e)
 
 
-def get_rss_links(from_dt: datetime = datetime.now(pytz.UTC), to_dt: datetime = None) -> List[ArticleShortInfo]:
+def get_one_page_last_link(news_tag: str, num_page: int) -> ArticleShortInfo | None:
+    page_html = get_html_from_url(get_one_page_request(news_tag, num_page).href, use_cache=True)
+    return parse_one_page_last_link(page_html, news_tag, num_page)
+
+
+def _rss_datetime(item) -> datetime:
+    # feedparser отдаёт время в UTC, а mktime/fromtimestamp считают его локальным
+    return datetime(*item.published_parsed[:6], tzinfo=pytz.UTC)
+
+
+def parse_rss_links(xml_data: str) -> List[ArticleShortInfo]:
+    """All links of the RSS feed, newest first."""
     try:
-        # TODO почему не радотает rss_parser
-        # rss = Parser.parse(xml_data)
-        logger.info('Get links from RSS')
-        rss = feedparser.parse('https://www.coindesk.com/arc/outboundfeeds/rss/')
+        rss = feedparser.parse(xml_data)
         news_list = []
         for item in rss.entries:
             if item.link.find('/video/') != -1:
                 continue
-            tmp_news = ArticleShortInfo(
+            news_list.append(ArticleShortInfo(
                 category=item.tags[0]['term'],
                 title=item.title,
-                link=item.link,
+                # Ссылки ленты тега собираются без www и параметров, приводим к тому же виду
+                link='https://coindesk.com' + urlsplit(item.link).path,
                 description=item.summary,
                 author=item.author,
-                pub_datetime=datetime.fromtimestamp(time.mktime(item.published_parsed))
-            )
-            if to_dt:
-                if to_dt <= tmp_news.pub_datetime <= from_dt:
-                    news_list.append(tmp_news)
-            else:
-                if tmp_news.pub_datetime <= from_dt:
-                    news_list.append(tmp_news)
+                pub_datetime=_rss_datetime(item)
+            ))
     except Exception as e:
         raise ParsingErrorException(f'RSS parsing error', parent=e)
-    return news_list
+    return sorted(news_list, key=lambda elem: elem.pub_datetime, reverse=True)
 
 
-def get_news_tags() -> List[str]:
-    html_info = get_html_from_url('https://coindesk.com')
+def get_rss_links(from_dt: datetime = None, to_dt: datetime = None) -> List[ArticleShortInfo]:
+    logger.info('Get links from RSS')
+    if not from_dt:
+        from_dt = datetime.now(pytz.UTC)
+    return [elem for elem in parse_rss_links(get_html_from_url(RSS_URL, use_cache=True))
+            if from_dt >= elem.pub_datetime and (not to_dt or elem.pub_datetime >= to_dt)]
+
+
+def parse_news_tags(html_info: str) -> List[str]:
     try:
         logger.info(f'Searching news tags')
-        soup = BeautifulSoup(html_info, "html.parser")
-        return [el['href'] for el in soup.select('header.sticky-header > '
-                    'div > '
-                    'div[data-module-name="main-navigation"] > '
-                    'div[data-submodule-name="subrow"] > '
-                    'nav > ul > '
-                    'li > a[href="/web3/"] + div > div > div > div > div > ul > li > a')]
+        soup = parse_html(html_info)
+        return [el['href'] for el in soup.select(SELECTORS['news_tags'])]
     except Exception as e:
         raise ParsingErrorException('Getting news tags error', parent=e)
 
 
+def get_news_tags() -> List[str]:
+    return parse_news_tags(get_html_from_url(NEWS_TAGS_URL, use_cache=True))
+
+
+def get_start_page_search(tag_name: str, from_dt: datetime) -> StartPageSearch:
+    return start_page_search(get_page_index(), SITE, tag_name, INDEX_PAGE_SIZE, from_dt)
+
+
 def get_start_page(tag_name: str, from_dt: datetime) -> int:
     try:
         logger.info(f'Search start page for tag {tag_name}')
-        page_num = 1
-        left, right = 1, page_num
-        news_page_article = get_one_page_last_link(tag_name, page_num)
-        while not news_page_article:
-            left = right = page_num = page_num + 1
-            news_page_article = get_one_page_last_link(tag_name, page_num)
-        # Идём вправо пока не перейдём первую (бОльшую) границу
-        while news_page_article.pub_datetime > from_dt:
-            page_num *= 2
-            right = page_num
-            news_page_article = get_one_page_last_link(tag_name, page_num)
-        # Бинарным поиском ищем страницу начала
-        while left < right:
-            page_num = math.ceil((left + right) / 2)
-            news_page_article = get_one_page_last_link(tag_name, page_num)
-            if news_page_article.pub_datetime <= from_dt and right > page_num:
-                right = page_num
-            elif left < page_num:
-                left = page_num
-            else:
-                page_num = right
-                break
-        return page_num
+        # Страницы, скачанные при поиске, лежат в HTTP кэше и не качаются повторно
+        return find_start_page(get_start_page_search(tag_name, from_dt), partial(get_one_page_links, tag_name))
     except Exception as e:
         raise ParsingErrorException(f'Error by searching start page for tag "{tag_name}" and date {from_dt}', parent=e)
 
 
-def get_all_one_tag_links(tag_name: str, from_dt: datetime, to_dt: datetime) -> List[ArticleShortInfo]:
-    articles_list = []
+def get_prefetch_window(tag_name: str, start_page: int, to_dt: datetime) -> Tuple[int, int | None]:
+    """How many pages of a walk from start_page down to to_dt to request at once, and estimated last page."""
+    last_page = get_page_index().guess_last_page(SITE, tag_name, INDEX_PAGE_SIZE, start_page, to_dt)
+    if last_page is None:
+        return 1, None
+    return min(tag_prefetch_pages, last_page - start_page + 1), last_page
+
+
+def iter_one_tag_links(tag_name: str, from_dt: datetime, to_dt: datetime) -> Iterator[List[ArticleShortInfo]]:
+    """Yields links of the window page by page as soon as every page is fetched.
+
+    Pages up to the end of the walk estimated by the page index are requested in parallel.
+    """
     try:
         logger.info(f'Get news on tag "{tag_name}"')
         page_num = get_start_page(tag_name, from_dt)
-        news_page_articles = get_one_page_links(tag_name, page_num)
-        # Пока не выйдем за границу (меньшую) окна
-        while news_page_articles[0].pub_datetime > to_dt:
-            articles_list.extend(filter(lambda elem: from_dt >= elem.pub_datetime >= to_dt, news_page_articles))
-            page_num += 1
-            news_page_articles = get_one_page_links(tag_name, page_num)
+        window, last_page = get_prefetch_window(tag_name, page_num, to_dt)
+        with closing(prefetch_pages(partial(get_one_page_links, tag_name), page_num, window, last_page)) as pages:
+            for news_page_articles in pages:
+                # Пока не выйдем за границу (меньшую) окна, остальные запросы отменит closing
+                if not news_page_articles or news_page_articles[0].pub_datetime <= to_dt:
+                    break
+                yield [elem for elem in news_page_articles if from_dt >= elem.pub_datetime >= to_dt]
     except Exception as e:
         raise ParsingErrorException(f'Get all news of one tag by datetime error', parent=e)
-    return articles_list
+
+
+def get_all_one_tag_links(tag_name: str, from_dt: datetime, to_dt: datetime) -> List[ArticleShortInfo]:
+    return list(chain.from_iterable(iter_one_tag_links(tag_name, from_dt, to_dt)))
+
+
+def iter_new_tag_links(tag_name: str, to_dt: datetime | None, marks: CrawlMarks) -> Iterator[List[ArticleShortInfo]]:
+    """Incremental walk: pages from the head of the tag down to CrawlMarks.stop_dt."""
+    try:
+        stop_dt = marks.stop_dt(SITE, tag_name, to_dt)
+        logger.info(f'Get new news on tag "{tag_name}" down to {stop_dt}')
+        page_num = FIRST_PAGE
+        # Голова тега меняется быстрее, чем живёт кэш, берём страницы с сайта
+        news_page_articles = get_one_page_links(tag_name, page_num, use_cache=False)
+        while news_page_articles:
+            marks.observe(SITE, tag_name, news_page_articles)
+            # Статьи с временем метки могли не попасть в прошлый прогон, повторы отсеет БД
+            if new_articles := [elem for elem in news_page_articles if elem.pub_datetime >= stop_dt]:
+                yield new_articles
+            if news_page_articles[-1].pub_datetime < stop_dt:
+                break
+            page_num += 1
+            news_page_articles = get_one_page_links(tag_name, page_num, use_cache=False)
+    except Exception as e:
+        raise ParsingErrorException(f'Get new news of one tag error', parent=e)
 
 
 def threading_get_all_one_tag_links(articles_list: List[ArticleShortInfo], tag_name: str, from_dt: datetime, to_dt: datetime):
@@ -191,6 +287,7 @@ def threading_get_all_one_tag_links(articles_list: List[ArticleShortInfo], tag_n
 def get_all_links(from_dt: datetime, to_dt: datetime) -> List[ArticleShortInfo]:
     start = time.time()
     articles_list = []
+    deduplicator = LinkDeduplicator()
     try:
         logger.info(f'Get all "coindesk.com" links from {from_dt} to {to_dt}')
         if not from_dt:
@@ -204,31 +301,82 @@ def get_all_links(from_dt: datetime, to_dt: datetime) -> List[ArticleShortInfo]:
                                        news_tags,
                                        [from_dt] * len(news_tags),
                                        [to_dt] * len(news_tags)):
-                articles_list.extend(result)
+                articles_list.extend(deduplicator.filter(result))
 
     except Exception as e:
         raise ParsingErrorException(f'Get all news by datetime error', parent=e)
     logger.info(f'Escape from get_all_links. Working time is {time.time() - start}')
-    logger.info(f'Articles list length is {len(articles_list)}')
+    logger.info(f'Articles list length is {len(articles_list)}, duplicates suppressed: {deduplicator.suppressed}')
     return articles_list
 
 
-def get_article_info(href: str) -> ArticleInfo:
-    html_info = get_html_from_url(href)
+def iter_all_links(from_dt: datetime,
+                   to_dt: datetime,
+                   deduplicator: LinkDeduplicator | None = None) -> Iterator[List[ArticleShortInfo]]:
+    """Streaming variant of get_all_links: pages of links of all tags in arrival order.
+
+    Every article is emitted once even if it is listed under several tags, pass own
+    deduplicator to read its suppressed counter after the run.
+    """
+    logger.info(f'Stream all "coindesk.com" links from {from_dt} to {to_dt}')
+    news_tags = get_news_tags()
+    pages = merge_streams([partial(iter_one_tag_links, tag, from_dt, to_dt) for tag in news_tags],
+                          max_workers=5, maxsize=stream_queue_size)
+    return (deduplicator or LinkDeduplicator()).filter_pages(pages)
+
+
+def iter_all_new_links(to_dt: datetime | None = None,
+                       deduplicator: LinkDeduplicator | None = None,
+                       marks: CrawlMarks | None = None) -> Iterator[List[ArticleShortInfo]]:
+    """Incremental variant of iter_all_links: only links newer than crawl marks of the tags.
+
+    Tags without a mark are walked back over the initial window, to_dt bounds all tags if given.
+
+    Marks are observed while walking, call marks.commit() after the links are stored.
+    """
+    logger.info(f'Stream new "coindesk.com" links')
+    marks = marks or get_crawl_marks()
+    news_tags = get_news_tags()
+    pages = merge_streams([partial(iter_new_tag_links, tag, to_dt, marks) for tag in news_tags],
+                          max_workers=5, maxsize=stream_queue_size)
+    return (deduplicator or LinkDeduplicator()).filter_pages(pages)
+
+
+def iter_rss_first_links(from_dt: datetime,
+                         to_dt: datetime,
+                         deduplicator: LinkDeduplicator | None = None) -> Iterator[List[ArticleShortInfo]]:
+    """Variant of iter_all_links which serves the recent part of the window from one RSS request.
+
+    Tags are paginated only for the part of the window older than the oldest feed item.
+    """
+    deduplicator = deduplicator or LinkDeduplicator()
+    logger.info(f'Get RSS links of "coindesk.com" from {from_dt} to {to_dt}')
+    rss_links = parse_rss_links(get_html_from_url(RSS_URL, use_cache=True))
+    if page := deduplicator.filter([elem for elem in rss_links if from_dt >= elem.pub_datetime >= to_dt]):
+        yield page
+    if rss_links and rss_links[-1].pub_datetime <= to_dt:
+        logger.info(f'Window is covered by RSS, {len(page)} links')
+        return
+    if rss_links:
+        from_dt = min(from_dt, rss_links[-1].pub_datetime)
+    yield from iter_all_links(from_dt, to_dt, deduplicator)
+
+
+def parse_article_info(href: str, html_info: str) -> ArticleInfo:
     try:
         logger.info(f'Get article info from {href}')
-        soup = BeautifulSoup(html_info, "html.parser")
+        soup = parse_html(html_info)
 
-        header = soup.select_one('.at-headline').text
-        content = soup.select_one('.at-subheadline').text
-        content += '\n'.join(i.text for i in soup.select('.at-content-section'))
+        header = soup.select_one(SELECTORS['article_header']).text
+        content = soup.select_one(SELECTORS['article_subheadline']).text
+        content += '\n'.join(i.text for i in soup.select(SELECTORS['article_content']))
         publication_dt = pytz.utc.localize(datetime\
                       .strptime(soup
-                      .select_one(':is(div.at-created > div > span, div.block-item > span > span.fUOSEs)')
+                      .select_one(SELECTORS['article_pub_date'])
                       .text
                       .replace('.', ''), "%b %d, %Y at %I:%M %p %Z"))  # %r)
         parsing_dt = datetime.now(pytz.UTC)
-        language = soup.select_one('div[data-module-name="footer/footer-select"] > button').text
+        language = soup.select_one(SELECTORS['article_language']).text
         ainfo = ArticleInfo(header=header,
                             content=content,
                             publication_dt=publication_dt,
@@ -240,3 +388,7 @@ def get_article_info(href: str) -> ArticleInfo:
         raise ParsingErrorException(f'coindesk.com article parsing error.\nURL: {href}', parent=e)
 
     return ainfo
+
+
+def get_article_info(href: str) -> ArticleInfo:
+    return parse_article_info(href, get_html_from_url(href))
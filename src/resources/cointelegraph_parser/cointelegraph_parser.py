@@ -1,24 +1,52 @@
-import math
 import time
-from typing import List
+import threading
+from typing import Iterator, List, Tuple
+from contextlib import closing
+from itertools import chain
+from functools import partial
 from datetime import datetime
+from urllib.parse import urlsplit
 from concurrent.futures import ThreadPoolExecutor
 
 import pytz
 
-from src.core.structures import ArticleShortInfo, ArticleInfo, ParsingErrorException
-from src.core.networking import get_json_from_url, get_html_from_url
-from bs4 import BeautifulSoup
+from src.core.structures import ArticleShortInfo, ArticleInfo, ParsingErrorException, PageRequest
+from src.conf import stream_queue_size, tag_prefetch_pages, cointelegraph_max_page_length
+from src.core.streaming import merge_streams, prefetch_pages
+from src.core.link_dedup import LinkDeduplicator
+from src.core.networking import get_json_from_url, get_html_from_url, GraphQLOperation
+from src.core.html_parsing import parse_html
+from src.core.database.page_index import StartPageSearch, get_page_index, start_page_search, find_start_page
+from src.core.database.crawl_marks import CrawlMarks, get_crawl_marks
 import feedparser
-from time import mktime
 import logging
 
 
 __all__ = [
+    'SITE',
+    'FIRST_PAGE',
+    'NEWS_TAGS_URL',
+    'RSS_URL',
+    'SELECTORS',
+    'get_one_page_request',
+    'get_page_length',
     'get_one_page_links',
+    'parse_one_page_links',
+    'index_page_links',
+    'get_one_page_last_link',
+    'parse_one_page_last_link',
+    'get_start_page_search',
+    'get_prefetch_window',
     'get_rss_links',
+    'parse_rss_links',
+    'iter_rss_first_links',
+    'parse_news_tags',
     'get_all_links',
-    'get_article_info'
+    'iter_all_links',
+    'iter_new_tag_links',
+    'iter_all_new_links',
+    'get_article_info',
+    'parse_article_info'
 ]
 
 
@@ -26,155 +54,295 @@ logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
 
 
-def get_one_page_links(news_tag: str, num_page: int, news_on_page: int = 15) -> List[ArticleShortInfo]:
-    try:
-        logger.info(f'Getting news from page {num_page} for tag {news_tag}')
-        json_reqv = {
-            'query': 'query TagPageQuery($short: String, $slug: String!, $order: String, $offset: Int!, $length: Int!) {\n  locale(short: $short) {\n    tag(slug: $slug) {\n      cacheKey\n      id\n      slug\n      avatar\n      createdAt\n      updatedAt\n      redirectRelativeUrl\n      alternates {\n        cacheKey\n        short\n        domain\n        id\n        code\n        __typename\n      }\n      tagTranslates {\n        cacheKey\n        id\n        title\n        metaTitle\n        pageTitle\n        description\n        metaDescription\n        keywords\n        __typename\n      }\n      posts(order: $order, offset: $offset, length: $length) {\n        data {\n          cacheKey\n          id\n          slug\n          views\n          postTranslate {\n            cacheKey\n            id\n            title\n            avatar\n            published\n            publishedHumanFormat\n            leadText\n            author {\n              cacheKey\n              id\n              slug\n              authorTranslates {\n                cacheKey\n                id\n                name\n                __typename\n              }\n              __typename\n            }\n            __typename\n          }\n          category {\n            cacheKey\n            id\n            __typename\n          }\n          author {\n            cacheKey\n            id\n            slug\n            authorTranslates {\n              cacheKey\n              id\n              name\n              __typename\n            }\n            __typename\n          }\n          postBadge {\n            cacheKey\n            id\n            label\n            postBadgeTranslates {\n              cacheKey\n              id\n              title\n              __typename\n            }\n            __typename\n          }\n          showShares\n          showStats\n          __typename\n        }\n        postsCount\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n}',
-            'operationName': 'TagPageQuery',
-            'variables': {
-                'slug': news_tag,
-                'order': 'postPublishedTime',
-                'offset': news_on_page*num_page,
-                'length': news_on_page,
-                'short': 'en',
-                'cacheTimeInMS': 300000,
-            },
+SITE = 'cointelegraph.com'
+# Номер самой свежей страницы ленты тега (offset = news_on_page * num_page)
+FIRST_PAGE = 0
+RSS_URL = 'https://cointelegraph.com/rss'
+NEWS_TAGS_URL = 'https://cointelegraph.com/'
+GRAPHQL_URL = 'https://conpletus.cointelegraph.com/v1/'
+# Только поля, которые читает _short_info_from_post
+TAG_PAGE_QUERY = '''query TagPageQuery($short: String, $slug: String!, $order: String, $offset: Int!, $length: Int!) {
+  locale(short: $short) {
+    tag(slug: $slug) {
+      posts(order: $order, offset: $offset, length: $length) {
+        data {
+          slug
+          postTranslate {
+            title
+            published
+            leadText
+            author {
+              authorTranslates {
+                name
+              }
+            }
+          }
+          postBadge {
+            postBadgeTranslates {
+              title
+            }
+          }
         }
-        logger.info(f'Try to get JSON for tag {news_tag}, page {num_page} ({news_on_page} on page)')
-        json_data = get_json_from_url('https://conpletus.cointelegraph.com/v1/', json=json_reqv)
+        postsCount
+      }
+    }
+  }
+}'''
+# Запрос и постоянные переменные сериализуются один раз, на каждую страницу кодируются только slug, offset, length
+TAG_PAGE_OPERATION = GraphQLOperation(GRAPHQL_URL, 'TagPageQuery', TAG_PAGE_QUERY, {
+    'order': 'postPublishedTime',
+    'short': 'en',
+    'cacheTimeInMS': 300000,
+}, ('slug', 'offset', 'length'))
+# Длина страницы по умолчанию (как на сайте) и тег с длинной лентой для подбора максимальной длины
+DEFAULT_PAGE_LENGTH = 15
+PROBE_TAG = 'bitcoin'
+# Все CSS селекторы сайта. Только синтаксис, который понимают все бэкенды html_parsing
+SELECTORS = {
+    'news_tags': 'div.header-zone > '
+                 'div.header-zone__menu > '
+                 'div.menu-desktop__row > '
+                 'nav > ul > '
+                 'li > div > '
+                 'span[data-gtm-locator="menubar_clickon_news"] + div > '
+                 'ul > li > a',
+    'article_header': 'h1.post__title',
+    'article_lead': 'p.post__lead',
+    # TODO брать только бездетных
+    'article_content': 'div.post-content > p, div.post-content > h2',
+    'article_pub_date': 'div.post-meta > div.post-meta__publish-date > time',
+    'article_language': 'header.header-desktop > '
+                        'div.header-desktop__row > '
+                        'div.header-side-links > '
+                        'ul > '
+                        'li:first-child > '
+                        'div.header-side-links__select',
+}
+
+
+def get_one_page_request(news_tag: str, num_page: int, news_on_page: int | None = None) -> PageRequest:
+    news_on_page = news_on_page or get_page_length()
+    return PageRequest(GRAPHQL_URL, body=TAG_PAGE_OPERATION.body(slug=news_tag,
+                                                                  offset=news_on_page*num_page,
+                                                                  length=news_on_page))
+
+
+_page_length: int | None = None
+_page_length_lock = threading.Lock()
+
+
+def _probe_page_length(length: int) -> int:
+    """How many posts the endpoint returns for a page of length, 0 if the request is rejected."""
+    try:
+        page_request = get_one_page_request(PROBE_TAG, 0, length)
+        json_data = get_json_from_url(page_request.href, data=page_request.body, use_cache=True,
+                                      idempotent=TAG_PAGE_OPERATION.idempotent)
+        posts = json_data['data']['locale']['tag']['posts']
+    except Exception as e:
+        logger.info(f'Page length {length} is rejected: {e}')
+        return 0
+    # Лента короче запрошенного - проверить длину нельзя, считаем что принята
+    return length if posts['postsCount'] <= length else len(posts['data'])
+
+
+def get_page_length() -> int:
+    """Largest page length the GraphQL endpoint accepts, up to cointelegraph_max_page_length.
+
+    Found once per process: the length is doubled from DEFAULT_PAGE_LENGTH while the
+    endpoint returns full pages, a silently capped page gives the cap itself.
+    """
+    global _page_length
+    with _page_length_lock:
+        if _page_length is None:
+            _page_length = length = DEFAULT_PAGE_LENGTH
+            while length < cointelegraph_max_page_length:
+                length = min(length * 2, cointelegraph_max_page_length)
+                accepted = _probe_page_length(length)
+                _page_length = max(_page_length, accepted)
+                if accepted < length:
+                    break
+            logger.info(f'GraphQL page length is {_page_length}')
+        return _page_length
+
+
+def _short_info_from_post(val: dict) -> ArticleShortInfo:
+    return ArticleShortInfo(
+        val['postBadge']['postBadgeTranslates'][0]['title'],
+        val['postTranslate']['title'],
+        f'https://cointelegraph.com/news/{val["slug"]}',
+        val['postTranslate']['leadText'],
+        str.strip(val['postTranslate']['author']['authorTranslates'][0]['name']),
+        datetime.fromisoformat(val['postTranslate']['published'])
+    )
+
+
+def parse_one_page_links(json_data: dict, news_tag: str, num_page: int, news_on_page: int = 15) -> List[ArticleShortInfo]:
+    try:
         res_list = []
         for ind, val in enumerate(json_data['data']['locale']['tag']['posts']['data']):
             logger.info(f'Parsing item {ind}')
-            res_list.append(ArticleShortInfo(
-                val['postBadge']['postBadgeTranslates'][0]['title'],
-                val['postTranslate']['title'],
-                f'https://cointelegraph.com/news/{val["slug"]}',
-                val['postTranslate']['leadText'],
-                str.strip(val['postTranslate']['author']['authorTranslates'][0]['name']),
-                datetime.fromisoformat(val['postTranslate']['published'])
-            ))
+            res_list.append(_short_info_from_post(val))
     except Exception as e:
         raise ParsingErrorException(f'Error by trying parse page {num_page}({news_on_page} news on page) of tag {news_tag}',
                                     parent=e)
     return res_list
 
 
-def get_one_page_last_link(news_tag: str, num_page: int, news_on_page: int = 15) -> ArticleShortInfo:
+def index_page_links(news_tag: str, num_page: int, news_list: List[ArticleShortInfo], news_on_page: int | None = None) -> None:
+    news_on_page = news_on_page or get_page_length()
+    get_page_index().record(SITE, news_tag, num_page, news_on_page, news_list)
+
+
+def get_one_page_links(news_tag: str, num_page: int, news_on_page: int | None = None,
+                       use_cache: bool = True) -> List[ArticleShortInfo]:
+    news_on_page = news_on_page or get_page_length()
+    try:
+        logger.info(f'Getting news from page {num_page} for tag {news_tag}')
+        page_request = get_one_page_request(news_tag, num_page, news_on_page)
+        logger.info(f'Try to get JSON for tag {news_tag}, page {num_page} ({news_on_page} on page)')
+        json_data = get_json_from_url(page_request.href, data=page_request.body, use_cache=use_cache,
+                                      idempotent=TAG_PAGE_OPERATION.idempotent)
+    except Exception as e:
+        raise ParsingErrorException(f'Error by trying parse page {num_page}({news_on_page} news on page) of tag {news_tag}',
+                                    parent=e)
+    news_list = parse_one_page_links(json_data, news_tag, num_page, news_on_page)
+    index_page_links(news_tag, num_page, news_list, news_on_page)
+    return news_list
+
+
+def parse_one_page_last_link(json_data: dict, news_tag: str, num_page: int, news_on_page: int = 15) -> ArticleShortInfo:
+    try:
+        return _short_info_from_post(json_data['data']['locale']['tag']['posts']['data'][-1])
+    except Exception as e:
+        raise ParsingErrorException(f'Short news parsing error\n'
+                                    f'Page URL:https://www.cointelegraph.com{news_tag}/{num_page}', parent=e)
+
+
+def get_one_page_last_link(news_tag: str, num_page: int, news_on_page: int | None = None) -> ArticleShortInfo:
+    news_on_page = news_on_page or get_page_length()
     try:
         logger.info(f'Getting last news from page {num_page} and tag {news_tag}')
-        json_reqv = {
-            'query': 'query TagPageQuery($short: String, $slug: String!, $order: String, $offset: Int!, $length: Int!) {\n  locale(short: $short) {\n    tag(slug: $slug) {\n      cacheKey\n      id\n      slug\n      avatar\n      createdAt\n      updatedAt\n      redirectRelativeUrl\n      alternates {\n        cacheKey\n        short\n        domain\n        id\n        code\n        __typename\n      }\n      tagTranslates {\n        cacheKey\n        id\n        title\n        metaTitle\n        pageTitle\n        description\n        metaDescription\n        keywords\n        __typename\n      }\n      posts(order: $order, offset: $offset, length: $length) {\n        data {\n          cacheKey\n          id\n          slug\n          views\n          postTranslate {\n            cacheKey\n            id\n            title\n            avatar\n            published\n            publishedHumanFormat\n            leadText\n            author {\n              cacheKey\n              id\n              slug\n              authorTranslates {\n                cacheKey\n                id\n                name\n                __typename\n              }\n              __typename\n            }\n            __typename\n          }\n          category {\n            cacheKey\n            id\n            __typename\n          }\n          author {\n            cacheKey\n            id\n            slug\n            authorTranslates {\n              cacheKey\n              id\n              name\n              __typename\n            }\n            __typename\n          }\n          postBadge {\n            cacheKey\n            id\n            label\n            postBadgeTranslates {\n              cacheKey\n              id\n              title\n              __typename\n            }\n            __typename\n          }\n          showShares\n          showStats\n          __typename\n        }\n        postsCount\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n}',
-            'operationName': 'TagPageQuery',
-            'variables': {
-                'slug': news_tag,
-                'order': 'postPublishedTime',
-                'offset': news_on_page * num_page,
-                'length': news_on_page,
-                'short': 'en',
-                'cacheTimeInMS': 300000,
-            },
-        }
-        json_data = get_json_from_url('https://conpletus.cointelegraph.com/v1/', json=json_reqv)
-        news_obj = json_data['data']['locale']['tag']['posts']['data'][-1]
-        return ArticleShortInfo(
-            news_obj['postBadge']['postBadgeTranslates'][0]['title'],
-            news_obj['postTranslate']['title'],
-            f'https://cointelegraph.com/news/{news_obj["slug"]}',
-            news_obj['postTranslate']['leadText'],
-            str.strip(news_obj['postTranslate']['author']['authorTranslates'][0]['name']),
-            datetime.fromisoformat(news_obj['postTranslate']['published'])
-        )
+        page_request = get_one_page_request(news_tag, num_page, news_on_page)
+        json_data = get_json_from_url(page_request.href, data=page_request.body, use_cache=True,
+                                      idempotent=TAG_PAGE_OPERATION.idempotent)
     except Exception as e:
         raise ParsingErrorException(f'Short news parsing error\n'
                                     f'Page URL:https://www.cointelegraph.com{news_tag}/{num_page}', parent=e)
+    return parse_one_page_last_link(json_data, news_tag, num_page, news_on_page)
 
 
-def get_rss_links(from_dt: datetime = datetime.now(pytz.UTC), to_dt: datetime = None) -> List[ArticleShortInfo]:
+def _rss_datetime(item) -> datetime:
+    # feedparser отдаёт время в UTC, а mktime/fromtimestamp считают его локальным
+    return datetime(*item.published_parsed[:6], tzinfo=pytz.UTC)
+
+
+def parse_rss_links(xml_data: str) -> List[ArticleShortInfo]:
+    """All links of the RSS feed, newest first."""
     try:
-        # TODO почему не радотает rss_parser
-        # rss = Parser.parse(xml_data)
-        logger.info('Get links from RSS')
-        rss = feedparser.parse('https://cointelegraph.com/rss')
+        rss = feedparser.parse(xml_data)
         news_list = []
         for item in rss.entries:
-            tmp_news = ArticleShortInfo(
+            news_list.append(ArticleShortInfo(
                 title=item.title,
-                link=item.link,
-                pub_datetime=datetime.fromtimestamp(mktime(item.published_parsed)),
+                # Без utm-параметров, как ссылки из GraphQL
+                link=urlsplit(item.link)._replace(query='', fragment='').geturl(),
+                pub_datetime=_rss_datetime(item),
                 author=item.author.replace('Cointelegraph By ', ''),
                 category=item.get('tags', [{'term': 'Without category'}])[0]['term'],
                 description=item.summary
-            )
-            if to_dt:
-                if to_dt <= tmp_news.pub_datetime <= from_dt:
-                    news_list.append(tmp_news)
-            else:
-                if tmp_news.pub_datetime <= from_dt:
-                    news_list.append(tmp_news)
+            ))
     except Exception as e:
         raise ParsingErrorException(f'RSS parsing error', parent=e)
-    return news_list
+    return sorted(news_list, key=lambda elem: elem.pub_datetime, reverse=True)
 
 
-def get_news_tags() -> List[str]:
-    html_info = get_html_from_url('https://cointelegraph.com/')
+def get_rss_links(from_dt: datetime = None, to_dt: datetime = None) -> List[ArticleShortInfo]:
+    logger.info('Get links from RSS')
+    if not from_dt:
+        from_dt = datetime.now(pytz.UTC)
+    return [elem for elem in parse_rss_links(get_html_from_url(RSS_URL, use_cache=True))
+            if from_dt >= elem.pub_datetime and (not to_dt or elem.pub_datetime >= to_dt)]
+
+
+def parse_news_tags(html_info: str) -> List[str]:
     try:
         logger.info(f'Searching news tags')
-        soup = BeautifulSoup(html_info, "html.parser")
-        return [el['href'][6:] for el in soup.select('div.header-zone > '
-                'div.header-zone__menu > '
-                'div.menu-desktop__row > '
-                'nav > ul > '
-                'li > div > '
-                'span[data-gtm-locator="menubar_clickon_news"] + div > '
-                'ul > li > a')]
+        soup = parse_html(html_info)
+        return [el['href'][6:] for el in soup.select(SELECTORS['news_tags'])]
     except Exception as e:
         raise ParsingErrorException('Getting news tags error', parent=e)
 
 
+def get_news_tags() -> List[str]:
+    return parse_news_tags(get_html_from_url(NEWS_TAGS_URL, use_cache=True))
+
+
+def get_start_page_search(tag_name: str, from_dt: datetime, news_on_page: int | None = None) -> StartPageSearch:
+    news_on_page = news_on_page or get_page_length()
+    return start_page_search(get_page_index(), SITE, tag_name, news_on_page, from_dt, FIRST_PAGE)
+
+
 def get_start_page(tag_name: str, from_dt: datetime) -> int:
     try:
         logger.info(f'Search start page for tag {tag_name}')
-        page_num = 1
-        left, right = 1, page_num
-        news_page_article = get_one_page_last_link(tag_name, page_num)
-        # Идём вправо пока не перейдём первую (бОльшую) границу
-        while news_page_article.pub_datetime > from_dt:
-            page_num *= 2
-            right = page_num
-            news_page_article = get_one_page_last_link(tag_name, page_num)
-        # Бинарным поиском ищем страницу начала
-        while left < right:
-            page_num = math.ceil((left + right) / 2)
-            news_page_article = get_one_page_last_link(tag_name, page_num)
-            if news_page_article.pub_datetime <= from_dt and right > page_num:
-                right = page_num
-            elif left < page_num:
-                left = page_num
-            else:
-                page_num = right
-                break
+        # Страницы, скачанные при поиске, лежат в HTTP кэше и не качаются повторно
+        page_num = find_start_page(get_start_page_search(tag_name, from_dt), partial(get_one_page_links, tag_name))
     except Exception as e:
         raise ParsingErrorException(f'Error by searching start page for tag "{tag_name}" and date {from_dt}', parent=e)
     logger.info(f'Start page for tag {tag_name} is {page_num}')
     return page_num
 
 
-def get_all_one_tag_links(tag_name: str, from_dt: datetime, to_dt: datetime) -> List[ArticleShortInfo]:
-    articles_list = []
+def get_prefetch_window(tag_name: str, start_page: int, to_dt: datetime) -> Tuple[int, int | None]:
+    """How many pages of a walk from start_page down to to_dt to request at once, and estimated last page."""
+    last_page = get_page_index().guess_last_page(SITE, tag_name, get_page_length(), start_page, to_dt)
+    if last_page is None:
+        return 1, None
+    return min(tag_prefetch_pages, last_page - start_page + 1), last_page
+
+
+def iter_one_tag_links(tag_name: str, from_dt: datetime, to_dt: datetime) -> Iterator[List[ArticleShortInfo]]:
+    """Yields links of the window page by page as soon as every page is fetched.
+
+    Pages up to the end of the walk estimated by the page index are requested in parallel.
+    """
     try:
         logger.info(f'Get news on tag "{tag_name}"')
         page_num = get_start_page(tag_name, from_dt)
-        news_page_articles = get_one_page_links(tag_name, page_num)
-        # Пока не выйдем за границу (меньшую) окна
-        while news_page_articles[0].pub_datetime > to_dt:
-            articles_list.extend(filter(lambda elem: from_dt >= elem.pub_datetime >= to_dt, news_page_articles))
-            page_num += 1
-            news_page_articles = get_one_page_links(tag_name, page_num)
+        window, last_page = get_prefetch_window(tag_name, page_num, to_dt)
+        with closing(prefetch_pages(partial(get_one_page_links, tag_name), page_num, window, last_page)) as pages:
+            for news_page_articles in pages:
+                # Пока не выйдем за границу (меньшую) окна, остальные запросы отменит closing
+                if not news_page_articles or news_page_articles[0].pub_datetime <= to_dt:
+                    break
+                yield [elem for elem in news_page_articles if from_dt >= elem.pub_datetime >= to_dt]
     except Exception as e:
         raise ParsingErrorException(f'Gel all news of one tag by datetime error', parent=e)
-    return articles_list
+
+
+def get_all_one_tag_links(tag_name: str, from_dt: datetime, to_dt: datetime) -> List[ArticleShortInfo]:
+    return list(chain.from_iterable(iter_one_tag_links(tag_name, from_dt, to_dt)))
+
+
+def iter_new_tag_links(tag_name: str, to_dt: datetime | None, marks: CrawlMarks) -> Iterator[List[ArticleShortInfo]]:
+    """Incremental walk: pages from the head of the tag down to CrawlMarks.stop_dt."""
+    try:
+        stop_dt = marks.stop_dt(SITE, tag_name, to_dt)
+        logger.info(f'Get new news on tag "{tag_name}" down to {stop_dt}')
+        page_num = FIRST_PAGE
+        # Голова тега меняется быстрее, чем живёт кэш, берём страницы с сайта
+        news_page_articles = get_one_page_links(tag_name, page_num, use_cache=False)
+        while news_page_articles:
+            marks.observe(SITE, tag_name, news_page_articles)
+            # Статьи с временем метки могли не попасть в прошлый прогон, повторы отсеет БД
+            if new_articles := [elem for elem in news_page_articles if elem.pub_datetime >= stop_dt]:
+                yield new_articles
+            if news_page_articles[-1].pub_datetime < stop_dt:
+                break
+            page_num += 1
+            news_page_articles = get_one_page_links(tag_name, page_num, use_cache=False)
+    except Exception as e:
+        raise ParsingErrorException(f'Get new news of one tag error', parent=e)
 
 
 def threading_get_all_one_tag_links(articles_list: List[ArticleShortInfo], tag_name: str, from_dt: datetime, to_dt: datetime):
@@ -194,6 +362,7 @@ def threading_get_all_one_tag_links(articles_list: List[ArticleShortInfo], tag_n
 def get_all_links(from_dt: datetime, to_dt: datetime) -> List[ArticleShortInfo]:
     start = time.time()
     articles_list = []
+    deduplicator = LinkDeduplicator()
     try:
         logger.info(f'Get all "cointelegraph.com" links from {from_dt} to {to_dt}')
         if not from_dt:
@@ -226,7 +395,7 @@ def get_all_links(from_dt: datetime, to_dt: datetime) -> List[ArticleShortInfo]:
                                        news_tags,
                                        [from_dt]*len(news_tags),
                                        [to_dt]*len(news_tags)):
-                articles_list.extend(result)
+                articles_list.extend(deduplicator.filter(result))
 
         # №4
         # for news_tag in get_news_tags():
@@ -236,30 +405,73 @@ def get_all_links(from_dt: datetime, to_dt: datetime) -> List[ArticleShortInfo]:
     except Exception as e:
         raise ParsingErrorException(f'ERROR in getting all news by datetime', parent=e)
     logger.info(f'Escape from get_all_links. Working time is {time.time()-start}')
-    logger.info(f'Articles list length is {len(articles_list)}')
+    logger.info(f'Articles list length is {len(articles_list)}, duplicates suppressed: {deduplicator.suppressed}')
     return articles_list
 
 
-def get_article_info(href: str) -> ArticleInfo:
-    html_info = get_html_from_url(href)
+def iter_all_links(from_dt: datetime,
+                   to_dt: datetime,
+                   deduplicator: LinkDeduplicator | None = None) -> Iterator[List[ArticleShortInfo]]:
+    """Streaming variant of get_all_links: pages of links of all tags in arrival order.
+
+    Every article is emitted once even if it is listed under several tags, pass own
+    deduplicator to read its suppressed counter after the run.
+    """
+    logger.info(f'Stream all "cointelegraph.com" links from {from_dt} to {to_dt}')
+    news_tags = get_news_tags()
+    pages = merge_streams([partial(iter_one_tag_links, tag, from_dt, to_dt) for tag in news_tags],
+                          max_workers=5, maxsize=stream_queue_size)
+    return (deduplicator or LinkDeduplicator()).filter_pages(pages)
+
+
+def iter_all_new_links(to_dt: datetime | None = None,
+                       deduplicator: LinkDeduplicator | None = None,
+                       marks: CrawlMarks | None = None) -> Iterator[List[ArticleShortInfo]]:
+    """Incremental variant of iter_all_links: only links newer than crawl marks of the tags.
 
+    Tags without a mark are walked back over the initial window, to_dt bounds all tags if given.
+
+    Marks are observed while walking, call marks.commit() after the links are stored.
+    """
+    logger.info(f'Stream new "cointelegraph.com" links')
+    marks = marks or get_crawl_marks()
+    news_tags = get_news_tags()
+    pages = merge_streams([partial(iter_new_tag_links, tag, to_dt, marks) for tag in news_tags],
+                          max_workers=5, maxsize=stream_queue_size)
+    return (deduplicator or LinkDeduplicator()).filter_pages(pages)
+
+
+def iter_rss_first_links(from_dt: datetime,
+                         to_dt: datetime,
+                         deduplicator: LinkDeduplicator | None = None) -> Iterator[List[ArticleShortInfo]]:
+    """Variant of iter_all_links which serves the recent part of the window from one RSS request.
+
+    Tags are paginated only for the part of the window older than the oldest feed item.
+    """
+    deduplicator = deduplicator or LinkDeduplicator()
+    logger.info(f'Get RSS links of "cointelegraph.com" from {from_dt} to {to_dt}')
+    rss_links = parse_rss_links(get_html_from_url(RSS_URL, use_cache=True))
+    if page := deduplicator.filter([elem for elem in rss_links if from_dt >= elem.pub_datetime >= to_dt]):
+        yield page
+    if rss_links and rss_links[-1].pub_datetime <= to_dt:
+        logger.info(f'Window is covered by RSS, {len(page)} links')
+        return
+    if rss_links:
+        from_dt = min(from_dt, rss_links[-1].pub_datetime)
+    yield from iter_all_links(from_dt, to_dt, deduplicator)
+
+
+def parse_article_info(href: str, html_info: str) -> ArticleInfo:
     try:
         logger.info(f'Get article info from {href}')
-        soup = BeautifulSoup(html_info, "html.parser")
-
-        header = soup.select('h1.post__title')[0].text
-        content = soup.select('p.post__lead')[0].text
-        # TODO брать только бездетных
-        content += '\n'.join(i.text for i in soup.select(':is(div.post-content > p, div.post-content > h2)'))
-        publication_dt = datetime.fromisoformat(
-            soup.select_one('div.post-meta > div.post-meta__publish-date > time')['datetime'])
+        soup = parse_html(html_info)
+
+        header = soup.select(SELECTORS['article_header'])[0].text
+        content = soup.select(SELECTORS['article_lead'])[0].text
+        content += '\n'.join(i.text for i in soup.select(SELECTORS['article_content']))
+        publication_dt = datetime.fromisoformat(soup.select_one(SELECTORS['article_pub_date'])['datetime'])
         parsing_dt = datetime.now(pytz.UTC)
-        language = soup.select_one('header.header-desktop > '
-                               'div.header-desktop__row > '
-                               'div.header-side-links > '
-                               'ul > '
-                               'li:first-child > '
-                               'div.header-side-links__select').text
+        language = soup.select_one(SELECTORS['article_language']).text
         ainfo = ArticleInfo(header=header,
                             content=content,
                             publication_dt=publication_dt,
@@ -271,3 +483,7 @@ def get_article_info(href: str) -> ArticleInfo:
         raise ParsingErrorException(f'cointelegraph.com article parsing error.\nURL: {href}', parent=e)
 
     return ainfo
+
+
+def get_article_info(href: str) -> ArticleInfo:
+    return parse_article_info(href, get_html_from_url(href))
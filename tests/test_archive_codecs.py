@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src.core import archive_codecs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAYLOAD = b'<html>' + b'bitcoin ' * 1000 + b'</html>'
+
+
+def test_headerless_lzma_round_trip():
+    data = archive_codecs.CODECS_BY_NAME['lzma'].compress(PAYLOAD)
+    assert archive_codecs.codec_name(data) == 'lzma'
+    assert archive_codecs.decompress(data) == PAYLOAD
+    with archive_codecs.open_stream(data) as stream:
+        assert stream.read(6) == b'<html>'
+
+
+def test_zstd_round_trip():
+    pytest.importorskip('zstandard')
+    data = archive_codecs.compress(PAYLOAD, 'zstd')
+    assert data.startswith(archive_codecs.ARCHIVE_MAGIC)
+    assert archive_codecs.codec_name(data) == 'zstd'
+    assert archive_codecs.decompress(data) == PAYLOAD
+    with archive_codecs.open_stream(data) as stream:
+        assert stream.read(6) == b'<html>'
+
+
+def test_lzma_archives_work_without_zstandard():
+    # Отдельный интерпретатор: zstandard помечен как отсутствующий до импорта модулей
+    code = ('import sys; sys.modules["zstandard"] = None\n'
+            'from src.core import archive_codecs\n'
+            'data = archive_codecs.CODECS_BY_NAME["lzma"].compress(b"payload")\n'
+            'assert archive_codecs.decompress(data) == b"payload"\n'
+            'try:\n'
+            '    archive_codecs.compress(b"payload", "zstd")\n'
+            'except ImportError:\n'
+            '    pass\n'
+            'else:\n'
+            '    raise AssertionError("zstd must need zstandard")\n')
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True)
+
+
+def test_codec_requires_all_methods():
+    class CompressOnly(archive_codecs.Codec):
+        name = 'compress-only'
+        codec_id = 255
+
+        def compress(self, data, dictionary=None):
+            return data
+
+    with pytest.raises(TypeError):
+        CompressOnly()
@@ -0,0 +1,94 @@
+import io
+import json
+import lzma
+import os
+import zipfile
+from datetime import datetime, timezone
+
+import pytest
+
+import src.core.local_storage as local_storage
+from src.core.structures import ArticleInfo
+
+
+def _article(html=None):
+    dt = datetime(2023, 6, 6, 23, 59, tzinfo=timezone.utc)
+    # Несжимаемый html: article.json первого слоя должен читаться из начала потока
+    html = html if html is not None else '<html>' + os.urandom(64 * 1024).hex() + '</html>'
+    return ArticleInfo('Bitcoin rallies', 'BTC rose 3%.', dt, dt, html,
+                       'https://www.coindesk.com/markets/2023/06/06/bitcoin-rallies/', 'English')
+
+
+def _legacy_archive(article):
+    # Раскладка 1: article.html первым, html ещё раз внутри article.json
+    json_obj = article._asdict()
+    json_obj['publication_dt'] = json_obj['publication_dt'].isoformat()
+    json_obj['parsing_dt'] = json_obj['parsing_dt'].isoformat()
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as zpf:
+        zpf.writestr('article.html', article.html.encode('utf-8'))
+        zpf.writestr('article.json', json.dumps(json_obj, indent=4).encode('utf-8'))
+    return lzma.compress(buf.getvalue())
+
+
+def test_layout_2_round_trip():
+    article = _article()
+    data = local_storage.pack_archive(article)
+    assert local_storage.read_from_bytes(data) == article
+    jsn = local_storage._read_leading_json(data)
+    assert jsn['layout'] == local_storage.ARCHIVE_LAYOUT and 'html' not in jsn
+
+
+def test_metadata_is_read_from_the_head_of_the_stream():
+    article = _article()
+    data = local_storage.pack_archive(article)
+    # Хвоста с html нет, а метаданные читаются
+    assert local_storage.read_metadata_from_bytes(data[:len(data) // 4]) == article._replace(html='')
+
+
+def test_legacy_layout_falls_back_to_zip():
+    article = _article()
+    data = _legacy_archive(article)
+    assert local_storage._read_leading_json(data) is None
+    assert local_storage.read_metadata_from_bytes(data) == article._replace(html='')
+    assert local_storage.read_from_bytes(data) == article
+    assert local_storage.read_html_from_bytes(data) == article.html
+
+
+def test_zstd_layout_2_metadata():
+    pytest.importorskip('zstandard')
+    article = _article()
+    buf = io.BytesIO()
+    local_storage._write_archive(buf, article, 'zstd')
+    data = buf.getvalue()
+    assert local_storage._read_leading_json(data) is not None
+    assert local_storage.read_metadata_from_bytes(data) == article._replace(html='')
+    assert local_storage.read_from_bytes(data) == article
+
+
+def test_convert_archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_storage, 'ROOT_DIR', '')
+    monkeypatch.setattr(local_storage, 'dir_name_archives', str(tmp_path))
+    monkeypatch.setattr(local_storage, 'archive_store', 'files')
+    article = _article(html='<html>' + 'coin ' * 5000 + '</html>')
+    legacy = _legacy_archive(article)
+    (tmp_path / 'legacy.xz').write_bytes(legacy)
+    assert local_storage.convert_archive('legacy.xz')
+    assert not local_storage.convert_archive('legacy.xz')
+    assert local_storage.read_from_disk('legacy.xz') == article
+    assert local_storage.read_metadata('legacy.xz') == article._replace(html='')
+    # html больше не лежит дважды
+    assert (tmp_path / 'legacy.xz').stat().st_size < len(legacy)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_lazy_article_info_reads_only_what_is_missing():
+    article = _article()
+    lazy = local_storage.LazyArticleInfo(local_storage.pack_archive(article), href=article.href, header='journal')
+    assert lazy.loaded() == ('header', 'href')
+    assert lazy.header == 'journal'
+    assert lazy.content == article.content
+    assert 'html' not in lazy.loaded()
+    assert lazy.html == article.html
+    with pytest.raises(AttributeError):
+        lazy.unknown
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from sqlalchemy import create_engine, insert
+
+from src.core.database.article_query import ArticleQuery
+from src.core.database.sqlite import ArticleLink, href_hash, metadata
+
+
+def _query(tmp_path, published):
+    engine = create_engine(f'sqlite:///{tmp_path}/journal.sqlite')
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(ArticleLink), [{'href': href, 'slug': href_hash(href), 'published_dt': dt,
+                                            'parsed_dt': dt, 'article_archive_file_path': f'/archives/{i}.xz'}
+                                           for i, (href, dt) in enumerate(published.items())])
+    return ArticleQuery(engine)
+
+
+def test_find_includes_both_window_bounds(tmp_path):
+    to_dt, from_dt = datetime(2023, 6, 6, 0, 0), datetime(2023, 6, 6, 23, 59)
+    query = _query(tmp_path, {'https://coindesk.com/older': datetime(2023, 6, 5, 23, 59),
+                              'https://coindesk.com/to': to_dt,
+                              'https://coindesk.com/from': from_dt,
+                              'https://coindesk.com/newer': datetime(2023, 6, 7, 0, 0)})
+    # Окно краулера from_dt >= pub_datetime >= to_dt
+    assert [article.href for article in query.find(from_dt, to_dt)] == ['https://coindesk.com/from',
+                                                                        'https://coindesk.com/to']
+    assert query.count(from_dt, to_dt) == 2
@@ -0,0 +1,136 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+import pytz
+from sqlalchemy import create_engine, text
+
+import src.async_engine as async_engine
+import src.core.database.crawl_marks as crawl_marks
+import src.core.database.page_index as page_index
+import src.core.database.sqlite as sqlite
+import src.core.local_storage as local_storage
+from src.core.database.migrations import migrate
+from src.resources import coindesk_parser
+
+FIXTURES = __file__.rsplit('/', 1)[0] + '/fixtures/'
+
+NEWS_TAGS_HTML = ('<header class="sticky-header"><div><div data-module-name="main-navigation">'
+                  '<div data-submodule-name="subrow"><nav><ul><li><a href="/web3/">Web3</a>'
+                  '<div><div><div><div><div><ul><li><a href="/markets/">Markets</a></li></ul>'
+                  '</div></div></div></div></div></li></ul></nav></div></div></div></header>')
+
+
+def _utc(day, hour):
+    return datetime(2023, 6, day, hour, tzinfo=pytz.UTC)
+
+
+# Лента тега /markets/ по две статьи на странице, новые первыми
+TAG_PAGES = {1: [('c', _utc(6, 18)), ('d', _utc(6, 6))],
+             2: [('e', _utc(5, 18)), ('f', _utc(5, 6))],
+             3: [('g', _utc(4, 18)), ('h', _utc(4, 6))]}
+RSS_ITEMS = [('a', _utc(6, 20)), ('c', _utc(6, 18))]
+
+
+def _href(name):
+    return f'https://coindesk.com/markets/2023/06/{name}/'
+
+
+def _card(name, dt):
+    date = dt.strftime('%b %d, %Y at %I:%M %p UTC').replace('AM', 'a.m.').replace('PM', 'p.m.')
+    return (f'<div class="articleTextSection"><a class="category">Markets</a>'
+            f'<a class="card-title" href="/markets/2023/06/{name}/">{name}</a>'
+            f'<span class="content-text">about {name}</span><a class="ac-author">Author</a>'
+            f'<div class="timing-data"><div class="ac-publishing-date"><div><span>{date}</span></div></div></div></div>')
+
+
+def _rss():
+    items = ''.join(f'<item><title>{name}</title><link>https://www.coindesk.com/markets/2023/06/{name}/?utm=rss</link>'
+                    f'<description>about {name}</description><category>Markets</category>'
+                    f'<dc:creator>Author</dc:creator><pubDate>{dt.strftime("%a, %d %b %Y %H:%M:%S +0000")}</pubDate></item>'
+                    for name, dt in RSS_ITEMS)
+    return ('<?xml version="1.0"?><rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            f'<channel><title>CoinDesk</title>{items}</channel></rss>')
+
+
+class FakeClient:
+    """Site coindesk.com for AsyncHTTPClient: tags, RSS, listing pages of /markets/ and articles."""
+
+    def __init__(self):
+        with open(FIXTURES + 'coindesk_article.html', 'r', encoding='utf-8') as f:
+            self.article_html = f.read()
+        self.articles = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def get_html(self, href, headers=None, cookies=None):
+        if href == coindesk_parser.NEWS_TAGS_URL:
+            return NEWS_TAGS_HTML
+        if href == coindesk_parser.RSS_URL:
+            return _rss()
+        if href.startswith('https://www.coindesk.com/markets/') and href[33:].isdigit():
+            return '<html><body>' + ''.join(_card(*item) for item in TAG_PAGES.get(int(href[33:]), [])) + '</body></html>'
+        self.articles.append(href)
+        return self.article_html
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    engine = create_engine(f'sqlite:///{tmp_path}/news_journal.sqlite', connect_args={'check_same_thread': False})
+    sqlite.metadata.create_all(engine)
+    migrate(engine)
+    monkeypatch.setitem(sqlite._engines, 'news_journal.sqlite', engine)
+    monkeypatch.setattr(page_index, '_page_index', None)
+    monkeypatch.setattr(crawl_marks, '_crawl_marks', None)
+    (tmp_path / 'archives').mkdir()
+    monkeypatch.setattr(local_storage, 'ROOT_DIR', '')
+    monkeypatch.setattr(local_storage, 'dir_name_archives', str(tmp_path / 'archives'))
+    monkeypatch.setattr(local_storage, 'archive_store', 'files')
+    client = FakeClient()
+    monkeypatch.setattr(async_engine, 'AsyncHTTPClient', lambda: client)
+    return engine, client
+
+
+def _stored(engine):
+    with engine.connect() as conn:
+        return {href for href, in conn.execute(text('SELECT href FROM article_links '
+                                                    "WHERE article_archive_file_path != ''"))}
+
+
+def test_rss_first_crawl_with_package_module(site):
+    engine, client = site
+    # Пакет src.resources.coindesk_parser, как его передаёт __main__: всё нужное адаптеру должно быть в __all__
+    asyncio.run(async_engine.crawl(coindesk_parser, _utc(7, 0), _utc(5, 0), max_in_flight=2, rss_first=True))
+    expected = {_href(name) for name in 'acdef'}
+    assert _stored(engine) == expected
+    assert sorted(client.articles) == sorted(expected)
+
+
+def _set_mark(dt):
+    marks = crawl_marks.get_crawl_marks()
+    marks.observe('coindesk.com', '/markets/', [coindesk_parser.parse_rss_links(_rss())[0]._replace(pub_datetime=dt)])
+    marks.commit()
+    return marks
+
+
+def test_incremental_crawl_walks_down_to_stale_mark(site):
+    engine, client = site
+    # Метка старше окна incremental_initial_window_hours: идём до неё, а не до начала окна
+    marks = _set_mark(_utc(5, 0))
+    asyncio.run(async_engine.crawl(coindesk_parser, _utc(7, 0), None, max_in_flight=2, incremental=True))
+    assert _stored(engine) == {_href(name) for name in 'cdef'}
+    assert marks.get('coindesk.com', '/markets/') == _utc(6, 18)
+
+
+def test_sync_incremental_walk_stops_at_stale_mark(site, monkeypatch):
+    from src.resources.coindesk_parser import coindesk_parser as coindesk_module
+    _, client = site
+    monkeypatch.setattr(coindesk_module, 'get_html_from_url',
+                        lambda href, use_cache=False: asyncio.run(client.get_html(href)))
+    marks = _set_mark(_utc(5, 0))
+    pages = list(coindesk_parser.iter_new_tag_links('/markets/', None, marks))
+    assert [elem.link for page in pages for elem in page] == [_href(name) for name in 'cdef']
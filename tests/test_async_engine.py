@@ -0,0 +1,51 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+import src.async_engine as async_engine
+from src.core.structures import ArticleInfo, ArticleShortInfo, ParsingErrorException, SavingErrorException
+
+
+class FakeAdapter:
+    def __init__(self, executor):
+        self.parse_executor = executor
+
+    async def get_article_info(self, href):
+        if href.endswith('broken'):
+            raise ParsingErrorException('no header')
+        now = datetime(2024, 1, 1)
+        return ArticleInfo('header', 'content', now, now, '<html></html>', href, 'English')
+
+
+class FakeWriter:
+    def __init__(self):
+        self.saved = []
+
+    def submit(self, article, file_full_name):
+        self.saved.append(article.href)
+        future = Future()
+        future.set_result(file_full_name)
+        return future
+
+
+def _save(article):
+    if article.href.endswith('unsaved'):
+        raise SavingErrorException('disk full')
+    return '/archives/' + article.href
+
+
+def test_article_worker_survives_parsing_and_saving_errors(monkeypatch):
+    monkeypatch.setattr(async_engine, 'save_to_disk', _save)
+    writer = FakeWriter()
+
+    async def run():
+        queue = asyncio.Queue()
+        now = datetime(2024, 1, 1)
+        for href in ('https://coindesk.com/broken', 'https://coindesk.com/unsaved', 'https://coindesk.com/ok'):
+            queue.put_nowait(ArticleShortInfo('markets', 'title', href, '', 'author', now))
+        queue.put_nowait(None)
+        with ThreadPoolExecutor(1) as executor:
+            return await async_engine._article_worker(FakeAdapter(executor), queue, writer)
+
+    assert asyncio.run(run()) == 2
+    assert writer.saved == ['https://coindesk.com/ok']
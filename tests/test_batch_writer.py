@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from src.core.database.batch_writer import ArticleLinkWriter
+from src.core.database.sqlite import metadata
+from src.core.structures import ArticleInfo, DataBaseErrorException
+
+
+def _article(name, header='header'):
+    dt = datetime(2024, 1, 1)
+    return ArticleInfo(header, 'content', dt, dt, '', f'https://coindesk.com/{name}', 'English')
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/journal.sqlite')
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        # Отказ БД на одной записи пачки
+        conn.execute(text("CREATE TRIGGER reject_bad BEFORE INSERT ON article_links "
+                          "WHEN NEW.href LIKE '%bad%' BEGIN SELECT RAISE(ABORT, 'bad row'); END"))
+    return engine
+
+
+def _rows(engine):
+    with engine.connect() as conn:
+        return dict(conn.execute(text('SELECT href, article_archive_file_path FROM article_links')).all())
+
+
+def test_failed_batch_is_retried_row_by_row(engine):
+    with ArticleLinkWriter(engine, batch_size=10, flush_interval=60) as writer:
+        futures = {name: writer.submit(_article(name), f'/archives/{name}.xz') for name in ('a', 'bad', 'c')}
+    assert futures['a'].result() == '/archives/a.xz'
+    assert futures['c'].result() == '/archives/c.xz'
+    assert isinstance(futures['bad'].exception(), DataBaseErrorException)
+    assert _rows(engine) == {'https://coindesk.com/a': '/archives/a.xz', 'https://coindesk.com/c': '/archives/c.xz'}
+    assert (writer.written, writer.failed) == (2, 1)
+
+
+def test_upsert_updates_existing_row(engine):
+    with ArticleLinkWriter(engine, batch_size=1) as writer:
+        writer.submit(_article('a', header='old'), '').result()
+        writer.submit(_article('a', header='new'), '/archives/a.xz').result()
+    with engine.connect() as conn:
+        assert conn.execute(text('SELECT header, article_archive_file_path FROM article_links')).all() == \
+            [('new', '/archives/a.xz')]
+
+
+def test_close_waits_for_submitted_rows(engine):
+    with ArticleLinkWriter(engine, batch_size=1000, flush_interval=60) as writer:
+        futures = [writer.submit(_article(str(i)), f'/archives/{i}.xz') for i in range(250)]
+    assert all(future.done() and future.exception() is None for future in futures)
+    assert len(_rows(engine)) == 250
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+
+from src.core.database.crawl_marks import CrawlMarks
+from src.core.database.sqlite import metadata
+from src.core.structures import ArticleShortInfo
+
+
+@pytest.fixture
+def marks(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/journal.sqlite')
+    metadata.create_all(engine)
+    return CrawlMarks(engine, initial_window_hours=24)
+
+
+def _observe(marks, tag, dt):
+    marks.observe('coindesk.com', tag, [ArticleShortInfo('markets', 'title', 'https://coindesk.com/a', '', 'author', dt)])
+
+
+def test_tag_without_mark_uses_initial_window(marks):
+    stop_dt = marks.stop_dt('coindesk.com', '/markets/')
+    assert abs(stop_dt - (datetime.now(timezone.utc) - timedelta(hours=24))) < timedelta(minutes=1)
+    to_dt = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert marks.stop_dt('coindesk.com', '/markets/', to_dt) == to_dt
+
+
+def test_stale_mark_is_not_cut_by_initial_window(marks):
+    stale = (datetime.now(timezone.utc) - timedelta(days=3)).replace(microsecond=0)
+    _observe(marks, '/markets/', stale)
+    marks.commit()
+    assert marks.stop_dt('coindesk.com', '/markets/') == stale
+    # Явный to_dt ограничивает и размеченные теги
+    assert marks.stop_dt('coindesk.com', '/markets/', stale - timedelta(days=1)) == stale
+    assert marks.stop_dt('coindesk.com', '/markets/', stale + timedelta(days=1)) == stale + timedelta(days=1)
+
+
+def test_mark_never_moves_back_and_discard_drops_pending(marks):
+    newest = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    _observe(marks, '/markets/', newest)
+    marks.commit()
+    _observe(marks, '/markets/', newest - timedelta(days=1))
+    marks.commit()
+    assert marks.get('coindesk.com', '/markets/') == newest
+    _observe(marks, '/markets/', newest + timedelta(days=1))
+    assert marks.discard() == 1
+    assert marks.commit() == 0
+    assert marks.get('coindesk.com', '/markets/') == newest
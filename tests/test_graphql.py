@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from src.core.networking.graphql import GraphQLOperation
+from src.resources.cointelegraph_parser.cointelegraph_parser import TAG_PAGE_OPERATION
+
+QUERY = 'query TagPageQuery($slug: String!, $offset: Int!) { tag(slug: $slug) { posts(offset: $offset) { id } } }'
+
+
+def _expected(operation, variables):
+    return json.dumps({'operationName': operation.operation_name,
+                       'query': operation.query,
+                       'variables': {**operation.variables, **variables}},
+                      separators=(',', ':')).encode()
+
+
+@pytest.mark.parametrize('variables', [
+    {'slug': 'bitcoin', 'offset': 0},
+    {'slug': 'quote " and \\ backslash', 'offset': 150},
+    {'slug': 'биткоин  ', 'offset': -1},
+    {'slug': None, 'offset': 1.5},
+    {'slug': ['a', 'b'], 'offset': {'from': 1, 'to': 2}},
+])
+def test_body_equals_full_serialization(variables):
+    operation = GraphQLOperation('https://example.com/graphql', 'TagPageQuery', QUERY, {'short': 'en'},
+                                 ('slug', 'offset'))
+    assert operation.body(**variables) == _expected(operation, variables)
+    assert json.loads(operation.body(**variables))['variables'] == {'short': 'en', **variables}
+
+
+def test_variable_order_in_call_does_not_matter():
+    operation = GraphQLOperation('https://example.com/graphql', 'TagPageQuery', QUERY, {}, ('slug', 'offset'))
+    assert operation.body(slug='eth', offset=15) == operation.body(offset=15, slug='eth')
+
+
+def test_missing_variable_is_an_error():
+    operation = GraphQLOperation('https://example.com/graphql', 'TagPageQuery', QUERY, {}, ('slug', 'offset'))
+    with pytest.raises(KeyError):
+        operation.body(slug='eth')
+
+
+def test_idempotent_only_for_queries():
+    assert GraphQLOperation('https://example.com/graphql', 'Q', QUERY).idempotent
+    assert not GraphQLOperation('https://example.com/graphql', 'M', '  mutation M { like(id: 1) }').idempotent
+
+
+def test_tag_page_operation():
+    variables = {'slug': 'bitcoin', 'offset': 30, 'length': 15}
+    assert TAG_PAGE_OPERATION.body(**variables) == _expected(TAG_PAGE_OPERATION, variables)
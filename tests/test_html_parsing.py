@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from src.core import html_parsing
+from src.resources import coindesk_parser, cointelegraph_parser
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+ARTICLES = [
+    (coindesk_parser, 'https://www.coindesk.com/markets/2023/06/06/bitcoin-ether-rally/', 'coindesk_article.html'),
+    (cointelegraph_parser, 'https://cointelegraph.com/news/sec-delays-ether-etf', 'cointelegraph_article.html'),
+]
+
+
+def _extract(backend, parser, href, html):
+    previous = html_parsing.get_backend()
+    html_parsing.set_backend(backend)
+    try:
+        article = parser.parse_article_info(href, html)
+    finally:
+        html_parsing.set_backend(previous)
+    return article.header, article.content, article.publication_dt, article.language
+
+
+@pytest.mark.parametrize('backend', html_parsing.available_backends())
+@pytest.mark.parametrize('parser, href, fixture', ARTICLES)
+def test_backend_matches_html_parser(backend, parser, href, fixture):
+    """Existing archives were extracted with html.parser, other backends must give the same fields."""
+    with open(os.path.join(FIXTURES, fixture), 'r', encoding='utf-8') as f:
+        html = f.read()
+    assert _extract(backend, parser, href, html) == _extract('html.parser', parser, href, html)
+
+
+@pytest.mark.parametrize('backend', html_parsing.available_backends())
+def test_backend_text_follows_html_parser_rules(backend):
+    """Comments, script/style/template are dropped, whitespace-only strings collapse outside pre."""
+    html = ('<div>a <!-- c --> <script>x</script><style>s{}</style><template>t</template>'
+            '<noscript>n</noscript><pre>  \n  </pre><textarea> \n </textarea><b>b</b>&lt; <?pi x?>\n\t'
+            '<i>  </i>x&nbsp; y</div>')
+    previous = html_parsing.get_backend()
+    html_parsing.set_backend(backend)
+    try:
+        doc = html_parsing.parse_html(html)
+        texts = doc.select_one('div').text, doc.select_one('pre').text, doc.select_one('i').text
+    finally:
+        html_parsing.set_backend(previous)
+    assert texts == ('a  n  \n   \n b< \n x\xa0 y', '  \n  ', ' ')
+
+
+def test_node_requires_backend_methods():
+    class Partial(html_parsing.Node):
+        def select(self, css):
+            return []
+
+    with pytest.raises(TypeError):
+        Partial(None)
+
+
+def test_default_backend_is_html_parser():
+    assert html_parsing.get_backend() == 'html.parser'
@@ -0,0 +1,58 @@
+from sqlalchemy import create_engine, inspect, text
+
+from src.core.database.migrations import MIGRATIONS, get_schema_version, migrate
+from src.core.database.sqlite import metadata
+
+
+# article_links как в исходной схеме, до миграций
+BASELINE_SCHEMA = ('CREATE TABLE article_links ('
+                   'id INTEGER NOT NULL PRIMARY KEY, created_at DATETIME, updated_at DATETIME, '
+                   'href VARCHAR(3000) NOT NULL, slug VARCHAR(255) NOT NULL, published_dt DATETIME, '
+                   'parsed_dt DATETIME, article_parser_version INTEGER, article_archive_file_path VARCHAR(1000))')
+
+
+def _baseline_engine(tmp_path, rows):
+    engine = create_engine(f'sqlite:///{tmp_path}/journal.sqlite')
+    with engine.begin() as conn:
+        conn.execute(text(BASELINE_SCHEMA))
+        for row_id, slug, path in rows:
+            conn.execute(text('INSERT INTO article_links (id, href, slug, article_archive_file_path) '
+                              'VALUES (:id, :href, :slug, :path)'),
+                         {'id': row_id, 'href': f'https://coindesk.com/{slug}', 'slug': slug, 'path': path})
+    return engine
+
+
+def _survivors(engine):
+    with engine.connect() as conn:
+        return dict(conn.execute(text('SELECT slug, article_archive_file_path FROM article_links')).all())
+
+
+def test_dedup_keeps_archived_row(tmp_path):
+    engine = _baseline_engine(tmp_path, [
+        (1, 'a', '/p1'), (2, 'a', None),
+        (3, 'b', '/p2'), (4, 'b', ''), (5, 'b', '/p3'),
+        (6, 'c', None), (7, 'c', None),
+    ])
+    assert migrate(engine) == MIGRATIONS[-1].version
+    assert _survivors(engine) == {'a': '/p1', 'b': '/p3', 'c': None}
+    with engine.connect() as conn:
+        assert conn.execute(text('SELECT id FROM article_links WHERE slug = :slug'), {'slug': 'c'}).scalar() == 7
+
+
+def test_upgrade_adds_metadata_columns_and_is_idempotent(tmp_path):
+    engine = _baseline_engine(tmp_path, [(1, 'a', '/p1')])
+    migrate(engine)
+    assert migrate(engine) == MIGRATIONS[-1].version
+    columns = {column['name'] for column in inspect(engine).get_columns('article_links')}
+    assert {'header', 'language'} <= columns
+    indexes = {index['name'] for index in inspect(engine).get_indexes('article_links')}
+    assert {'ix_article_links_slug', 'ix_article_links_published_dt'} <= indexes
+    assert {'page_index', 'crawl_marks'} <= set(inspect(engine).get_table_names())
+
+
+def test_fresh_database_migrates(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/fresh.sqlite')
+    metadata.create_all(bind=engine)
+    migrate(engine)
+    with engine.connect() as conn:
+        assert get_schema_version(conn) == MIGRATIONS[-1].version
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+
+from src.core.database.page_index import PageIndex, find_start_page, start_page_search
+from src.core.database.sqlite import metadata
+from src.core.structures import ArticleShortInfo
+
+PAGE_SIZE = 10
+NEWEST = datetime(2024, 1, 10)
+
+
+def _listing(pages):
+    # Лента тега: статья в час, новые первыми, страницы с 1
+    articles = [ArticleShortInfo('markets', f'title {i}', f'https://coindesk.com/{i}', '', 'author',
+                                 NEWEST - timedelta(hours=i)) for i in range(pages * PAGE_SIZE)]
+
+    def fetch_page(page_num):
+        fetched.append(page_num)
+        return articles[(page_num - 1) * PAGE_SIZE:page_num * PAGE_SIZE]
+
+    fetched = []
+    return articles, fetch_page, fetched
+
+
+def _expected(articles, from_dt):
+    # Перебором: первая страница, где самая старая статья не новее from_dt
+    for page_num in range(1, len(articles) // PAGE_SIZE + 1):
+        if articles[page_num * PAGE_SIZE - 1].pub_datetime <= from_dt:
+            return page_num
+    return len(articles) // PAGE_SIZE + 1
+
+
+class FakeIndex:
+    def __init__(self, guess):
+        self.guess = guess
+
+    def guess_start_page(self, site, tag, page_size, from_dt):
+        return self.guess
+
+
+@pytest.mark.parametrize('guess', [None, 1, 3, 7, 20, 40])
+@pytest.mark.parametrize('hours', [0, 5, 9, 10, 55, 199, 250])
+def test_search_finds_first_page_not_newer_than_from_dt(guess, hours):
+    articles, fetch_page, fetched = _listing(20)
+    from_dt = NEWEST - timedelta(hours=hours)
+    search = start_page_search(FakeIndex(guess), 'coindesk.com', 'markets', PAGE_SIZE, from_dt)
+    assert find_start_page(search, fetch_page) == _expected(articles, from_dt)
+    # Галоп и бисекция: логарифм от расстояния до догадки, а не обход подряд
+    assert len(fetched) <= 12
+
+
+def test_exact_guess_takes_one_request():
+    articles, fetch_page, fetched = _listing(20)
+    from_dt = NEWEST - timedelta(hours=55, minutes=30)
+    search = start_page_search(FakeIndex(6), 'coindesk.com', 'markets', PAGE_SIZE, from_dt)
+    assert find_start_page(search, fetch_page) == 6
+    assert fetched == [6]
+
+
+def test_recorded_index_guesses_the_page(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/journal.sqlite')
+    metadata.create_all(engine)
+    index = PageIndex(engine)
+    articles, fetch_page, fetched = _listing(20)
+    for page_num in (1, 5, 10, 20):
+        index.record('coindesk.com', 'markets', page_num, PAGE_SIZE, fetch_page(page_num))
+    fetched.clear()
+    from_dt = NEWEST - timedelta(hours=123, minutes=30)
+    search = start_page_search(index, 'coindesk.com', 'markets', PAGE_SIZE, from_dt)
+    assert find_start_page(search, fetch_page) == _expected(articles, from_dt)
+    assert len(fetched) <= 2
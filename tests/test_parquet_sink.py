@@ -0,0 +1,68 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+pyarrow = pytest.importorskip('pyarrow')
+import pyarrow.dataset
+
+from src.core.parquet_sink import ParquetSink
+from src.core.structures import ArticleInfo
+
+
+def _article(i, day=6):
+    dt = datetime(2023, 6, day, 12, 0)
+    return ArticleInfo(f'header {i}', f'content {i}', dt, dt, '<html></html>',
+                       f'https://www.coindesk.com/markets/{i}/', 'English')
+
+
+def _files(root):
+    return sorted(os.path.relpath(os.path.join(dir_name, name), root)
+                  for dir_name, _, names in os.walk(root) for name in names)
+
+
+def _hrefs(root):
+    table = pyarrow.dataset.dataset(root, format='parquet', partitioning='hive').to_table(columns=['href'])
+    return sorted(table.column('href').to_pylist())
+
+
+def test_file_rolls_over_by_rows(tmp_path):
+    sink = ParquetSink(str(tmp_path), row_group_bytes=1, file_max_rows=3, file_max_seconds=3600)
+    for i in range(7):
+        sink.append(_article(i))
+    # Два полных файла уже видны читателям, седьмая строка - в открытом .tmp
+    assert len([name for name in _files(tmp_path) if name.endswith('.parquet')]) == 2
+    assert len([name for name in _files(tmp_path) if name.endswith('.tmp')]) == 1
+    sink.close()
+    assert not [name for name in _files(tmp_path) if name.endswith('.tmp')]
+    assert _hrefs(tmp_path) == sorted(_article(i).href for i in range(7))
+
+
+def test_file_rolls_over_by_time(tmp_path):
+    sink = ParquetSink(str(tmp_path), row_group_bytes=1, file_max_seconds=0)
+    sink.append(_article(0))
+    sink.append(_article(1))
+    assert not [name for name in _files(tmp_path) if name.endswith('.tmp')]
+    sink.close()
+    assert _hrefs(tmp_path) == sorted(_article(i).href for i in range(2))
+
+
+def test_least_recent_partition_is_closed(tmp_path):
+    with ParquetSink(str(tmp_path), row_group_bytes=1, max_open_files=1, file_max_seconds=3600) as sink:
+        sink.append(_article(0, day=5))
+        sink.append(_article(1, day=6))
+        assert [name for name in _files(tmp_path) if name.endswith('.parquet')][0].startswith(
+            os.path.join('site=coindesk.com', 'date=2023-06-05'))
+    assert sink.stats()['files'] == 2
+
+
+def test_concurrent_appends(tmp_path):
+    sink = ParquetSink(str(tmp_path), row_group_bytes=200, buffer_bytes=1000, max_open_files=2,
+                       file_max_rows=50, file_max_seconds=3600)
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda i: sink.append(_article(i, day=1 + i % 5)), range(500)))
+    sink.close()
+    assert sink.stats()['rows'] == 500
+    assert not [name for name in _files(tmp_path) if name.endswith('.tmp')]
+    assert _hrefs(tmp_path) == sorted(_article(i).href for i in range(500))
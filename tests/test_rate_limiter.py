@@ -0,0 +1,37 @@
+import time
+
+from src.core.networking.rate_limiter import HostLimiter
+
+
+def _send_burst(limiter, count):
+    for _ in range(count):
+        limiter.acquire()
+
+
+def test_burst_of_throttled_responses_cuts_once():
+    limiter = HostLimiter(rps=20, burst=20, concurrency=16, max_concurrency=32)
+    _send_burst(limiter, 16)
+    time.sleep(0.05)
+    for _ in range(16):
+        limiter.release(0.05, 429)
+    assert limiter.concurrency == 8
+    assert limiter.rps == 10
+    assert limiter.throttled == 16
+
+
+def test_request_sent_after_cut_cuts_again():
+    limiter = HostLimiter(rps=20, burst=20, concurrency=16, max_concurrency=32)
+    _send_burst(limiter, 1)
+    limiter.release(0.0, 503)
+    time.sleep(0.01)
+    _send_burst(limiter, 1)
+    limiter.release(0.001, 503)
+    assert limiter.concurrency == 4
+
+
+def test_retry_after_blocks_even_without_cut():
+    limiter = HostLimiter(rps=20, burst=20, concurrency=16)
+    _send_burst(limiter, 2)
+    limiter.release(0.05, 429)
+    limiter.release(0.05, 429, retry_after=30)
+    assert limiter._try_acquire() > 29
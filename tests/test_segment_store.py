@@ -0,0 +1,83 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.core.segment_store import RECORD_HEADER, RECORD_MAGIC, SegmentStore
+from src.core.structures import ReadingErrorException
+
+
+def _key(name):
+    return hashlib.sha256(name.encode()).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SegmentStore(str(tmp_path), max_bytes=1000)
+    yield store
+    store.close()
+
+
+def test_put_and_get(store):
+    location = store.put(_key('a'), b'payload a')
+    assert store.get(_key('a')) == b'payload a'
+    assert _key('a') in store and _key('b') not in store
+    # Запись на диске: заголовок с ключом и длиной, сразу за ним тело
+    with open(store.segment_path(location.segment), 'rb') as f:
+        f.seek(location.offset - RECORD_HEADER.size)
+        assert RECORD_HEADER.unpack(f.read(RECORD_HEADER.size)) == (RECORD_MAGIC, bytes.fromhex(_key('a')), 9)
+    with pytest.raises(ReadingErrorException):
+        store.get(_key('b'))
+
+
+def test_put_again_supersedes(store):
+    store.put(_key('a'), b'old')
+    store.put(_key('a'), b'new')
+    assert store.get(_key('a')) == b'new'
+    assert store.keys() == [_key('a')]
+
+
+def test_rolls_over_to_new_segment(store):
+    for i in range(10):
+        store.put(_key(str(i)), bytes([i]) * 300)
+    assert len(store.segments()) > 1
+    assert all(os.path.getsize(store.segment_path(segment)) <= 1000 for segment in store.segments())
+    assert all(store.get(_key(str(i))) == bytes([i]) * 300 for i in range(10))
+
+
+def test_reopen_keeps_records(tmp_path):
+    store = SegmentStore(str(tmp_path), max_bytes=1000)
+    for i in range(5):
+        store.put(_key(str(i)), bytes([i]) * 300)
+    store.close()
+    store = SegmentStore(str(tmp_path), max_bytes=1000)
+    try:
+        assert all(store.get(_key(str(i))) == bytes([i]) * 300 for i in range(5))
+        # Дописывает в последний сегмент, а не в первый
+        assert store.put(_key('new'), b'x').segment == store.segments()[-1]
+    finally:
+        store.close()
+
+
+def test_compact_frees_superseded_records(store):
+    for i in range(6):
+        store.put(_key(str(i)), bytes([i]) * 300)
+    for i in range(4):
+        store.put(_key(str(i)), b'updated')
+    segments = store.segments()
+    freed = store.compact(ratio=0.5)
+    assert freed > 0
+    assert store.segments() != segments
+    assert all(store.get(_key(str(i))) == b'updated' for i in range(4))
+    assert all(store.get(_key(str(i))) == bytes([i]) * 300 for i in range(4, 6))
+
+
+def test_concurrent_puts_from_threads(tmp_path):
+    store = SegmentStore(str(tmp_path), max_bytes=4096)
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(lambda i: store.put(_key(str(i)), str(i).encode() * 50), range(200)))
+        assert all(store.get(_key(str(i))) == str(i).encode() * 50 for i in range(200))
+    finally:
+        store.close()